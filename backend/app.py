@@ -17,7 +17,17 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import config, Config
 from utils.logger import logger
+from utils.charset import charset_detector
+from utils.host_limiter import host_limiter
+from utils.content_cache import content_cache
+from utils.http_cache import http_cache
+from utils.job_manager import FINAL_STATES, job_manager
+from utils.parse_pool import parse_pool
+from utils.scheduler import crawl_scheduler, domain_scheduler, fanout_scheduler
+from utils.singleflight import domain_flights
+from utils.sitemap_cache import sitemap_cache
 from services.crawler_service import CrawlerService
+from services.sitemap_parser import redirect_memo
 from services.content_crawler_service import ContentCrawlerService
 
 # Initialize Flask app
@@ -42,10 +52,21 @@ app_config = config.get(os.getenv('FLASK_ENV', 'default'))
 app.config.from_object(app_config)
 
 # Initialize services
-crawler_service = CrawlerService()
-content_crawler_service = ContentCrawlerService()
-
-logger.info("✅ Application initialized with Sync Crawler (requests)")
+crawl_engine = Config.CRAWL_ENGINE
+if crawl_engine == 'async':
+    from services.async_crawler_service import aiohttp, AsyncCrawlerService, AsyncContentCrawlerService
+    if aiohttp is None:
+        logger.warning("⚠️ CRAWL_ENGINE=async nhưng aiohttp chưa được cài, dùng thread engine")
+        crawl_engine = 'thread'
+
+if crawl_engine == 'async':
+    crawler_service = AsyncCrawlerService()
+    content_crawler_service = AsyncContentCrawlerService()
+    logger.info("✅ Application initialized with Async Crawler (aiohttp)")
+else:
+    crawler_service = CrawlerService()
+    content_crawler_service = ContentCrawlerService()
+    logger.info("✅ Application initialized with Sync Crawler (requests)")
 logger.info("Application initialized successfully")
 
 # Routes
@@ -72,15 +93,38 @@ def health_check():
     # Check configuration
     health_status["components"]["config"] = {
         "max_workers": Config.MAX_WORKERS,
-        "request_timeout": Config.REQUEST_TIMEOUT
+        "request_timeout": Config.REQUEST_TIMEOUT,
+        "crawl_engine": crawl_engine
     }
 
+    # Sitemap / robots.txt conditional-request cache
+    health_status["components"]["http_cache"] = http_cache.get_stats()
+    # GP content result cache
+    health_status["components"]["content_cache"] = content_cache.get_stats()
+    # Learned host-level redirects
+    health_status["components"]["redirect_memo"] = redirect_memo.get_stats()
+    # Adaptive per-host concurrency
+    health_status["components"]["host_limiter"] = host_limiter.get_stats()
+    # Which charset detection path pages took (detector = slow statistical fallback)
+    health_status["components"]["charset"] = charset_detector.get_stats()
+    # HTML parse stage (process pool)
+    health_status["components"]["parse_pool"] = parse_pool.get_stats()
+    # Crawl jobs (queued / running / attached streams)
+    health_status["components"]["jobs"] = job_manager.get_stats()
+    # Shared crawl workers and the jobs (flows) using them
+    health_status["components"]["scheduler"] = crawl_scheduler.get_stats()
+    # Fan-out inside domain crawls, and GP content domains in progress
+    health_status["components"]["fanout_scheduler"] = fanout_scheduler.get_stats()
+    health_status["components"]["domain_scheduler"] = domain_scheduler.get_stats()
+    health_status["components"]["singleflight"] = domain_flights.get_stats()
+    health_status["components"]["sitemap_cache"] = sitemap_cache.get_stats()
+
     status_code = 200 if health_status["status"] == "healthy" else 503
     return jsonify(health_status), status_code
 
 @app.route('/api/crawl', methods=['POST'])
 def crawl():
-    """Synchronous crawl endpoint"""
+    """Synchronous crawl endpoint (JSON: domains, refresh to bypass the sitemap cache)"""
     try:
         data = request.get_json()
         domains = data.get("domains", [])
@@ -93,7 +137,7 @@ def crawl():
             }), 400
 
         logger.info(f"Received crawl request for {len(domains)} domains")
-        results = crawler_service.process_domains(domains)
+        results = crawler_service.process_domains(domains, refresh=parse_flag(data.get("refresh")))
 
         return jsonify(results)
 
@@ -130,64 +174,19 @@ def crawl():
 
 @app.route('/api/crawl-stream')
 def crawl_stream():
-    """Streaming crawl endpoint with Server-Sent Events - Real-time results"""
-    from queue import Queue
-    from threading import Thread
-
-    def stream_sync_results(domains):
-        """Stream results from sync crawler with real-time updates"""
-        result_queue = Queue()
-
-        def result_callback(result, completed, total):
-            """Callback to receive results as they complete"""
-            result_queue.put({
-                'type': 'result',
-                'data': result,
-                'progress': {
-                    'completed': completed,
-                    'total': total,
-                    'percentage': round((completed / total) * 100, 1)
-                }
-            })
-
-        def crawl_worker():
-            """Run crawler in background thread"""
-            try:
-                crawler_service.process_domains(domains, callback=result_callback)
-                result_queue.put({'type': 'done'})
-            except Exception as e:
-                logger.error(f"❌ Crawler error: {e}")
-                result_queue.put({'type': 'error', 'message': str(e)})
-
-        # Start crawler in background
-        Thread(target=crawl_worker, daemon=True).start()
-
-        # Send initial message
-        yield f"data: {json.dumps({'status': 'starting', 'message': 'Khởi động crawler...', 'total': len(domains)})}\n\n"
-
-        # Stream results as they arrive
-        while True:
-            item = result_queue.get()
-
-            if item['type'] == 'result':
-                # Stream individual domain result with progress
-                yield f"data: {json.dumps(item['data'])}\n\n"
-                logger.info(f"📤 Streamed result for {item['data'].get('domain')} ({item['progress']['completed']}/{item['progress']['total']})")
-
-            elif item['type'] == 'done':
-                # All done
-                yield f"data: {json.dumps({'status': 'completed', 'message': 'Tất cả domain đã crawl xong'})}\n\n"
-                logger.info("✅ Stream completed")
-                break
-
-            elif item['type'] == 'error':
-                # Error occurred
-                yield f"data: {json.dumps({'status': 'error', 'message': item['message']})}\n\n"
-                logger.error(f"❌ Stream error: {item['message']}")
-                break
-
-    domains_param = request.args.get("domains", "")
-    domain_list = [d.strip() for d in domains_param.split(",") if d.strip()]
+    """
+    Streaming crawl endpoint with Server-Sent Events - Real-time results.
+
+    The crawl runs as a job (see /api/jobs): the 'starting' event carries its
+    job_id, and every event an id. An EventSource reconnecting with
+    Last-Event-ID continues that job's stream instead of starting a new crawl.
+    Domains crawled recently come from the sitemap cache unless ?refresh=1.
+    """
+    reconnect = reattach_stream('crawl')
+    if reconnect is not None:
+        return reconnect
+
+    domain_list = parse_domain_list(request.args.get("domains", ""))
 
     if not domain_list:
         return jsonify({
@@ -198,10 +197,10 @@ def crawl_stream():
 
     logger.info(f"🚀 Starting real-time SSE stream for {len(domain_list)} domains")
 
-    response = Response(stream_sync_results(domain_list), content_type='text/event-stream')
-    response.headers['Cache-Control'] = 'no-cache'
-    response.headers['X-Accel-Buffering'] = 'no'
-    return response
+    job = job_manager.submit('crawl', {
+        'domains': domain_list, 'refresh': parse_flag(request.args.get("refresh")), 'client': client_id()
+    })
+    return sse_response(stream_job_events(job['id']))
 
 
 @app.route('/api/sinbyte/submit', methods=['POST'])
@@ -521,127 +520,21 @@ def gp_content_crawl_stream():
     GP Content Crawler with SSE streaming.
 
     Crawls sitemap first (internal), then crawls each URL for content.
-    Returns: URL + Title + Keywords in real-time via SSE.
+    Returns: URL + Title + Keywords in real-time via SSE. Runs as a job and
+    resumes on reconnect, like /api/crawl-stream.
 
     Query params:
         domains: Comma-separated list of domains (e.g., ?domains=example.com,google.com)
+        sample: Crawl only N URLs per domain, stratified by sitemap and path prefix (e.g., ?sample=50)
+        recent: With sample, favour recently modified URLs by <lastmod> (?recent=1)
+        refresh: Discover and parse the sitemaps even if the domain is in the sitemap cache (?refresh=1)
     """
-    from queue import Queue
-    from threading import Thread
-
-    def stream_content_results(domains):
-        """Stream content crawl results in real-time"""
-        result_queue = Queue()
-
-        def url_callback(result, completed, total):
-            """Callback for each URL crawled"""
-            # Put individual URL result in queue
-            result_queue.put({
-                'type': 'url_result',
-                'data': result,  # {url, title, keywords, status, duration}
-                'progress': {
-                    'completed': completed,
-                    'total': total,
-                    'percentage': round((completed / total) * 100, 1) if total > 0 else 0
-                }
-            })
-
-        def domain_callback(domain_result, completed_domains, total_domains):
-            """Callback for each domain completed"""
-            result_queue.put({
-                'type': 'domain_complete',
-                'data': domain_result,
-                'progress': {
-                    'completed_domains': completed_domains,
-                    'total_domains': total_domains
-                }
-            })
-
-        def crawl_worker():
-            """Run content crawler in background thread"""
-            try:
-                logger.info(f"🚀 [GP Content] Starting crawl for {len(domains)} domains")
-
-                for i, domain in enumerate(domains):
-                    domain = domain.strip()
-                    if not domain:
-                        continue
-
-                    # Send domain start notification
-                    result_queue.put({
-                        'type': 'domain_start',
-                        'domain': domain,
-                        'current': i + 1,
-                        'total': len(domains)
-                    })
-
-                    # Crawl this domain
-                    domain_result = content_crawler_service.discover_and_crawl_domain(
-                        domain,
-                        callback=url_callback
-                    )
-
-                    # Send domain completion
-                    domain_callback(domain_result, i + 1, len(domains))
-
-                # All done
-                result_queue.put({'type': 'done'})
-
-            except Exception as e:
-                logger.error(f"❌ [GP Content] Crawler error: {e}")
-                result_queue.put({'type': 'error', 'message': str(e)})
-
-        # Start crawler in background
-        Thread(target=crawl_worker, daemon=True).start()
-
-        # Send initial message
-        yield f"data: {json.dumps({'status': 'starting', 'message': 'Khởi động GP Content Crawler...', 'total_domains': len(domains)})}\n\n"
-
-        # Stream results as they arrive
-        while True:
-            item = result_queue.get()
-
-            if item['type'] == 'domain_start':
-                # Starting a new domain
-                yield f"data: {json.dumps({'status': 'domain_start', 'domain': item['domain'], 'current': item['current'], 'total': item['total']})}\n\n"
-                logger.info(f"📤 [GP Content] Starting domain {item['domain']} ({item['current']}/{item['total']})")
-
-            elif item['type'] == 'url_result':
-                # Individual URL result
-                yield f"data: {json.dumps(item['data'])}\n\n"
-                url = item['data'].get('original_url') or item['data'].get('url', 'unknown')
-                logger.info(f"📤 [GP Content] Streamed URL result: {url} ({item['progress']['completed']}/{item['progress']['total']})")
-
-            elif item['type'] == 'domain_complete':
-                # Domain completed
-                result = item['data']
-                response_data = {
-                    'status': 'domain_complete',
-                    'domain': result['domain'],
-                    'crawled_urls': result['crawled_urls'],
-                    'total_urls': result['total_urls'],
-                    'original_domain': result.get('original_domain', result['domain']),
-                    'target_domain': result.get('target_domain', result['domain']),
-                    'has_redirect': result.get('has_redirect', False)
-                }
-                yield f"data: {json.dumps(response_data)}\n\n"
-                logger.info(f"✅ [GP Content] Domain complete: {result['domain']} ({result['crawled_urls']}/{result['total_urls']} URLs)")
-
-            elif item['type'] == 'done':
-                # All done
-                yield f"data: {json.dumps({'status': 'completed', 'message': 'Tất cả domains đã crawl xong'})}\n\n"
-                logger.info("✅ [GP Content] Stream completed")
-                break
-
-            elif item['type'] == 'error':
-                # Error occurred
-                yield f"data: {json.dumps({'status': 'error', 'message': item['message']})}\n\n"
-                logger.error(f"❌ [GP Content] Stream error: {item['message']}")
-                break
+    reconnect = reattach_stream('gp_content')
+    if reconnect is not None:
+        return reconnect
 
     # Parse domains from query params
-    domains_param = request.args.get("domains", "")
-    domain_list = [d.strip() for d in domains_param.split(",") if d.strip()]
+    domain_list = parse_domain_list(request.args.get("domains", ""))
 
     if not domain_list:
         return jsonify({
@@ -650,13 +543,294 @@ def gp_content_crawl_stream():
             "suggestion": "Format: ?domains=example.com,google.com"
         }), 400
 
-    logger.info(f"🚀 [GP Content] Starting SSE stream for {len(domain_list)} domains")
+    # Optional sampling mode
+    sample = parse_sample(request.args.get("sample"))
+    if sample is None:
+        return sample_error()
+    sample_recent = parse_flag(request.args.get("recent"))
+
+    logger.info(
+        f"🚀 [GP Content] Starting SSE stream for {len(domain_list)} domains"
+        + (f" (sample={sample}{', recent' if sample_recent else ''})" if sample else "")
+    )
+
+    job = job_manager.submit('gp_content', {
+        'domains': domain_list, 'sample': sample, 'recent': sample_recent,
+        'refresh': parse_flag(request.args.get("refresh")), 'client': client_id()
+    })
+    return sse_response(stream_job_events(job['id']))
+
+
+# ============================================================
+# Crawl jobs
+# ============================================================
+def parse_domain_list(value) -> list:
+    """Domains from a comma-separated string or a JSON list"""
+    if isinstance(value, str):
+        value = value.split(",")
+    return [d.strip() for d in value or [] if isinstance(d, str) and d.strip()]
+
+
+def parse_sample(value):
+    """?sample=N → N (0 = off), None if invalid"""
+    try:
+        sample = int(value or 0)
+    except (TypeError, ValueError):
+        return None
+    return sample if 0 <= sample <= Config.SAMPLE_MAX else None
+
+
+def parse_flag(value) -> bool:
+    """?flag=1 / true, or a JSON boolean"""
+    return str(value or '').lower() in ('1', 'true')
+
+
+def sample_error():
+    return jsonify({
+        "error": "Tham số sample không hợp lệ",
+        "message": f"sample phải là số nguyên từ 0 (tắt) đến {Config.SAMPLE_MAX}",
+        "suggestion": "Format: ?domains=example.com&sample=50&recent=1"
+    }), 400
+
+
+def client_id():
+    """Client address (behind nginx: X-Real-IP), jobs of one client share its fair share"""
+    return request.headers.get('X-Real-IP') or request.remote_addr or ''
+
+
+def job_flow(params, job):
+    """Scheduler flow of a job: its crawl work shares the crawl workers fairly with other jobs"""
+    return crawl_scheduler.flow(job.id, client=params.get('client', ''), weight=params.get('weight', 1.0))
+
+
+def run_crawl_job(params, job):
+    """Sitemap crawl of params['domains'], one event per domain result"""
+    domains = job.pending(params['domains'])
+
+    def result_callback(result, completed, total):
+        """Callback to receive results as they complete"""
+        job.emit(result, domain=result.get('original_domain') or result.get('domain'))
+        logger.info(f"📤 Streamed result for {result.get('domain')} ({completed}/{total})")
 
-    response = Response(stream_content_results(domain_list), content_type='text/event-stream')
+    job.emit({'status': 'starting', 'message': 'Khởi động crawler...', 'total': len(domains), 'job_id': job.id})
+    with job_flow(params, job):
+        crawler_service.process_domains(
+            domains, callback=result_callback, cancel=job.cancel, flow=job.id, refresh=params.get('refresh', False)
+        )
+    job.emit({'status': 'completed', 'message': 'Tất cả domain đã crawl xong'})
+    logger.info("✅ Stream completed")
+
+
+def run_gp_content_job(params, job):
+    """GP content crawl: domain_start, one event per URL, domain_complete"""
+    domains = job.pending(params['domains'])
+
+    def url_callback(result, completed, total):
+        """Callback for each URL crawled"""
+        # {url, title, keywords, status, duration}; keyed so a resumed job doesn't send a URL twice
+        job.emit(result, key=result.get('original_url'))
+        url = result.get('original_url') or result.get('url', 'unknown')
+        logger.info(f"📤 [GP Content] Streamed URL result: {url} ({completed}/{total})")
+
+    def domain_callback(result, completed_domains, total_domains):
+        """Callback for each domain completed"""
+        job.emit({
+            'status': 'domain_complete',
+            'domain': result['domain'],
+            'crawled_urls': result.get('crawled_urls', 0),
+            'total_urls': result.get('total_urls', 0),
+            'original_domain': result.get('original_domain', result['domain']),
+            'target_domain': result.get('target_domain', result['domain']),
+            'has_redirect': result.get('has_redirect', False),
+            'cache': result.get('cache'),  # content cache hits / revalidated / misses + hit_ratio
+            'dedup': result.get('dedup'),  # duplicate / learned URLs not fetched
+            'sample': result.get('sample'),  # sampling mode only
+            'sitemap_cache': result.get('sitemap_cache')  # URLs from a cached sitemap crawl or not
+        }, domain=result.get('original_domain', result['domain']))
+        logger.info(
+            f"✅ [GP Content] Domain complete: {result['domain']} "
+            f"({result.get('crawled_urls', 0)}/{result.get('total_urls', 0)} URLs)"
+        )
+
+    def start_callback(domain, current, total):
+        """Callback when a domain starts (domains run in parallel, events interleave)"""
+        job.emit({'status': 'domain_start', 'domain': domain, 'current': current, 'total': total})
+        logger.info(f"📤 [GP Content] Starting domain {domain} ({current}/{total})")
+
+    job.emit({
+        'status': 'starting',
+        'message': 'Khởi động GP Content Crawler...',
+        'total_domains': len(domains),
+        'job_id': job.id
+    })
+    logger.info(f"🚀 [GP Content] Starting crawl for {len(domains)} domains")
+    with job_flow(params, job):
+        content_crawler_service.process_domains(
+            domains,
+            callback=domain_callback,
+            url_callback=url_callback,
+            start_callback=start_callback,
+            collect_results=False,  # URL results are streamed, not kept per domain
+            sample=params.get('sample', 0),
+            sample_recent=params.get('recent', False),
+            cancel=job.cancel,
+            flow=job.id,
+            refresh=params.get('refresh', False)
+        )
+    job.emit({'status': 'completed', 'message': 'Tất cả domains đã crawl xong'})
+    logger.info("✅ [GP Content] Stream completed")
+
+
+job_manager.register('crawl', run_crawl_job)
+job_manager.register('gp_content', run_gp_content_job)
+
+
+def stream_job_events(job_id, after=0):
+    """
+    SSE stream of a job: its events after seq `after`, then live ones until it
+    finishes. Each event has id "<job_id>:<seq>", which the browser sends back
+    as Last-Event-ID when it reconnects.
+    """
+    yield f"retry: {Config.SSE_RETRY_MS}\n\n"
+    for event in job_manager.follow(job_id, after):
+        if event is None:
+            yield ": keep-alive\n\n"
+            continue
+        seq, data = event
+        yield f"id: {job_id}:{seq}\ndata: {data}\n\n"
+
+
+def reattach_stream(kind):
+    """
+    SSE response continuing the job named by Last-Event-ID (header, or
+    ?last_event_id= for clients that can't set it), None for a fresh request.
+    A job cancelled while the client was away (or interrupted by a restart)
+    is resumed; a finished job with nothing left to send answers 204, which
+    stops the browser from reconnecting.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id', '')
+    job_id, _, seq = last_event_id.partition(':')
+    if not job_id or not seq.isdigit():
+        return None
+    job = job_manager.get(job_id, touch=True)
+    if job is None or job['kind'] != kind:
+        return None
+
+    job = job_manager.reconnect(job_id)
+    if job['status'] in FINAL_STATES and int(seq) >= job['events']:
+        return Response(status=204)
+    logger.info(f"🔌 Client kết nối lại job {job_id} từ event {seq} ({job['status']})")
+    return sse_response(stream_job_events(job_id, int(seq)))
+
+
+def sse_response(stream):
+    response = Response(stream, content_type='text/event-stream')
     response.headers['Cache-Control'] = 'no-cache'
     response.headers['X-Accel-Buffering'] = 'no'
     return response
 
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Submit a crawl job without holding a stream open.
+
+    JSON body:
+        type: 'crawl' (sitemap URLs) or 'gp_content' (title + keywords)
+        domains: List or comma-separated string
+        sample, recent: GP content sampling (see /api/gp-content/crawl-stream)
+        refresh: Ignore the sitemap cache, re-discover and re-parse every domain's sitemaps
+        detached: Keep running with no client attached (default: cancelled after JOB_IDLE_TIMEOUT
+                  without a stream or poll)
+        weight: Share of the crawl workers relative to the client's other jobs (0.1 - 10, default 1)
+    """
+    data = request.get_json(silent=True) or {}
+    kind = data.get('type', 'crawl')
+    if kind not in ('crawl', 'gp_content'):
+        return jsonify({"error": "Loại job không hợp lệ", "message": "type phải là 'crawl' hoặc 'gp_content'"}), 400
+
+    domain_list = parse_domain_list(data.get('domains'))
+    if not domain_list:
+        return jsonify({"error": "Không có domain để crawl", "message": "Vui lòng nhập ít nhất một domain"}), 400
+
+    try:
+        weight = min(10.0, max(0.1, float(data.get('weight', 1.0))))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Tham số weight không hợp lệ", "message": "weight phải là số từ 0.1 đến 10"}), 400
+
+    params = {'domains': domain_list, 'client': client_id(), 'weight': weight, 'refresh': parse_flag(data.get('refresh'))}
+    if kind == 'gp_content':
+        sample = parse_sample(data.get('sample'))
+        if sample is None:
+            return sample_error()
+        params['sample'] = sample
+        params['recent'] = parse_flag(data.get('recent'))
+
+    job = job_manager.submit(kind, params, detached=bool(data.get('detached')))
+    return jsonify(job), 202
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({"jobs": job_manager.list(max(1, min(limit, 500)))})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job state and progress (polling also keeps an attached-less job alive)"""
+    job = job_manager.get(job_id, touch=True)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """Stored events after ?after=<seq> (default 0), at most ?limit= (default 500)"""
+    job = job_manager.get(job_id, touch=True)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    after = request.args.get('after', 0, type=int)
+    limit = max(1, min(request.args.get('limit', 500, type=int), 5000))
+    events = job_manager.events(job_id, after, limit)
+    return jsonify({
+        "job": job,
+        "events": [{"seq": seq, "data": data} for seq, data in events],
+        "next": events[-1][0] if events else after,
+    })
+
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def attach_job(job_id):
+    """
+    Attach to a job: replays its events after ?after=<seq> (or the seq of the
+    Last-Event-ID header on reconnect), then follows it live
+    """
+    if job_manager.get(job_id, touch=True) is None:
+        return jsonify({"error": "Job not found"}), 404
+    after = request.args.get('after', 0, type=int)
+    last_job_id, _, last_seq = request.headers.get('Last-Event-ID', '').partition(':')
+    if last_job_id == job_id and last_seq.isdigit():
+        after = int(last_seq)
+    return sse_response(stream_job_events(job_id, after))
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not job_manager.cancel(job_id):
+        return jsonify({"error": "Job không chạy (không tồn tại hoặc đã kết thúc)"}), 409
+    return jsonify(job_manager.get(job_id))
+
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Re-run an interrupted / cancelled / failed job; domains already done are skipped"""
+    job = job_manager.resume(job_id)
+    if job is None:
+        return jsonify({"error": "Job không thể tiếp tục (không tồn tại hoặc đang chạy / đã xong)"}), 409
+    return jsonify(job), 202
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -1,15 +1,132 @@
 import os
 
+
+def _int(name: str, default: int, minimum: int = 1) -> int:
+    """Integer setting from the environment; out of range fails at startup rather than mid-crawl"""
+    value = int(os.getenv(name, default))
+    if value < minimum:
+        raise ValueError(f"{name}={value}: must be >= {minimum}")
+    return value
+
+
+def _float(name: str, default: float, minimum: float = 0.0) -> float:
+    value = float(os.getenv(name, default))
+    if value < minimum:
+        raise ValueError(f"{name}={value}: must be >= {minimum}")
+    return value
+
+
+def _bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() == 'true'
+
+
 class Config:
     # Flask server
     DEBUG = False
     HOST = '0.0.0.0'
-    PORT = int(os.getenv('PORT', 8000))
+    PORT = _int('PORT', 8000)
 
     # Crawler settings - Optimized for speed
-    MAX_WORKERS = int(os.getenv('MAX_WORKERS', 20))  # Tăng từ 10 -> 20
-    REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 15))  # Giảm từ 20s -> 15s
-    MAX_SITEMAP_DEPTH = int(os.getenv('MAX_SITEMAP_DEPTH', 10))
+    MAX_WORKERS = _int('MAX_WORKERS', 20)  # Tăng từ 10 -> 20; also the most requests in flight to one host
+    REQUEST_TIMEOUT = _int('REQUEST_TIMEOUT', 15)  # Giảm từ 20s -> 15s
+    HTTP_POOL_HOSTS = 200  # Hosts kept in the keep-alive pool (per-host size = MAX_WORKERS)
+    MAX_SITEMAP_DEPTH = _int('MAX_SITEMAP_DEPTH', 10)
+
+    # Crawl engine - 'thread' (requests + shared worker pools) or 'async' (aiohttp event loop)
+    CRAWL_ENGINE = os.getenv('CRAWL_ENGINE', 'thread').lower()
+    if CRAWL_ENGINE not in ('thread', 'async'):
+        raise ValueError(f"CRAWL_ENGINE={CRAWL_ENGINE}: must be 'thread' or 'async'")
+
+    # Shared crawl workers - sitemap domains and GP content pages of all jobs run on one pool,
+    # shared fairly between jobs (weighted) and clients
+    CRAWL_WORKERS = _int('CRAWL_WORKERS', 100)
+    # Process-wide caps on the fan-out inside domain crawls (discovery probes, sibling sitemaps)
+    # and on GP content domains crawled at once across all jobs
+    FANOUT_WORKERS = 64
+    DOMAIN_WORKERS = 30
+
+    # Per-host concurrency starts at MAX_CONNECTIONS_PER_HOST; with ADAPTIVE_CONCURRENCY (AIMD)
+    # it grows up to MAX_WORKERS while a host answers fast, halves on 429/503/timeouts, and
+    # Retry-After pauses the host (at most MAX_RETRY_AFTER seconds)
+    MAX_CONNECTIONS_PER_HOST = _int('MAX_CONNECTIONS_PER_HOST', 4)
+    ADAPTIVE_CONCURRENCY = _bool('ADAPTIVE_CONCURRENCY', True)
+    MAX_RETRY_AFTER = _float('MAX_RETRY_AFTER', 120)
+    HOST_LATENCY_FACTOR = 2.0  # slower than N × avg latency = no increase
+
+    # GP content crawl - domains of one crawl run in parallel; page fetches of all domains
+    # share one budget (each host is still capped by the per-host limiter)
+    GP_MAX_DOMAINS = _int('GP_MAX_DOMAINS', 10)
+    GP_FETCH_BUDGET = _int('GP_FETCH_BUDGET', 100)
+    # HTML parse stage - page extraction runs in a process pool (0 = parse on the fetch threads)
+    PARSE_PROCESSES = _int('PARSE_PROCESSES', os.cpu_count() or 1, minimum=0)
+    PARSE_QUEUE_SIZE = 64  # pages waiting for a parser before fetchers block
+    # Head-only mode: stream page bodies and stop once title/meta/first <h1> are read
+    CONTENT_STREAMING = True
+    CONTENT_MAX_BYTES = 256 * 1024  # per page, decoded body bytes
+    CONTENT_CHUNK_SIZE = 16 * 1024
+    # URLs of one domain submitted at a time (refilled as pages finish, keeps memory flat)
+    CONTENT_SUBMIT_WINDOW = 2 * MAX_WORKERS
+    # Sampling mode (?sample=N): candidates read per sampled URL, <lastmod> half-life for ?recent=1
+    SAMPLE_OVERSAMPLE = 5
+    SAMPLE_HALF_LIFE_DAYS = 30.0
+    SAMPLE_MAX = 10000  # largest N accepted by the API
+
+    # Sitemap parsing - <loc> is parsed incrementally; children of one index level are fetched in parallel
+    STREAM_SITEMAPS = True
+    SITEMAP_STREAM_CHUNK_SIZE = 64 * 1024
+    SITEMAP_INDEX_WORKERS = 8
+    # Sitemap discovery - probe all candidates + www variant at once
+    PARALLEL_DISCOVERY = True
+    DISCOVERY_WORKERS = 12
+    DISCOVERY_DEADLINE = 20.0  # seconds per domain
+    DISCOVERY_GRACE = 3.0  # wait after first valid sitemap
+    # Sitemaps validated during discovery are handed to the parse phase (max URLs kept per crawl)
+    BODY_CACHE_MAX_ENTRIES = 500000
+
+    # Async engine limits
+    ASYNC_MAX_IN_FLIGHT = 500  # open connections across all hosts
+    ASYNC_MAX_DOMAINS = 200  # domains crawled at once
+    ASYNC_CONTENT_CONCURRENCY = 50  # pages in flight per domain
+
+    # In-flight coalescing - a crawl of a domain already being crawled (same pipeline and
+    # options) joins the running one; URL events kept for late joiners are capped per crawl
+    SINGLEFLIGHT_ENABLED = True
+    SINGLEFLIGHT_REPLAY_MAX = 10000
+
+    # Charset detection: BOM → header → <meta> in the first CHARSET_SNIFF_BYTES → UTF-8 → charset-normalizer
+    CHARSET_SNIFF_BYTES = 4096
+    CHARSET_DETECT_MAX_BYTES = 64 * 1024  # statistical detector input cap
+
+    # Persistent caches (SQLite files in CACHE_DIR); CACHE_ENABLED=false turns all of them off
+    CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+    CACHE_ENABLED = _bool('CACHE_ENABLED', True)
+    # HTTP conditional-request cache for sitemaps / robots.txt (ETag, Last-Modified)
+    HTTP_CACHE_ENABLED = CACHE_ENABLED
+    HTTP_CACHE_PATH = os.path.join(CACHE_DIR, 'http_cache.db')
+    HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+    HTTP_CACHE_MAX_ENTRY_BYTES = 16 * 1024 * 1024  # compressed
+    # GP content result cache (title/keywords per page), revalidated with ETag / Last-Modified after the TTL
+    CONTENT_CACHE_ENABLED = CACHE_ENABLED
+    CONTENT_CACHE_PATH = os.path.join(CACHE_DIR, 'content_cache.db')
+    CONTENT_CACHE_TTL = _int('CONTENT_CACHE_TTL', 24 * 3600, minimum=0)  # seconds served without any request
+    CONTENT_CACHE_MAX_ENTRIES = 1000000
+    # Sitemap result cache (discovered sitemaps, URL lists, redirects per domain), shared by the
+    # sitemap and GP content crawls; `refresh` in the API bypasses it. Recent domains stay in memory
+    SITEMAP_CACHE_ENABLED = CACHE_ENABLED
+    SITEMAP_CACHE_PATH = os.path.join(CACHE_DIR, 'sitemap_cache.db')
+    SITEMAP_CACHE_TTL = _int('SITEMAP_CACHE_TTL', 3600, minimum=0)  # seconds a domain's result is reused
+    SITEMAP_CACHE_MAX_DOMAINS = 5000  # on disk
+    SITEMAP_CACHE_MEMORY_URLS = 1000000  # URLs of all domains in memory
+
+    # Crawl jobs - streamed crawls run as jobs whose events are kept in SQLite (attach / poll / resume)
+    JOB_DB_PATH = os.path.join(CACHE_DIR, 'jobs.db')
+    JOB_MAX_RUNNING = _int('JOB_MAX_RUNNING', 4)  # jobs crawling at once, others wait queued
+    JOB_IDLE_TIMEOUT = _float('JOB_IDLE_TIMEOUT', 60, minimum=1)  # seconds with no attached stream / poll → cancelled
+    JOB_HEARTBEAT = _float('JOB_HEARTBEAT', 15, minimum=0.1)  # SSE keep-alive comment, below the proxy's read timeout
+    JOB_RETENTION_DAYS = _float('JOB_RETENTION_DAYS', 7)  # finished jobs and their events are purged after
+    # Latest events of a running job kept in memory for followers / reconnects (older ones are read from jobs.db)
+    JOB_REPLAY_BUFFER = 1000
+    SSE_RETRY_MS = 3000  # reconnect delay suggested to EventSource clients
 
     # User Agent Pool - Googlebot first
     USER_AGENTS = [
@@ -42,22 +159,28 @@ class Config:
     }
 
     # Retry settings
-    MAX_RETRIES = int(os.getenv('MAX_RETRIES', 3))
-    RETRY_DELAY = float(os.getenv('RETRY_DELAY', 2.0))
+    MAX_RETRIES = _int('MAX_RETRIES', 3)
+    RETRY_DELAY = _float('RETRY_DELAY', 2.0)
     EXPONENTIAL_BACKOFF = True
 
     # Rate limiting - Optimized for speed
-    MIN_DELAY = float(os.getenv('MIN_DELAY', 0.3))  # Giảm từ 1.0 -> 0.3
-    MAX_DELAY = float(os.getenv('MAX_DELAY', 0.8))  # Giảm từ 3.0 -> 0.8
+    # Per-host token bucket: after HOST_BURST requests, same-host requests are spaced MIN_DELAY..MAX_DELAY apart
+    MIN_DELAY = _float('MIN_DELAY', 0.3)  # Giảm từ 1.0 -> 0.3; 0 = no spacing
+    MAX_DELAY = _float('MAX_DELAY', 0.8, minimum=MIN_DELAY)  # Giảm từ 3.0 -> 0.8
+    HOST_RATE_LIMIT = 1 / MIN_DELAY if MIN_DELAY > 0 else 0  # req/s, 0 = off
+    HOST_BURST = 3
 
     # Request behavior
     ALLOW_REDIRECTS = True
-    MAX_REDIRECTS = int(os.getenv('MAX_REDIRECTS', 5))
-    VERIFY_SSL = os.getenv('VERIFY_SSL', 'true').lower() == 'true'
+    MAX_REDIRECTS = _int('MAX_REDIRECTS', 5, minimum=0)
+    # Learned host-level redirects (http→https, apex→www, moved domain) rewrite later URLs before fetching
+    REDIRECT_MEMO_ENABLED = True
+    REDIRECT_MEMO_TTL = 3600  # seconds
+    VERIFY_SSL = _bool('VERIFY_SSL', True)
 
     # Domain validation
     VALIDATE_DOMAIN_MATCH = True  # Log warning nếu redirect sang domain khác
-    SKIP_ON_403 = os.getenv('SKIP_ON_403', 'false').lower() == 'true'
+    SKIP_ON_403 = _bool('SKIP_ON_403', False)
 
     # Timezone
     TIMEZONE = os.getenv('TIMEZONE', 'Asia/Ho_Chi_Minh')
@@ -0,0 +1,1047 @@
+"""
+Asyncio crawl engine (CRAWL_ENGINE=async)
+
+Alternative backend for CrawlerService / ContentCrawlerService built on aiohttp.
+Discovery, redirect tracking, sitemap parsing and content fetching run as
+coroutines on one event loop, so thousands of requests can be in flight at once,
+bounded globally by ASYNC_MAX_IN_FLIGHT and per host by the adaptive host limiter.
+Result dicts and callbacks are the same as the thread-based services.
+"""
+
+import asyncio
+import codecs
+import random
+import xml.etree.ElementTree as ET
+import zlib
+from collections import Counter
+from contextlib import asynccontextmanager
+from threading import Event
+from time import time
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlparse
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # CRAWL_ENGINE=async unavailable, app falls back to threads
+
+from config import Config
+from services.content_crawler_service import ContentCrawlerService, DomainFilter
+from services.crawler_service import CrawlerService
+from services.sitemap_parser import (
+    SITEMAP_TAG,
+    URL_TAG,
+    RedirectChain,
+    RedirectHop,
+    SitemapEntry,
+    SitemapParser,
+    redirect_memo,
+)
+from utils.charset import charset_detector
+from utils.content_cache import content_cache
+from utils.host_limiter import host_limiter
+from utils.html_parser import MetadataStream, PageMetadata
+from utils.http_cache import http_cache
+from utils.logger import logger
+from utils.rate_limiter import host_key, rate_limiter
+from utils.singleflight import domain_flights, flight_key
+from utils.sitemap_cache import SitemapListing, SitemapSnapshot, sitemap_cache
+from utils.url_canonical import CanonicalUrlSet
+from utils.url_sampler import UrlSampler
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class _SitemapFeed:
+    """Incremental sitemap parser fed with raw body chunks; unpacks .xml.gz bodies on the fly"""
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._root = None
+        self._gunzip = None
+        self._sniffed = False
+
+    def feed(self, chunk: bytes) -> List[SitemapEntry]:
+        if not self._sniffed:
+            self._sniffed = True
+            # GZIP files start with magic bytes 0x1f 0x8b
+            if chunk[:2] == b'\x1f\x8b':
+                self._gunzip = zlib.decompressobj(wbits=31)
+        if self._gunzip is not None:
+            chunk = self._gunzip.decompress(chunk)
+        self._parser.feed(chunk)
+        return self._drain()
+
+    def close(self) -> List[SitemapEntry]:
+        if self._gunzip is not None:
+            self._parser.feed(self._gunzip.flush())
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> List[SitemapEntry]:
+        entries = []
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                if self._root is None:
+                    self._root = elem
+                continue
+            if elem.tag in (URL_TAG, SITEMAP_TAG):
+                entry = SitemapParser.element_entry(elem)
+                if entry is not None:
+                    entries.append(entry)
+                elem.clear()
+                self._root.clear()
+        return entries
+
+
+class AsyncCrawlEngine:
+    """Shared aiohttp session + the async versions of the SitemapParser operations"""
+
+    def __init__(self):
+        self.parser = SitemapParser()  # headers, user agents and candidate list
+        self.session = None
+        self._host_conds: Dict[str, asyncio.Condition] = {}
+        self._host_users: Dict[str, int] = {}  # tasks waiting for or holding a slot, per host
+        self.page_budget = asyncio.Semaphore(max(1, Config.GP_FETCH_BUDGET))  # pages in flight, all domains
+
+    async def __aenter__(self) -> 'AsyncCrawlEngine':
+        connector = aiohttp.TCPConnector(
+            limit=Config.ASYNC_MAX_IN_FLIGHT,
+            limit_per_host=Config.MAX_WORKERS,  # host_slot() applies the adaptive limit
+            ssl=False,  # SSL verification OFF (many domains have invalid certs)
+            ttl_dns_cache=300,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=Config.REQUEST_TIMEOUT),
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    HOST_SLOT_POLL = 0.1  # seconds; slots freed outside this engine don't wake its waiters
+
+    @asynccontextmanager
+    async def host_slot(self, url: str):
+        """
+        Async counterpart of host_limiter.slot - waits on the event loop, not a thread.
+        Releases by this engine wake its waiters at once; the limiter is process-wide
+        (other jobs' engines, thread callers, limit increases), so waiters also re-check
+        every HOST_SLOT_POLL.
+        """
+        key = host_key(url)
+        cond = self._host_conds.get(key)
+        if cond is None:
+            cond = self._host_conds[key] = asyncio.Condition()
+        self._host_users[key] = self._host_users.get(key, 0) + 1
+        try:
+            async with cond:
+                while not host_limiter.try_acquire(url):
+                    paused = host_limiter.blocked_for(url)
+                    try:
+                        await asyncio.wait_for(
+                            cond.wait(), timeout=min(paused, self.HOST_SLOT_POLL) if paused else self.HOST_SLOT_POLL
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+            try:
+                yield
+            finally:
+                host_limiter.release(url)
+                async with cond:
+                    cond.notify_all()
+        finally:
+            self._host_users[key] -= 1
+            if not self._host_users[key]:
+                # Nobody left on this host: don't keep a condition per host ever seen
+                del self._host_users[key]
+                del self._host_conds[key]
+
+    # -------------------------------
+    # HTTP with retries and redirect tracking
+    # -------------------------------
+    async def open(
+        self,
+        url: str,
+        headers: dict = None,
+        retries: int = None
+    ) -> Tuple['aiohttp.ClientResponse', RedirectChain]:
+        """
+        GET url following redirects hop by hop. The body is left unread;
+        caller must release the returned response.
+        """
+        if retries is None:
+            retries = Config.MAX_RETRIES
+        for attempt in range(1, retries + 1):
+            try:
+                response, chain = await self._follow(url, self.parser._request_headers(headers))
+                host_limiter.record(
+                    url,
+                    response.status,
+                    chain.hops[-1].duration / 1000,
+                    response.headers.get('Retry-After')
+                )
+                if response.status >= 400:
+                    response.release()
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, (), status=response.status,
+                        message=f"{response.status} {response.reason} for url: {chain.final_url}"
+                    )
+                return response, chain
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientResponseError) and e.status == 403:
+                    self.parser._rotate_user_agent()
+                if isinstance(e, asyncio.TimeoutError):
+                    host_limiter.record(url, timeout=True)
+                logger.warning(f"⚠️ fetch thất bại ({attempt}/{retries}) cho {url}: {e!r}")
+                if attempt < retries:
+                    await asyncio.sleep(
+                        host_limiter.blocked_for(url) or Config.RETRY_DELAY + random.uniform(0, Config.RETRY_DELAY)
+                    )
+                else:
+                    raise Exception(f"Không thể tải {url} sau {retries} lần thử: {e}")
+
+        raise Exception(f"fetch không thành công sau {retries} lần thử: {url}")
+
+    async def _follow(self, url: str, headers: dict) -> Tuple['aiohttp.ClientResponse', RedirectChain]:
+        """Async counterpart of RedirectTracker.fetch_with_redirect_tracking"""
+        chain_start = time()
+        hops = []
+        visited_urls = set()
+        current_url, memo_hops = redirect_memo.rewrite(url)
+
+        for redirect_count in range(Config.MAX_REDIRECTS + 1):
+            if current_url in visited_urls:
+                raise Exception(
+                    f"Redirect loop detected at {current_url} "
+                    f"(visited {redirect_count} times)"
+                )
+            visited_urls.add(current_url)
+
+            wait = rate_limiter.reserve(current_url)  # Per-host politeness delay
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            hop_start = time()
+            try:
+                response = await self.session.get(current_url, headers=headers, allow_redirects=False)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if memo_hops:
+                    redirect_memo.forget(url)
+                raise
+            hop_duration = (time() - hop_start) * 1000
+
+            location = response.headers.get('Location')
+            hops.append(RedirectHop(
+                url=current_url,
+                status_code=response.status,
+                location=location,
+                duration=hop_duration
+            ))
+
+            if response.status in REDIRECT_CODES:
+                response.release()
+                if not location:
+                    raise Exception(
+                        f"Redirect {response.status} without Location header at {current_url}"
+                    )
+                next_url = urljoin(current_url, location)
+                logger.info(f"🔄 {response.status}: {current_url} → {next_url} ({hop_duration:.0f}ms)")
+                current_url = next_url
+                continue
+
+            redirect_memo.learn(hops)
+            if memo_hops and response.status >= 400:
+                redirect_memo.forget(url)
+
+            chain = RedirectChain(
+                initial_url=url,
+                final_url=current_url,
+                hops=memo_hops + hops,
+                total_redirects=len(memo_hops) + len(hops) - 1,
+                total_duration=(time() - chain_start) * 1000,
+                memoized=bool(memo_hops)
+            )
+            return response, chain
+
+        raise Exception(f"Too many redirects (>{Config.MAX_REDIRECTS}). Last URL: {current_url}")
+
+    # -------------------------------
+    # Sitemaps
+    # -------------------------------
+    async def fetch_sitemap(
+        self,
+        url: str,
+        retries: int = None
+    ) -> Tuple[List[SitemapEntry], RedirectChain]:
+        """Download and parse one sitemap document incrementally, revalidating against the HTTP cache"""
+        cached = await asyncio.to_thread(http_cache.get, url)
+        response, chain = await self.open(url, cached.conditional_headers() if cached else None, retries)
+        feed = _SitemapFeed()
+        if response.status == 304 and cached is not None:
+            response.release()
+            body = await asyncio.to_thread(http_cache.open_body, cached)
+            if body is not None:
+                entries = []
+                with body:
+                    for chunk in iter(lambda: body.read(Config.SITEMAP_STREAM_CHUNK_SIZE), b''):
+                        entries.extend(feed.feed(chunk))
+                return entries + feed.close(), chain
+            # Entry evicted since the lookup: fetch it again in full
+            response, chain = await self.open(url, None, retries)
+
+        try:
+            http_cache.miss(cached, response.status)
+            cacheable = http_cache.enabled and (
+                response.headers.get('ETag') or response.headers.get('Last-Modified')
+            )
+            compressor = zlib.compressobj() if cacheable else None
+            captured = []
+            captured_size = 0
+
+            entries = []
+            async for chunk in response.content.iter_chunked(Config.SITEMAP_STREAM_CHUNK_SIZE):
+                entries.extend(feed.feed(chunk))
+                if compressor is not None:
+                    data = compressor.compress(chunk)
+                    captured.append(data)
+                    captured_size += len(data)
+                    if captured_size > Config.HTTP_CACHE_MAX_ENTRY_BYTES:
+                        compressor = None
+                        captured = []
+            entries.extend(feed.close())
+
+            if compressor is not None:
+                captured.append(compressor.flush())
+                await asyncio.to_thread(http_cache.store, url, response, b''.join(captured), True)
+            return entries, chain
+        finally:
+            response.release()
+
+    async def fetch_text(self, url: str, retries: int = 1) -> str:
+        response, _ = await self.open(url, retries=retries)
+        try:
+            body = await response.read()
+            return body.decode(response.charset or 'utf-8', errors='replace')
+        finally:
+            response.release()
+
+    async def discover_sitemaps(
+        self,
+        domain: str,
+        prefetched: Dict[str, Tuple[List[SitemapEntry], RedirectChain]]
+    ) -> Tuple[List[str], str]:
+        """
+        Same rules as SitemapParser._discover_sitemaps_parallel. Validated sitemaps
+        are stored in `prefetched` so parse_sitemap doesn't download them again.
+        """
+        variants = [domain] if domain.startswith("www.") else [domain, f"www.{domain}"]
+        apex = variants[0]
+        apex_candidates = len(self.parser._sitemap_candidates(apex))
+        found = {variant: [] for variant in variants}
+        forbidden = {variant: 0 for variant in variants}
+        pending = {}  # task -> (variant, url, order)
+
+        async def probe(url: str, is_robots: bool) -> List[str]:
+            if is_robots:
+                content = await self.fetch_text(url)
+                listed = []
+                for line in content.splitlines():
+                    if line.lower().startswith("sitemap:"):
+                        sm_url = line.split(":", 1)[1].strip()
+                        if sm_url.startswith("/"):
+                            sm_url = urljoin(f"https://{urlparse(url).netloc}", sm_url)
+                        listed.append(sm_url)
+                return listed
+            try:
+                prefetched[url] = await self.fetch_sitemap(url, retries=1)
+            except ET.ParseError:
+                logger.warning(f"⚠️ {url} không phải XML hợp lệ")
+                return []
+            return [url]
+
+        start = time()
+        deadline = start + Config.DISCOVERY_DEADLINE
+        first_found_at = None
+        for variant in variants:
+            for i, url in enumerate(self.parser._sitemap_candidates(variant)):
+                is_robots = url.endswith("/robots.txt")
+                pending[asyncio.ensure_future(probe(url, is_robots))] = (variant, url, (i, 0))
+
+        try:
+            while pending:
+                now = time()
+                timeout = deadline - now
+                if first_found_at is not None:
+                    timeout = min(timeout, first_found_at + Config.DISCOVERY_GRACE - now)
+                if timeout <= 0:
+                    break
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    variant, url, order = pending.pop(task)
+                    try:
+                        listed = task.result()
+                    except Exception as e:
+                        if "403" in str(e) or "Forbidden" in str(e):
+                            logger.warning(f"⚠️ 403 Forbidden cho {url}")
+                            if order[1] == 0:
+                                forbidden[variant] += 1
+                        else:
+                            logger.warning(f"⚠️ Không thể fetch {url}: {e}")
+                        continue
+
+                    if url.endswith("/robots.txt") and order[1] == 0:
+                        for j, sm_url in enumerate(listed, start=1):
+                            logger.info(f"📜 Phát hiện sitemap trong robots.txt: {sm_url}")
+                            pending[asyncio.ensure_future(probe(sm_url, False))] = (variant, sm_url, (order[0], j))
+                    elif listed:
+                        logger.info(f"✅ Tìm thấy sitemap tại: {url}")
+                        found[variant].append((order, url))
+                        if first_found_at is None:
+                            first_found_at = time()
+
+                apex_settled = not any(v == apex for v, _, _ in pending.values())
+                if apex_settled and (found[apex] or forbidden[apex] == apex_candidates):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        for variant in variants:
+            if found[variant]:
+                sitemaps = list(dict.fromkeys(url for _, url in sorted(found[variant])))
+                logger.info(f"🔍 Tìm thấy {len(sitemaps)} sitemap cho {variant} ({time() - start:.1f}s)")
+                final_urls = [prefetched[url][1].final_url if url in prefetched else url for url in sitemaps]
+                return sitemaps, self.parser.resolved_domain(variant, final_urls)
+
+        if forbidden[apex] == apex_candidates:
+            raise self.parser._forbidden_error(apex, apex_candidates)
+        raise Exception("Không tìm thấy sitemap hợp lệ")
+
+    async def parse_sitemap(
+        self,
+        sitemap_url: str,
+        prefetched: Dict[str, Tuple[List[SitemapEntry], RedirectChain]] = None
+    ) -> Tuple[List[str], List[RedirectChain]]:
+        """Level-by-level walk of a sitemap index, all documents of a level fetched concurrently"""
+        urls = set()
+        redirect_chains = []
+        async for url in self.iter_sitemap_urls(sitemap_url, prefetched, redirect_chains=redirect_chains):
+            urls.add(url)
+        logger.info(f"✅ Parsed {len(urls)} URLs từ {sitemap_url}")
+        return list(urls), redirect_chains
+
+    async def load_sitemap(
+        self,
+        url: str,
+        prefetched: Dict[str, Tuple[List[SitemapEntry], RedirectChain]]
+    ) -> Tuple[List[SitemapEntry], RedirectChain]:
+        """Entries of one sitemap document (reusing the one fetched during discovery)"""
+        if url in prefetched:
+            return prefetched.pop(url)
+        logger.info(f"📥 Đang parse sitemap: {url}")
+        try:
+            async with self.host_slot(url):
+                return await self.fetch_sitemap(url)
+        except ET.ParseError as e:
+            raise Exception(f"Lỗi parse XML {url}: {e}")
+
+    async def iter_sitemap_urls(
+        self,
+        sitemap_url: str,
+        prefetched: Dict[str, Tuple[List[SitemapEntry], RedirectChain]] = None,
+        visited: Set[str] = None,
+        redirect_chains: List[RedirectChain] = None
+    ) -> AsyncIterator[str]:
+        """
+        Page URLs of a sitemap (index) as documents arrive. Documents of one level
+        are fetched concurrently and yielded in completion order.
+        """
+        prefetched = prefetched if prefetched is not None else {}
+        visited = visited if visited is not None else set()
+        redirect_chains = redirect_chains if redirect_chains is not None else []
+        if sitemap_url in visited:
+            return
+        visited.add(sitemap_url)
+        level = [sitemap_url]
+        depth = 0
+
+        while level:
+            if depth > Config.MAX_SITEMAP_DEPTH:
+                logger.warning(f"⚠️ Quá độ sâu cho sitemap: {level[0]}")
+                break
+
+            tasks = [asyncio.ensure_future(self.load_sitemap(url, prefetched)) for url in level]
+            next_level = []
+            try:
+                for future in asyncio.as_completed(tasks):
+                    entries, chain = await future
+                    SitemapParser.record_chain(redirect_chains, chain)
+                    for entry in entries:
+                        if entry.kind == 'url':
+                            yield entry.loc
+                        elif entry.loc not in visited:
+                            visited.add(entry.loc)
+                            next_level.append(entry.loc)
+            finally:
+                # A document failed or the consumer stopped: drop its siblings
+                for task in tasks:
+                    task.cancel()
+            level = next_level
+            depth += 1
+
+    # -------------------------------
+    # Content pages
+    # -------------------------------
+    @asynccontextmanager
+    async def page_response(self, url: str, headers: dict):
+        """GET an HTML page (redirects followed) under the host limits and page budget; body left unread"""
+        async with self.host_slot(url), self.page_budget:
+            wait = rate_limiter.reserve(url)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            start = time()
+            try:
+                response = await self.session.get(url, headers=headers, allow_redirects=True)
+            except asyncio.TimeoutError:
+                host_limiter.record(url, timeout=True)
+                raise
+            # Feedback for the host whose slot is held, even if the page redirected away
+            host_limiter.record(url, response.status, time() - start, response.headers.get('Retry-After'))
+            try:
+                yield response
+            finally:
+                response.release()
+
+    @staticmethod
+    async def read_page(response: 'aiohttp.ClientResponse') -> str:
+        """Download a whole HTML page body and decode it"""
+        body = await response.read()
+        # Auto-detect encoding cho tiếng Việt
+        return body.decode(charset_detector.detect(response.charset, body), errors='replace')
+
+    @staticmethod
+    async def read_metadata(response: 'aiohttp.ClientResponse', url: str, max_bytes: int) -> PageMetadata:
+        """Head-only read: parse while downloading, stop once title/meta/first <h1> are read"""
+        stream = MetadataStream(url)
+        decoder = None
+        read = 0
+        async for chunk in response.content.iter_chunked(Config.CONTENT_CHUNK_SIZE):
+            if decoder is None:
+                encoding = charset_detector.detect(response.charset, chunk)
+                decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            read += len(chunk)
+            if stream.feed(decoder.decode(chunk)) or read >= max_bytes:
+                break
+        else:
+            if decoder is not None:
+                stream.feed(decoder.decode(b'', final=True))
+        return stream.result()
+
+
+class AsyncCrawlerService(CrawlerService):
+    """CrawlerService running on the asyncio engine"""
+
+    def process_domain(self, domain: str, refresh: bool = False) -> Dict:
+        async def run():
+            async with AsyncCrawlEngine() as engine:
+                return await self._process_domain(engine, domain, refresh)
+        return asyncio.run(run())
+
+    def process_domains(
+        self,
+        domains: List[str],
+        max_workers: int = None,
+        callback=None,
+        cancel: Optional[Event] = None,
+        flow: Optional[str] = None,
+        refresh: bool = False
+    ) -> List[Dict]:
+        """
+        Same contract as CrawlerService.process_domains; max_workers bounds the
+        number of domains crawled at once (default: Config.ASYNC_MAX_DOMAINS).
+        The domains run on this call's event loop, not on the shared crawl
+        workers, so `flow` doesn't apply.
+        """
+        return asyncio.run(
+            self._process_domains(domains, max_workers or Config.ASYNC_MAX_DOMAINS, callback, cancel, refresh)
+        )
+
+    async def _process_domains(
+        self, domains: List[str], max_domains: int, callback, cancel: Optional[Event], refresh: bool
+    ) -> List[Dict]:
+        results = []
+        total_domains = len(domains)
+        logger.info(f"⚙️ [async] Bắt đầu crawl {total_domains} domain ({max_domains} domain cùng lúc)")
+
+        async with AsyncCrawlEngine() as engine:
+            slots = asyncio.Semaphore(max_domains)
+
+            async def run(domain: str) -> Optional[Dict]:
+                async with slots:
+                    if cancel is not None and cancel.is_set():
+                        return None
+                    return await self._process_domain(engine, domain, refresh)
+
+            for future in asyncio.as_completed([run(domain) for domain in domains]):
+                result = await future
+                if result is None:
+                    continue  # Dropped by cancel
+                results.append(result)
+                # Call callback if provided (for SSE streaming)
+                if callback:
+                    callback(result, len(results), total_domains)
+
+        logger.info(f"✅ Hoàn tất crawl {total_domains} domain")
+        return results
+
+    async def _process_domain(self, engine: AsyncCrawlEngine, domain: str, refresh: bool = False) -> Dict:
+        """Crawl a domain on engine, like CrawlerService.process_domain"""
+        return await domain_flights.arun(
+            flight_key('sitemap', domain, refresh), lambda emit, cancel: self._acrawl_domain(engine, domain, refresh)
+        )
+
+    async def _acrawl_domain(self, engine: AsyncCrawlEngine, domain: str, refresh: bool) -> Dict:
+        start_time = time()
+        sitemaps_data = []
+        listings = []
+        all_urls = CanonicalUrlSet()
+        all_redirect_chains = []
+        prefetched = {}
+
+        try:
+            domain_clean = domain.replace("https://", "").replace("http://", "").strip("/")
+
+            cached = await asyncio.to_thread(sitemap_cache.get, domain_clean, refresh)
+            if cached is not None:
+                logger.info(f"♻️ [async] Dùng kết quả sitemap đã cache cho {domain_clean} ({cached.url_count} URL)")
+                return self.build_cached_result(cached, domain_clean, time() - start_time)
+
+            logger.info(f"🚀 [async] Bắt đầu crawl domain: {domain_clean}")
+
+            sitemaps, final_domain = await engine.discover_sitemaps(domain_clean, prefetched)
+
+            for sitemap_url in sitemaps:
+                sitemap_start = time()
+                try:
+                    urls, redirect_chains = await engine.parse_sitemap(sitemap_url, prefetched)
+                    sitemap_info = self.build_sitemap_info(sitemap_url, urls, redirect_chains, time() - sitemap_start)
+                    all_urls.update(sitemap_info["urls"])
+                    all_redirect_chains.extend(redirect_chains)
+                    sitemaps_data.append(sitemap_info)
+                    listings.append(SitemapListing(sitemap_url, urls, [chain.to_dict() for chain in redirect_chains]))
+                except Exception as e:
+                    logger.error(f"❌ Lỗi parse sitemap {sitemap_url}: {e}")
+                    sitemaps_data.append({
+                        "sitemap": sitemap_url,
+                        "count": 0,
+                        "duration": round(time() - sitemap_start, 2),
+                        "error": str(e),
+                    })
+
+            total_duration = time() - start_time
+            logger.info(f"🏁 [async] Crawl hoàn tất cho {final_domain}: {len(all_urls)} URL trong {total_duration:.2f}s")
+            result = self.build_domain_result(
+                final_domain, domain_clean, all_urls, sitemaps_data, all_redirect_chains, total_duration,
+                dedup=all_urls.get_stats()
+            )
+            result["sitemap_cache"] = sitemap_cache.summary(None, refresh)
+            if listings and len(listings) == len(sitemaps):
+                await asyncio.to_thread(sitemap_cache.put, SitemapSnapshot(domain_clean, final_domain, listings))
+            return result
+
+        except Exception as e:
+            logger.error(f"💥 Crawl thất bại cho {domain}: {e}")
+            return {
+                "domain": domain,
+                "status": "failed",
+                "error": str(e),
+                "duration": time() - start_time,
+            }
+
+
+class AsyncContentCrawlerService(ContentCrawlerService):
+    """ContentCrawlerService running on the asyncio engine"""
+
+    def discover_and_crawl_domain(
+        self,
+        domain: str,
+        callback: Optional[Callable] = None,
+        **crawl_options
+    ) -> Dict:
+        async def run():
+            async with AsyncCrawlEngine() as engine:
+                return await self._discover_and_crawl(engine, domain, callback, **crawl_options)
+        return asyncio.run(run())
+
+    def process_domains(
+        self,
+        domains: List[str],
+        callback: Optional[Callable] = None,
+        url_callback: Optional[Callable] = None,
+        start_callback: Optional[Callable] = None,
+        max_domains: Optional[int] = None,
+        **crawl_options,
+    ) -> List[Dict]:
+        """Same contract as ContentCrawlerService.process_domains, all domains on one event loop"""
+        domains = [d.strip() for d in domains if d.strip()]
+        return asyncio.run(self._process_domains(
+            domains, max(1, max_domains or self.max_domains), callback, url_callback, start_callback,
+            crawl_options
+        ))
+
+    async def _process_domains(
+        self,
+        domains: List[str],
+        max_domains: int,
+        callback: Optional[Callable],
+        url_callback: Optional[Callable],
+        start_callback: Optional[Callable],
+        crawl_options: Dict
+    ) -> List[Dict]:
+        results = []
+        total_domains = len(domains)
+        started = 0
+        cancel = crawl_options.get('cancel')
+        logger.info(f"🚀 [GP Content][async] Processing {total_domains} domains ({max_domains} domain cùng lúc)")
+
+        async with AsyncCrawlEngine() as engine:
+            slots = asyncio.Semaphore(max_domains)
+
+            async def run(domain: str) -> Dict:
+                nonlocal started
+                async with slots:
+                    if cancel is not None and cancel.is_set():
+                        return self._error(domain, 'Đã hủy')
+                    started += 1
+                    if start_callback:
+                        start_callback(domain, started, total_domains)
+                    return await self._discover_and_crawl(engine, domain, url_callback, **crawl_options)
+
+            for future in asyncio.as_completed([run(domain) for domain in domains]):
+                result = await future
+                results.append(result)
+                if callback:
+                    callback(result, len(results), total_domains)
+                logger.info(f"✅ [{len(results)}/{total_domains}] Done: {result['domain']}")
+
+        return results
+
+    async def _discover_and_crawl(
+        self,
+        engine: AsyncCrawlEngine,
+        domain: str,
+        callback: Optional[Callable],
+        collect_results: bool = True,
+        sample: int = 0,
+        sample_recent: bool = False,
+        cancel: Optional[Event] = None,
+        flow: Optional[str] = None,  # thread engine only: pages run on the event loop
+        refresh: bool = False
+    ) -> Dict:
+        """Joins the same running crawl like ContentCrawlerService.discover_and_crawl_domain"""
+        results = []
+
+        def on_result(result: Dict, completed: int, total: int):
+            if collect_results:
+                results.append(result)
+            if callback:
+                callback(result, completed, total)
+
+        result = await domain_flights.arun(
+            flight_key('content', domain, sample, sample_recent, refresh),
+            lambda emit, shared_cancel: self._adiscover_and_crawl(
+                engine, domain, emit, sample, sample_recent, shared_cancel, refresh
+            ),
+            on_event=on_result,
+            cancel=cancel,
+        )
+        result['results'] = results
+        return result
+
+    async def _adiscover_and_crawl(
+        self,
+        engine: AsyncCrawlEngine,
+        domain: str,
+        callback: Callable,
+        sample: int,
+        sample_recent: bool,
+        cancel: Optional[Event],
+        refresh: bool
+    ) -> Dict:
+        domain = domain.strip().replace('https://', '').replace('http://', '').rstrip('/')
+        logger.info(f"🚀 [GP Content][async] Starting: {domain}")
+        start_time = time()
+
+        try:
+            # Cached sitemap crawl of the domain first (see ContentCrawlerService)
+            snapshot = None
+            if not (sample and sample_recent):
+                snapshot = await asyncio.to_thread(sitemap_cache.get, domain, refresh)
+            prefetched = {}
+            if snapshot is None:
+                sitemap_urls, final_domain = await engine.discover_sitemaps(domain, prefetched)
+            else:
+                final_domain = snapshot.final_domain
+
+            # Parsing and crawling run as a pipeline (see ContentCrawlerService)
+            url_filter = DomainFilter(domain, final_domain)
+            pages = CanonicalUrlSet()
+            sampler = None
+            if sample:
+                sampler = UrlSampler(sample, recency_weight=sample_recent)
+                if snapshot is not None:
+                    picked = self._sample_cached_urls(snapshot, url_filter, sampler, pages)
+                else:
+                    picked = await self._asample_page_urls(
+                        engine, sitemap_urls, prefetched, url_filter, sampler, pages
+                    )
+                jobs = self._aiter_list(picked)
+                total_so_far = lambda: len(picked)
+            elif snapshot is not None:
+                jobs = self._aiter_list(self._cached_page_urls(snapshot, url_filter, pages))
+                total_so_far = lambda: url_filter.accepted
+            else:
+                jobs = self._aiter_page_urls(engine, sitemap_urls, prefetched, url_filter, pages)
+                total_so_far = lambda: url_filter.accepted
+
+            crawled = 0
+            completed = 0
+            cache_counts = Counter()
+            async for result in self._aiter_crawl(engine, jobs, domain, cancel):
+                completed += 1
+                if result:
+                    crawled += 1
+                    cache_counts[result['cache_status']] += 1
+                    pages.learn(result['actual_url'], result['final_url'], result['canonical_url'])
+                    callback(result, completed, total_so_far())
+
+            total_urls = total_so_far()
+            if total_urls == 0:
+                return self._error(domain, 'Không tìm thấy URLs trong sitemap')
+            target_domain = url_filter.target
+
+            duration = time() - start_time
+            logger.info(f"✅ [async] Done {domain}: {crawled}/{total_urls} URLs in {duration:.1f}s")
+            result = {
+                'domain': domain,
+                'original_domain': domain,
+                'target_domain': target_domain,
+                'has_redirect': domain != target_domain,
+                'status': 'success',
+                'total_urls': total_urls,
+                'crawled_urls': crawled,
+                'results': [],  # filled per participant by _discover_and_crawl
+                'duration': round(duration, 2),
+                'cache': self.cache_summary(cache_counts),
+                'dedup': pages.get_stats(),
+                'sitemap_cache': sitemap_cache.summary(snapshot, refresh),
+            }
+            if sampler is not None:
+                result['sample'] = self.sample_summary(sampler)
+            return result
+
+        except Exception as e:
+            logger.error(f"❌ [GP Content][async] {domain}: {e}")
+            return self._error(domain, str(e))
+
+    async def _aiter_page_urls(
+        self,
+        engine: AsyncCrawlEngine,
+        sitemap_urls: List[str],
+        prefetched: Dict,
+        url_filter: DomainFilter,
+        pages: CanonicalUrlSet
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """Async counterpart of _iter_page_urls"""
+        visited = set()
+        for sitemap_url in sitemap_urls:
+            try:
+                async for url in engine.iter_sitemap_urls(sitemap_url, prefetched, visited):
+                    if pages.add(url) and url_filter.accept(url):
+                        yield url, url_filter.target
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to parse {sitemap_url}: {e}")
+
+        logger.info(f"🔍 [GP Content][async] {url_filter.accepted} URLs từ {len(sitemap_urls)} sitemap")
+
+    async def _asample_page_urls(
+        self,
+        engine: AsyncCrawlEngine,
+        sitemap_urls: List[str],
+        prefetched: Dict,
+        url_filter: DomainFilter,
+        sampler: UrlSampler,
+        pages: CanonicalUrlSet
+    ) -> List[Tuple[str, str]]:
+        """
+        Async counterpart of _sample_page_urls. aiohttp sitemap fetches read whole
+        documents, so only the number of documents opened is bounded here.
+        """
+        visited = set(sitemap_urls)
+        level = [SitemapEntry('sitemap', url) for url in sitemap_urls]
+        depth = 0
+
+        async def load(url: str) -> Tuple[str, List[SitemapEntry]]:
+            try:
+                entries, _ = await engine.load_sitemap(url, prefetched)
+                return url, entries
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to parse {url}: {e}")
+                return url, []
+
+        while level and not sampler.full:
+            if depth > Config.MAX_SITEMAP_DEPTH:
+                logger.warning(f"⚠️ Quá độ sâu cho sitemap: {level[0].loc}")
+                break
+
+            level = sampler.choose_sitemaps(level, lambda entry: entry.lastmod)
+            quota = sampler.doc_quota(len(level))
+            next_level = []
+            tasks = [asyncio.ensure_future(load(entry.loc)) for entry in level]
+            try:
+                for future in asyncio.as_completed(tasks):
+                    sitemap_url, entries = await future
+                    taken = 0
+                    for entry in entries:
+                        if entry.kind != 'url':
+                            if entry.loc not in visited:
+                                visited.add(entry.loc)
+                                next_level.append(entry)
+                            continue
+                        if taken >= quota or not pages.add(entry.loc):
+                            continue
+                        taken += 1
+                        if url_filter.accept(entry.loc):
+                            sampler.add(sitemap_url, entry.loc, entry.lastmod)
+                    if sampler.full:
+                        break
+            finally:
+                for task in tasks:
+                    task.cancel()
+            level = next_level
+            depth += 1
+
+        picked = sampler.pick()
+        logger.info(
+            f"🎯 [GP Content][async] Sample {len(picked)}/{sampler.n} URLs từ {sampler.candidates} candidates "
+            f"({sampler.strata} strata)"
+        )
+        return [(url, url_filter.target) for url in picked]
+
+    @staticmethod
+    async def _aiter_list(jobs: Iterable[Tuple[str, str]]) -> AsyncIterator[Tuple[str, str]]:
+        for job in jobs:
+            yield job
+
+    async def _aiter_crawl(
+        self,
+        engine: AsyncCrawlEngine,
+        jobs: AsyncIterator[Tuple[str, str]],
+        original_domain: str,
+        cancel: Optional[Event] = None
+    ) -> AsyncIterator[Optional[Dict]]:
+        """
+        Async counterpart of _iter_crawl: a feeder task schedules jobs, at most
+        ASYNC_CONTENT_CONCURRENCY pages at a time, results are yielded in
+        completion order.
+        """
+        finished = asyncio.Queue()
+        window = asyncio.Semaphore(max(1, Config.ASYNC_CONTENT_CONCURRENCY))
+        pending = set()
+        submitted = 0
+
+        def on_done(task: asyncio.Task):
+            pending.discard(task)
+            window.release()
+            finished.put_nowait(task)
+
+        async def feed():
+            nonlocal submitted
+            try:
+                async for url, target_domain in jobs:
+                    await window.acquire()
+                    if cancel is not None and cancel.is_set():
+                        window.release()
+                        break
+                    task = asyncio.ensure_future(
+                        self._crawl_single_url(engine, url, original_domain, target_domain)
+                    )
+                    pending.add(task)
+                    task.add_done_callback(on_done)
+                    submitted += 1
+            except Exception as e:
+                logger.error(f"❌ [GP Content][async] URL feeder: {e}")
+            finally:
+                finished.put_nowait(None)  # Every job is scheduled
+
+        feeder = asyncio.ensure_future(feed())
+        received = 0
+        total = None
+        try:
+            while total is None or received < total:
+                task = await finished.get()
+                if task is None:
+                    total = submitted
+                    continue
+                received += 1
+                if not task.cancelled():
+                    yield task.result()
+        finally:
+            feeder.cancel()
+            for task in list(pending):
+                task.cancel()
+
+    async def _crawl_single_url(
+        self,
+        engine: AsyncCrawlEngine,
+        url: str,
+        original_domain: str,
+        target_domain: str
+    ) -> Optional[Dict]:
+        cached = await asyncio.to_thread(content_cache.get, url)
+        if cached is not None and cached.fresh:
+            content_cache.hit(cached)
+            return self._page_result(url, cached.metadata, original_domain, target_domain, 0.0, 'hit')
+
+        start_time = time()
+        headers = self.headers
+        if cached is not None:
+            headers = {**self.headers, **cached.conditional_headers()}
+        try:
+            async with engine.page_response(url, headers) as response:
+                if cached is not None and response.status == 304:
+                    await asyncio.to_thread(content_cache.hit, cached, True)
+                    logger.info(f"💾 304 Not Modified, served from cache: {url}")
+                    return self._page_result(
+                        url, cached.metadata, original_domain, target_domain, time() - start_time, 'revalidated',
+                        str(response.url)
+                    )
+                content_cache.miss()
+
+                html_content = None
+                if self.streaming:
+                    # Head-only: parsing a few chunks is cheap enough for the event loop
+                    metadata = await engine.read_metadata(response, url, self.max_bytes)
+                else:
+                    html_content = await engine.read_page(response)
+                duration = time() - start_time
+
+            if html_content is not None:
+                # Whole-page parsing is CPU work - off the event loop, and after the host
+                # slot and page budget are released so it doesn't count as network concurrency
+                metadata = await asyncio.to_thread(self.html_parser.extract_metadata, html_content, url)
+            if response.status == 200:
+                await asyncio.to_thread(content_cache.store, url, metadata, response.headers)
+            return self._page_result(
+                url, metadata, original_domain, target_domain, duration, 'miss', str(response.url)
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"❌ Request failed {url}: {e!r}")
+            return None
+        except Exception as e:
+            logger.error(f"❌ Unexpected error {url}: {e}")
+            return None
@@ -3,17 +3,82 @@ GP Content Crawler Service
 Crawls URLs from sitemap and extracts: URL + Title + Keywords
 """
 
-import random
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from time import time, sleep
-from typing import Callable, Dict, List, Optional, Tuple
-from urllib.parse import urlparse, urlunparse
+from collections import Counter
+from dataclasses import dataclass
+from concurrent.futures import Future, as_completed
+from functools import partial
+from queue import Queue
+from threading import BoundedSemaphore, Event, Lock, Semaphore, Thread
+from time import time
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+from urllib.parse import urljoin, urlparse, urlunparse
 
 from config import Config
-from services.sitemap_parser import SitemapParser
-from utils.html_parser import HTMLParser
+from services.sitemap_parser import FetchedBodyCache, SitemapEntry, SitemapParser
+from utils.charset import charset_detector
+from utils.content_cache import CachedContent, content_cache
+from utils.host_limiter import host_limiter
+from utils.html_parser import HeadBoundary, HTMLParser, PageMetadata
+from utils.http_client import http_client
 from utils.logger import logger
+from utils.parse_pool import parse_pool
+from utils.rate_limiter import rate_limiter
+from utils.scheduler import crawl_scheduler, domain_scheduler, fanout_scheduler
+from utils.singleflight import domain_flights, flight_key
+from utils.sitemap_cache import SitemapSnapshot, sitemap_cache
+from utils.url_canonical import CanonicalUrlSet
+from utils.url_sampler import UrlSampler
+
+
+class DomainFilter:
+    """
+    Streaming domain filter for sitemap URLs, handling a redirected domain.
+
+    URLs on the domain the user entered are kept. If discovery found the
+    sitemaps on another host (final_domain: the domain redirects, e.g. user
+    enters "keonhacai.fit", sitemap lists "https://pricol.org.mx/..."), the
+    host of the first URL seen is the redirect target and is kept as well.
+    Otherwise other hosts (CDN, partner links) are dropped.
+    """
+
+    def __init__(self, original_domain: str, final_domain: str = ''):
+        self.original = self._host(original_domain)
+        redirected = bool(final_domain) and self._host(final_domain) != self.original
+        self._target: Optional[str] = None if redirected else self.original
+        self.accepted = 0
+
+    @staticmethod
+    def _host(domain_or_netloc: str) -> str:
+        return domain_or_netloc.replace('www.', '').lower()
+
+    @property
+    def target(self) -> str:
+        """Domain thật trong sitemap (khác original nếu redirect)"""
+        return self._target or self.original
+
+    def accept(self, url: str) -> bool:
+        host = self._host(urlparse(url).netloc)
+        if self._target is None:
+            self._target = host
+            if host != self.original:
+                logger.info(f"✅ Redirect detected: {self.original} → {host}")
+        if host in (self.original, self._target):
+            self.accepted += 1
+            return True
+        return False
+
+
+@dataclass
+class FetchedPage:
+    """A downloaded page (or its head), handed from the network stage to the parse stage"""
+    body: bytes
+    encoding: str
+    status_code: int
+    headers: Mapping[str, str]
+    final_url: str
+    duration: float
+    not_modified: bool = False  # 304 on a revalidation: serve the cached result
 
 
 class ContentCrawlerService:
@@ -25,9 +90,19 @@ class ContentCrawlerService:
             'Accept-Language': 'vi-VN,vi;q=0.9,en;q=0.8',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         }
-        self.max_workers = 5
+        # Upper bound; the adaptive per-host limiter decides how many actually run
+        self.max_workers = Config.MAX_WORKERS
+        # Domains crawled at once, and page fetches in flight across all of them
+        self.max_domains = Config.GP_MAX_DOMAINS
+        self.fetch_budget = BoundedSemaphore(max(1, Config.GP_FETCH_BUDGET))
+        # Page tasks held back by _admit go again once a host slot (and the budget unit freed with it) is back
+        host_limiter.add_listener(crawl_scheduler.wake)
+        self.submit_window = max(1, Config.CONTENT_SUBMIT_WINDOW)
         self.sitemap_parser = SitemapParser()
         self.html_parser = HTMLParser()
+        # Head-only mode: read pages until title/meta/first <h1> are found or the budget is spent
+        self.streaming = Config.CONTENT_STREAMING
+        self.max_bytes = Config.CONTENT_MAX_BYTES
 
     def crawl_single_url(
         self,
@@ -46,44 +121,152 @@ class ContentCrawlerService:
         Returns:
             Dict with original_url (hiển thị), actual_url (click), title, keywords
         """
+        # Fresh cached result: no request, no parse
+        cached = content_cache.get(url)
+        if cached is not None and cached.fresh:
+            return self._cached_result(url, cached, original_domain, target_domain)
+
+        # Host slot first: threads waiting on a busy/paused host don't hold budget.
+        # Both are released before parsing: CPU time doesn't count against network concurrency
+        with host_limiter.slot(url), self.fetch_budget:
+            rate_limiter.acquire(url)  # Only waits for other requests to the same host
+            page = self._fetch_page(url, cached)
+        return self._page_from_fetch(url, page, cached, original_domain, target_domain)
+
+    def _crawl_admitted(
+        self,
+        url: str,
+        cached: Optional[CachedContent],
+        original_domain: str,
+        target_domain: str
+    ) -> Optional[Dict]:
+        """crawl_single_url for a page task admitted by the scheduler (see _admit): fetch, release, parse"""
+        try:
+            page = self._fetch_page(url, cached)
+        finally:
+            self._release(url)
+        return self._page_from_fetch(url, page, cached, original_domain, target_domain)
+
+    def _admit(self, url: str, *_) -> Union[bool, float]:
+        """
+        Scheduler admission of a page task: take a fetch_budget unit, its host
+        slot and a politeness token without waiting, or none of them.
+
+        Returns:
+            True once taken; else False (retried when a host slot is released,
+            see __init__) or the seconds until the host's pause or politeness
+            delay is over
+        """
+        wait = max(host_limiter.blocked_for(url), rate_limiter.delay(url))
+        if wait > 0:
+            return wait
+        if not self.fetch_budget.acquire(blocking=False):
+            return False
+        if not host_limiter.try_acquire(url):
+            self.fetch_budget.release()
+            return False
+        if not rate_limiter.try_acquire(url):
+            self._release(url)
+            return rate_limiter.delay(url) or False
+        return True
+
+    def _release(self, url: str, *_):
+        """Give back what _admit took (the politeness token is spent either way)"""
+        self.fetch_budget.release()
+        host_limiter.release(url)
+
+    def _cached_result(
+        self,
+        url: str,
+        cached: CachedContent,
+        original_domain: str,
+        target_domain: str
+    ) -> Dict:
+        content_cache.hit(cached)
+        return self._page_result(url, cached.metadata, original_domain, target_domain, 0.0, 'hit')
+
+    def _page_from_fetch(
+        self,
+        url: str,
+        page: Optional['FetchedPage'],
+        cached: Optional[CachedContent],
+        original_domain: str,
+        target_domain: str
+    ) -> Optional[Dict]:
+        """Parse stage of crawl_single_url (no host slot or budget held)"""
+        if page is None:
+            return None
+
+        if page.not_modified:
+            content_cache.hit(cached, revalidated=True)
+            logger.info(f"💾 304 Not Modified, served from cache: {url}")
+            return self._page_result(
+                url, cached.metadata, original_domain, target_domain, page.duration, 'revalidated', page.final_url
+            )
+
+        try:
+            # ✅ FIX: Dùng keywords từ HTML (có dấu) thay vì extract_keywords_from_url (không dấu)
+            # One parse for title + keywords, in the CPU stage (process pool)
+            metadata = parse_pool.extract(page.body, page.encoding, url)
+        except Exception as e:
+            logger.error(f"❌ Unexpected error {url}: {e}")
+            return None
+        if page.status_code == 200:
+            content_cache.store(url, metadata, page.headers)
+
+        logger.info(
+            f"✅ Crawled {url} ({page.duration:.2f}s) | title='{metadata.title[:40]}' | kw='{metadata.keywords[:30]}'"
+        )
+        return self._page_result(
+            url, metadata, original_domain, target_domain, page.duration, 'miss', page.final_url
+        )
+
+    def _fetch_page(self, url: str, cached: Optional[CachedContent] = None) -> Optional['FetchedPage']:
+        """Network stage of crawl_single_url: download the page (or its head), None on failure"""
         start_time = time()
+        headers = self.headers
+        if cached is not None:
+            # Expired entry: revalidate, a 304 is served from the cache
+            headers = {**self.headers, **cached.conditional_headers()}
         try:
-            response = requests.get(
+            response = http_client.get(
                 url,
-                headers=self.headers,
+                headers=headers,
                 timeout=self.timeout,
                 allow_redirects=True,
                 verify=False,
+                stream=self.streaming,
+            )
+            # Feedback for the host whose slot is held, even if the page redirected away
+            host_limiter.record(
+                url,
+                response.status_code,
+                response.elapsed.total_seconds(),
+                response.headers.get('Retry-After')
             )
 
-            # Auto-detect encoding cho tiếng Việt
-            if response.encoding is None or response.encoding.lower() == 'iso-8859-1':
-                response.encoding = response.apparent_encoding or 'utf-8'
-
-            html_content = response.text
-            duration = time() - start_time
-
-            # ✅ FIX: Dùng extract_keywords_from_html (có dấu) thay vì extract_keywords_from_url (không dấu)
-            title = self.html_parser.extract_title_from_html(html_content)
-            keywords = self.html_parser.extract_keywords_from_html(html_content, url)
-
-            # Create original_url by replacing domain
-            original_url = self._replace_domain(url, target_domain, original_domain)
-
-            logger.info(f"✅ Crawled {url} ({duration:.2f}s) | title='{title[:40]}' | kw='{keywords[:30]}'")
-
-            return {
-                'domain': original_domain,     # Domain người dùng nhập
-                'original_url': original_url,  # https://keonhacai.fit/slug/
-                'actual_url': url,             # https://pricol.org.mx/slug/
-                'title': title,
-                'keywords': keywords,
-                'status': 'success',
-                'duration': round(duration, 2),
-            }
+            if cached is not None and response.status_code == 304:
+                response.close()
+                return FetchedPage(
+                    b'', '', response.status_code, response.headers, str(response.url), time() - start_time,
+                    not_modified=True
+                )
+            content_cache.miss()
+
+            if self.streaming:
+                # Stop downloading once the head (+ first <h1>) is in
+                body = self._read_head(response, url)
+            else:
+                body = response.content
+            # Auto-detect encoding cho tiếng Việt (cheap checks before statistical detection)
+            encoding = charset_detector.detect(response.encoding, body)
+            return FetchedPage(
+                body, encoding, response.status_code, response.headers, str(response.url), time() - start_time
+            )
 
         except requests.exceptions.Timeout:
             logger.warning(f"⏱️ Timeout: {url}")
+            host_limiter.record(url, timeout=True)
             return None
         except requests.exceptions.RequestException as e:
             logger.warning(f"❌ Request failed {url}: {e}")
@@ -96,6 +279,12 @@ class ContentCrawlerService:
         self,
         domain: str,
         callback: Optional[Callable] = None,
+        collect_results: bool = True,
+        sample: int = 0,
+        sample_recent: bool = False,
+        cancel: Optional[Event] = None,
+        flow: Optional[str] = None,
+        refresh: bool = False,
     ) -> Dict:
         """
         Discover sitemap → lấy URLs → crawl từng URL.
@@ -103,81 +292,131 @@ class ContentCrawlerService:
         Args:
             domain: Domain cần crawl (có hoặc không có https://)
             callback: fn(result, completed, total) — gọi mỗi khi crawl xong 1 URL
+            collect_results: Keep URL results in the returned dict. Set False when
+                the callback consumes them, so memory doesn't grow with the sitemap
+            sample: Crawl only this many URLs, stratified by sitemap and path prefix (0 = all)
+            sample_recent: Favour recently modified URLs (<lastmod>) when sampling
+            cancel: Once set, no more URLs are scheduled (pages in flight finish)
+            flow: Scheduler flow (job) the page fetches run in, for fair sharing between jobs
+            refresh: Discover and parse the sitemaps even if a sitemap crawl of the
+                domain is cached (utils.sitemap_cache)
+
+        If the same crawl (domain, sample options) is already running, this joins
+        it: the callback gets the URL results seen so far, then the live ones.
+        The shared crawl stops early only once every participant has cancelled.
 
         Returns:
             {domain, status, total_urls, crawled_urls, results, duration}
         """
+        results = []
+
+        def on_result(result: Dict, completed: int, total: int):
+            if collect_results:
+                results.append(result)
+            if callback:
+                callback(result, completed, total)
+
+        result = domain_flights.run(
+            flight_key('content', domain, sample, sample_recent, refresh),
+            lambda emit, shared_cancel: self._discover_and_crawl_domain(
+                domain, emit, sample, sample_recent, shared_cancel, flow, refresh
+            ),
+            on_event=on_result,
+            cancel=cancel,
+        )
+        result['results'] = results
+        return result
+
+    def _discover_and_crawl_domain(
+        self,
+        domain: str,
+        callback: Callable,
+        sample: int,
+        sample_recent: bool,
+        cancel: Optional[Event],
+        flow: Optional[str],
+        refresh: bool
+    ) -> Dict:
+        """Crawl of discover_and_crawl_domain; URL results only go to the callback"""
         domain = domain.strip().replace('https://', '').replace('http://', '').rstrip('/')
         logger.info(f"🚀 [GP Content] Starting: {domain}")
         start_time = time()
 
         try:
-            # Step 1: Discover sitemaps
-            sitemap_urls, _ = self.sitemap_parser.discover_sitemaps(domain)
-            if not sitemap_urls:
-                return self._error(domain, 'Không tìm thấy sitemap')
-
-            # Step 2: Parse sitemaps → lấy tất cả URLs
-            all_urls = []
-            for sitemap_url in sitemap_urls:
-                try:
-                    urls, _ = self.sitemap_parser.parse_sitemap(sitemap_url)
-                    all_urls.extend(urls)
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to parse {sitemap_url}: {e}")
-
-            all_urls = list(set(all_urls))
-
-            # Step 3: Smart domain filtering (handle redirect domain)
-            all_urls, target_domain = self._filter_urls_by_domain(domain, all_urls)
-            total_urls = len(all_urls)
-
+            # Step 1: URLs of a recent sitemap crawl of the domain, if cached (recency
+            # sampling needs <lastmod>, which isn't kept), else discover the sitemaps
+            # (validated bodies are reused by step 2)
+            snapshot = None if sample and sample_recent else sitemap_cache.get(domain, refresh)
+            if snapshot is None:
+                body_cache = FetchedBodyCache()
+                sitemap_urls, final_domain = self.sitemap_parser.discover_sitemaps(domain, body_cache=body_cache)
+                if not sitemap_urls:
+                    return self._error(domain, 'Không tìm thấy sitemap')
+            else:
+                final_domain = snapshot.final_domain
+
+            # Step 2+3+4 pipelined: sitemaps are parsed on a feeder thread and every new
+            # URL (deduplicated, filtered by domain) goes straight to the crawl pool
+            original_domain = domain
+            url_filter = DomainFilter(original_domain, final_domain)
+            pages = CanonicalUrlSet()  # equivalent URL forms + learned redirect/canonical targets
+            sampler = None
+            if sample:
+                # Sampling mode: read just enough sitemap entries, then crawl the N picked
+                sampler = UrlSampler(sample, recency_weight=sample_recent)
+                if snapshot is not None:
+                    jobs = self._sample_cached_urls(snapshot, url_filter, sampler, pages)
+                else:
+                    jobs = self._sample_page_urls(sitemap_urls, body_cache, url_filter, sampler, pages)
+                total_so_far = lambda: len(jobs)
+            elif snapshot is not None:
+                jobs = self._cached_page_urls(snapshot, url_filter, pages)
+                total_so_far = lambda: url_filter.accepted
+            else:
+                jobs = self._iter_page_urls(sitemap_urls, body_cache, url_filter, pages)
+                total_so_far = lambda: url_filter.accepted
+
+            crawled = 0
+            completed = 0
+            cache_counts = Counter()
+
+            for url, result in self._iter_crawl(jobs, original_domain, cancel, flow):
+                completed += 1
+                if result:
+                    crawled += 1
+                    cache_counts[result['cache_status']] += 1
+                    # Pages this fetch also covered are not fetched again
+                    pages.learn(url, result['final_url'], result['canonical_url'])
+                    # Total so far: sitemaps may still be adding URLs
+                    callback(result, completed, total_so_far())
+
+            total_urls = total_so_far()
             if total_urls == 0:
                 return self._error(domain, 'Không tìm thấy URLs trong sitemap')
 
-            original_domain = domain
+            target_domain = url_filter.target
             has_redirect = (original_domain != target_domain)
 
-            logger.info(f"🔍 [GP Content] {total_urls} URLs → starting crawl")
-
-            # Step 4: Concurrent crawl
-            results = []
-            completed = 0
-
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                future_to_url = {
-                    executor.submit(self.crawl_single_url, url, original_domain, target_domain): url
-                    for url in all_urls
-                }
-
-                for future in as_completed(future_to_url):
-                    url = future_to_url[future]
-                    try:
-                        result = future.result()
-                        if result:
-                            results.append(result)
-                            completed += 1
-                            if callback:
-                                callback(result, completed, total_urls)
-                        sleep(random.uniform(0.3, 0.8))
-                    except Exception as e:
-                        logger.error(f"❌ Error processing {url}: {e}")
-                        completed += 1
-
             duration = time() - start_time
-            logger.info(f"✅ Done {domain}: {len(results)}/{total_urls} URLs in {duration:.1f}s")
+            logger.info(f"✅ Done {domain}: {crawled}/{total_urls} URLs in {duration:.1f}s")
 
-            return {
+            result = {
                 'domain': domain,
                 'original_domain': original_domain,
                 'target_domain': target_domain,
                 'has_redirect': has_redirect,
                 'status': 'success',
                 'total_urls': total_urls,
-                'crawled_urls': len(results),
-                'results': results,
+                'crawled_urls': crawled,
+                'results': [],  # filled per participant by discover_and_crawl_domain
                 'duration': round(duration, 2),
+                'cache': self.cache_summary(cache_counts),
+                'dedup': pages.get_stats(),
+                'sitemap_cache': sitemap_cache.summary(snapshot, refresh),
             }
+            if sampler is not None:
+                result['sample'] = self.sample_summary(sampler)
+            return result
 
         except Exception as e:
             logger.error(f"❌ [GP Content] {domain}: {e}")
@@ -187,31 +426,372 @@ class ContentCrawlerService:
         self,
         domains: List[str],
         callback: Optional[Callable] = None,
+        url_callback: Optional[Callable] = None,
+        start_callback: Optional[Callable] = None,
+        max_domains: Optional[int] = None,
+        **crawl_options,
     ) -> List[Dict]:
-        """Crawl nhiều domains tuần tự."""
-        logger.info(f"🚀 [GP Content] Processing {len(domains)} domains")
-        results = []
+        """
+        Crawl nhiều domains song song.
 
-        for i, domain in enumerate(domains):
-            domain = domain.strip()
-            if not domain:
-                continue
+        Page fetches of all domains share fetch_budget; each host stays under
+        its adaptive limit. Callbacks run on worker threads, so events of
+        different domains interleave.
 
-            result = self.discover_and_crawl_domain(
-                domain,
-                callback=lambda r, c, t: callback(r, c, t) if callback else None,
-            )
-            results.append(result)
+        Args:
+            domains: Domains cần crawl
+            callback: fn(domain_result, completed_domains, total_domains) — mỗi khi 1 domain xong
+            url_callback: fn(result, completed, total) — mỗi URL xong (completed/total của domain đó)
+            start_callback: fn(domain, started, total_domains) — khi 1 domain bắt đầu
+            max_domains: Domains crawled at once (default: Config.GP_MAX_DOMAINS)
+            crawl_options: Passed to discover_and_crawl_domain (collect_results, sample, sample_recent,
+                cancel — once set, domains not started yet are skipped, flow)
 
-            if callback:
-                callback(result, i + 1, len(domains))
+        Returns:
+            Domain results, in completion order
+        """
+        domains = [d.strip() for d in domains if d.strip()]
+        total_domains = len(domains)
+        max_domains = max(1, max_domains or self.max_domains)
+        logger.info(f"🚀 [GP Content] Processing {total_domains} domains ({max_domains} domain cùng lúc)")
+
+        lock = Lock()
+        started = 0
+        cancel = crawl_options.get('cancel')
+
+        def run(domain: str) -> Dict:
+            nonlocal started
+            if cancel is not None and cancel.is_set():
+                return self._error(domain, 'Đã hủy')
+            if start_callback:
+                with lock:
+                    started += 1
+                    current = started
+                start_callback(domain, current, total_domains)
+            return self.discover_and_crawl_domain(domain, callback=url_callback, **crawl_options)
+
+        results = []
+        # Domains of all jobs share DOMAIN_WORKERS coordinators (fairly, per job flow)
+        with domain_scheduler.flow(crawl_options.get('flow'), max_running=max_domains) as executor:
+            futures = {executor.submit(run, domain): domain for domain in domains}
+
+            for future in as_completed(futures):
+                domain = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"❌ [GP Content] {domain}: {e}")
+                    result = self._error(domain, str(e))
+                results.append(result)
+
+                if callback:
+                    callback(result, len(results), total_domains)
 
-            logger.info(f"✅ [{i+1}/{len(domains)}] Done: {domain}")
+                logger.info(f"✅ [{len(results)}/{total_domains}] Done: {domain}")
 
         return results
 
     # ─── Helpers ────────────────────────────────────────────────
 
+    def _page_result(
+        self,
+        url: str,
+        metadata: PageMetadata,
+        original_domain: str,
+        target_domain: str,
+        duration: float,
+        cache_status: str,
+        final_url: str = ''
+    ) -> Dict:
+        """
+        Result dict of one page; cache_status is 'hit', 'revalidated' (304) or 'miss'.
+        final_url is the URL after redirects (default: url).
+        """
+        final_url = final_url or url
+        return {
+            'domain': original_domain,     # Domain người dùng nhập
+            'original_url': self._replace_domain(url, target_domain, original_domain),  # https://keonhacai.fit/slug/
+            'actual_url': url,             # https://pricol.org.mx/slug/
+            'title': metadata.title,
+            'keywords': metadata.keywords,
+            'title_source': metadata.title_source,
+            'keywords_source': metadata.keywords_source,
+            'status': 'success',
+            'duration': round(duration, 2),
+            'cache_status': cache_status,
+            'final_url': final_url,
+            'canonical_url': urljoin(final_url, metadata.canonical) if metadata.canonical else '',
+        }
+
+    @staticmethod
+    def sample_summary(sampler: UrlSampler) -> Dict:
+        """Sampling details for the domain result"""
+        return {
+            'requested': sampler.n,
+            'candidates': sampler.candidates,
+            'strata': sampler.strata,
+            'recency_weight': sampler.recency_weight,
+        }
+
+    @staticmethod
+    def cache_summary(counts: Dict[str, int]) -> Dict:
+        """Per-domain content cache counters {'hit', 'revalidated', 'miss'} + hit ratio"""
+        total = sum(counts.values())
+        served = counts.get('hit', 0) + counts.get('revalidated', 0)
+        return {
+            'hits': counts.get('hit', 0),
+            'revalidated': counts.get('revalidated', 0),
+            'misses': counts.get('miss', 0),
+            'hit_ratio': round(served / total, 3) if total else 0.0,
+        }
+
+    def _iter_page_urls(
+        self,
+        sitemap_urls: List[str],
+        body_cache: FetchedBodyCache,
+        url_filter: 'DomainFilter',
+        pages: CanonicalUrlSet
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Page URLs of all sitemaps as they are parsed, one per canonical page
+        (see utils.url_canonical) and only if url_filter accepts it, as
+        (url, target_domain) crawl jobs.
+        """
+        visited = set()  # nested sitemaps shared by several discovered sitemaps are parsed once
+        for sitemap_url in sitemap_urls:
+            try:
+                for url in self.sitemap_parser.iter_sitemap_urls(
+                    sitemap_url, visited, body_cache=body_cache, ordered=False
+                ):
+                    if pages.add(url) and url_filter.accept(url):
+                        yield url, url_filter.target
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to parse {sitemap_url}: {e}")
+
+        logger.info(f"🔍 [GP Content] {url_filter.accepted} URLs từ {len(sitemap_urls)} sitemap")
+
+    def _sample_page_urls(
+        self,
+        sitemap_urls: List[str],
+        body_cache: FetchedBodyCache,
+        url_filter: 'DomainFilter',
+        sampler: UrlSampler,
+        pages: CanonicalUrlSet
+    ) -> List[Tuple[str, str]]:
+        """
+        Walk the sitemap tree only as far as the sampler needs, then draw the
+        sample as (url, target_domain) crawl jobs.
+
+        Each level opens at most sampler.max_candidates sitemaps (chosen at
+        random, by <lastmod> if weighted) and reads only the first
+        doc_quota() URLs of each. The walk stops once the sampler is full.
+        """
+        visited = set(sitemap_urls)
+        level = [SitemapEntry('sitemap', url) for url in sitemap_urls]
+        depth = 0
+
+        while level and not sampler.full:
+            if depth > self.sitemap_parser.max_depth:
+                logger.warning(f"⚠️ Quá độ sâu cho sitemap: {level[0].loc}")
+                break
+
+            level = sampler.choose_sitemaps(level, lambda entry: entry.lastmod)
+            quota = sampler.doc_quota(len(level))
+            next_level = []
+
+            with fanout_scheduler.flow(max_running=Config.SITEMAP_INDEX_WORKERS) as executor:
+                futures = {
+                    executor.submit(self._read_sitemap_head, entry.loc, quota, body_cache): entry.loc
+                    for entry in level
+                }
+                for future in as_completed(futures):
+                    sitemap_url = futures[future]
+                    try:
+                        urls, nested = future.result()
+                    except Exception as e:
+                        logger.warning(f"⚠️ Failed to parse {sitemap_url}: {e}")
+                        continue
+
+                    for entry in urls:
+                        if not pages.add(entry.loc) or not url_filter.accept(entry.loc):
+                            continue
+                        if not sampler.add(sitemap_url, entry.loc, entry.lastmod):
+                            break
+                    for entry in nested:
+                        if entry.loc not in visited:
+                            visited.add(entry.loc)
+                            next_level.append(entry)
+
+                    if sampler.full:
+                        for pending in futures:
+                            pending.cancel()
+                        break
+
+            level = next_level
+            depth += 1
+
+        picked = sampler.pick()
+        logger.info(
+            f"🎯 [GP Content] Sample {len(picked)}/{sampler.n} URLs từ {sampler.candidates} candidates "
+            f"({sampler.strata} strata)"
+        )
+        return [(url, url_filter.target) for url in picked]
+
+    @staticmethod
+    def _cached_page_urls(
+        snapshot: SitemapSnapshot,
+        url_filter: 'DomainFilter',
+        pages: CanonicalUrlSet
+    ) -> Iterator[Tuple[str, str]]:
+        """_iter_page_urls over a cached sitemap crawl"""
+        for listing in snapshot.sitemaps:
+            for url in listing.urls:
+                if pages.add(url) and url_filter.accept(url):
+                    yield url, url_filter.target
+
+        logger.info(f"♻️ [GP Content] {url_filter.accepted} URLs từ cache ({len(snapshot.sitemaps)} sitemap)")
+
+    @staticmethod
+    def _sample_cached_urls(
+        snapshot: SitemapSnapshot,
+        url_filter: 'DomainFilter',
+        sampler: UrlSampler,
+        pages: CanonicalUrlSet
+    ) -> List[Tuple[str, str]]:
+        """
+        _sample_page_urls over a cached sitemap crawl: the URL lists are in
+        memory, so each chosen sitemap contributes a random quota of them.
+        """
+        listings = sampler.choose_sitemaps(snapshot.sitemaps)
+        quota = sampler.doc_quota(len(listings))
+        for listing in listings:
+            for url in sampler.rng.sample(listing.urls, min(quota, len(listing.urls))):
+                if pages.add(url) and url_filter.accept(url):
+                    sampler.add(listing.sitemap, url)
+
+        picked = sampler.pick()
+        logger.info(
+            f"🎯 [GP Content] Sample {len(picked)}/{sampler.n} URLs (cache) từ {sampler.candidates} candidates "
+            f"({sampler.strata} strata)"
+        )
+        return [(url, url_filter.target) for url in picked]
+
+    def _read_sitemap_head(
+        self,
+        sitemap_url: str,
+        max_urls: int,
+        body_cache: FetchedBodyCache
+    ) -> Tuple[List[SitemapEntry], List[SitemapEntry]]:
+        """First max_urls <url> entries + all nested <sitemap> entries of one document"""
+        urls = []
+        nested = []
+        with host_limiter.slot(sitemap_url):
+            entries = self.sitemap_parser.iter_document_entries(sitemap_url, [], body_cache=body_cache)
+            try:
+                for entry in entries:
+                    if entry.kind != 'url':
+                        nested.append(entry)
+                        continue
+                    urls.append(entry)
+                    if len(urls) >= max_urls:
+                        break  # Stops the download
+            finally:
+                entries.close()
+        return urls, nested
+
+    def _iter_crawl(
+        self,
+        jobs: Iterable[Tuple[str, str]],
+        original_domain: str,
+        cancel: Optional[Event] = None,
+        flow: Optional[str] = None
+    ) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """
+        Crawl (url, target_domain) jobs on the shared crawl workers (in `flow`),
+        yielding (url, result or None) in completion order.
+
+        `jobs` is consumed on a feeder thread, so results keep flowing while it
+        waits for sitemaps. At most submit_window URLs are submitted and not yet
+        finished; the feeder blocks beyond that (backpressure on sitemap parsing).
+        """
+        finished = Queue()
+        window = Semaphore(self.submit_window)
+        stop = Event()
+        submitted = 0
+
+        def on_done(url: str, future):
+            window.release()
+            finished.put((url, future))
+
+        with crawl_scheduler.flow(
+            flow, max_running=self.max_workers, admit=self._admit, release=self._release
+        ) as executor:
+            def feed():
+                nonlocal submitted
+                try:
+                    for url, target_domain in jobs:
+                        window.acquire()
+                        if stop.is_set() or (cancel is not None and cancel.is_set()):
+                            break
+                        cached = content_cache.get(url)
+                        if cached is not None and cached.fresh:
+                            # Answered here: no request, so no worker or admission needed
+                            future = Future()
+                            future.set_result(self._cached_result(url, cached, original_domain, target_domain))
+                        else:
+                            future = executor.submit(self._crawl_admitted, url, cached, original_domain, target_domain)
+                        future.add_done_callback(partial(on_done, url))
+                        submitted += 1
+                except Exception as e:
+                    logger.error(f"❌ [GP Content] URL feeder: {e}")
+                finally:
+                    finished.put(None)  # Every job is submitted
+
+            Thread(target=feed, daemon=True).start()
+
+            received = 0
+            total = None
+            try:
+                while total is None or received < total:
+                    item = finished.get()
+                    if item is None:
+                        total = submitted
+                        continue
+                    received += 1
+                    url, future = item
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"❌ Error processing {url}: {e}")
+                        result = None
+                    yield url, result
+            finally:
+                # Consumer stopped early: let the feeder drop its remaining jobs
+                stop.set()
+                window.release()
+
+    def _read_head(self, response: requests.Response, url: str) -> bytes:
+        """
+        Read a streamed page until HeadBoundary says the metadata is in, or
+        max_bytes have been read. The connection is closed without draining
+        the rest of the body.
+        """
+        boundary = HeadBoundary()
+        chunks = []
+        read = 0
+        try:
+            for chunk in response.iter_content(chunk_size=Config.CONTENT_CHUNK_SIZE):
+                chunks.append(chunk)
+                read += len(chunk)
+                if boundary.feed(chunk):
+                    break
+                if read >= self.max_bytes:
+                    logger.debug(f"✂️ {url}: dừng sau {read} bytes (CONTENT_MAX_BYTES)")
+                    break
+        finally:
+            response.close()
+        return b''.join(chunks)
+
     @staticmethod
     def _replace_domain(url: str, from_domain: str, to_domain: str) -> str:
         """
@@ -242,45 +822,6 @@ class ContentCrawlerService:
         new_parsed = parsed._replace(netloc=to_domain)
         return urlunparse(new_parsed)
 
-    @staticmethod
-    def _filter_urls_by_domain(original_domain: str, all_urls: List[str]) -> Tuple[List[str], str]:
-        """
-        Filter URLs theo domain, cho phép redirect domain.
-
-        Args:
-            original_domain: Domain user nhập (e.g., "keonhacai.fit")
-            all_urls: List URLs từ sitemap
-
-        Returns:
-            (filtered_urls, target_domain)
-            - filtered_urls: URLs matching original or target domain
-            - target_domain: Domain thật trong sitemap (có thể khác original nếu redirect)
-
-        Example:
-            original = "keonhacai.fit"
-            sitemap URLs = ["https://pricol.org.mx/..."]
-            → return (filtered_urls, "pricol.org.mx")
-        """
-        original = original_domain.replace('www.', '').lower()
-
-        # Phát hiện domain từ danh sách URLs thực tế
-        detected = {urlparse(u).netloc.replace('www.', '').lower() for u in all_urls}
-
-        # Nếu chỉ có 1 domain detected → đó là target
-        target = list(detected)[0] if len(detected) == 1 else (
-            original if original in detected else (list(detected)[0] if detected else original)
-        )
-
-        if target != original:
-            logger.info(f"✅ Redirect detected: {original} → {target}")
-
-        filtered = [
-            u for u in all_urls
-            if urlparse(u).netloc.replace('www.', '').lower() in {original, target}
-        ]
-
-        return filtered, target
-
     @staticmethod
     def _error(domain: str, message: str) -> Dict:
         return {
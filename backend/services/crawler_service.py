@@ -1,6 +1,7 @@
 import time
-from typing import Dict, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Event
+from typing import Collection, Dict, List, Optional
+from concurrent.futures import as_completed
 import sys
 import os
 
@@ -8,7 +9,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import Config
 from utils.logger import logger
-from services.sitemap_parser import SitemapParser
+from services.sitemap_parser import FetchedBodyCache, RedirectChain, SitemapParser
+from utils.scheduler import crawl_scheduler
+from utils.singleflight import domain_flights, flight_key
+from utils.sitemap_cache import SitemapListing, SitemapSnapshot, sitemap_cache
+from utils.url_canonical import CanonicalUrlSet
 
 
 class CrawlerService:
@@ -19,19 +24,36 @@ class CrawlerService:
     # ============================================================
     # Xử lý 1 domain duy nhất
     # ============================================================
-    def process_domain(self, domain: str) -> Dict:
+    def process_domain(self, domain: str, refresh: bool = False) -> Dict:
+        """
+        Crawl a domain; joins the crawl of the same domain if one is already running.
+        A result from the sitemap cache is reused unless refresh is set.
+        """
+        return domain_flights.run(
+            flight_key('sitemap', domain, refresh), lambda emit, cancel: self._crawl_domain(domain, refresh)
+        )
+
+    def _crawl_domain(self, domain: str, refresh: bool = False) -> Dict:
         start_time = time.time()
         sitemaps_data = []
-        all_urls = set()
+        listings = []  # for the sitemap cache
+        all_urls = CanonicalUrlSet()  # pages listed by several sitemaps / in several forms count once
         all_redirect_chains = []  # Collect all redirect chains
+        body_cache = FetchedBodyCache()  # Sitemaps fetched during discovery, reused by parse
 
         try:
             # Làm sạch domain
             domain_clean = domain.replace("https://", "").replace("http://", "").strip("/")
+
+            cached = sitemap_cache.get(domain_clean, refresh)
+            if cached is not None:
+                logger.info(f"♻️ Dùng kết quả sitemap đã cache cho {domain_clean} ({cached.url_count} URL)")
+                return self.build_cached_result(cached, domain_clean, time.time() - start_time)
+
             logger.info(f"🚀 Bắt đầu crawl domain: {domain_clean}")
 
             # ⚡️ Discover sitemaps (phải unpack 2 giá trị)
-            sitemaps, final_domain = self.parser.discover_sitemaps(domain_clean)
+            sitemaps, final_domain = self.parser.discover_sitemaps(domain_clean, body_cache=body_cache)
 
             if not sitemaps:
                 raise Exception("Không tìm thấy sitemap hợp lệ")
@@ -49,29 +71,15 @@ class CrawlerService:
                         raise Exception(f"Sai định dạng sitemap: {sitemap_url}")
 
                     # Parse sitemap and get redirect chains
-                    urls, redirect_chains = self.parser.parse_sitemap(sitemap_url)
+                    urls, redirect_chains = self.parser.parse_sitemap(sitemap_url, body_cache=body_cache)
                     sitemap_duration = time.time() - sitemap_start
 
-                    unique_urls = list(set(urls))
+                    sitemap_info = self.build_sitemap_info(sitemap_url, urls, redirect_chains, sitemap_duration)
+                    unique_urls = sitemap_info["urls"]
                     all_urls.update(unique_urls)
                     all_redirect_chains.extend(redirect_chains)
-
-                    # Prepare sitemap data with redirect info
-                    sitemap_info = {
-                        "sitemap": sitemap_url,
-                        "count": len(unique_urls),
-                        "duration": round(sitemap_duration, 2),
-                        "urls": unique_urls,
-                    }
-
-                    # Add redirect summary if there were redirects
-                    if redirect_chains:
-                        sitemap_info["redirect_count"] = len(redirect_chains)
-                        sitemap_info["total_redirect_hops"] = sum(
-                            chain.total_redirects for chain in redirect_chains
-                        )
-
                     sitemaps_data.append(sitemap_info)
+                    listings.append(SitemapListing(sitemap_url, urls, [chain.to_dict() for chain in redirect_chains]))
 
                     logger.info(
                         f"✅ Đã parse {len(unique_urls)} URL từ {sitemap_url} "
@@ -90,37 +98,19 @@ class CrawlerService:
                     })
 
             total_duration = time.time() - start_time
-            total_urls = len(all_urls)
-
-            # Prepare redirect summary for response
-            redirect_summary = None
-            if all_redirect_chains:
-                redirect_summary = {
-                    "total_chains": len(all_redirect_chains),
-                    "total_hops": sum(chain.total_redirects for chain in all_redirect_chains),
-                    "max_redirects": max(chain.total_redirects for chain in all_redirect_chains),
-                    "has_loops": any(chain.has_loop for chain in all_redirect_chains),
-                }
 
             logger.info(
-                f"🏁 Crawl hoàn tất cho {final_domain}: {total_urls} URL trong {total_duration:.2f}s "
+                f"🏁 Crawl hoàn tất cho {final_domain}: {len(all_urls)} URL trong {total_duration:.2f}s "
                 f"({len(all_redirect_chains)} redirect chains)"
             )
 
-            result = {
-                "domain": final_domain,
-                "original_domain": domain_clean,  # Include original domain in response
-                "status": "success",
-                "total_urls": total_urls,
-                "duration": total_duration,
-                "sitemaps": sitemaps_data,
-            }
-
-            # Add redirect info if present
-            if redirect_summary:
-                result["redirect_info"] = redirect_summary
-                result["redirect_chains"] = [chain.to_dict() for chain in all_redirect_chains[:5]]  # Limit to first 5 for response
-
+            result = self.build_domain_result(
+                final_domain, domain_clean, all_urls, sitemaps_data, all_redirect_chains, total_duration,
+                dedup=all_urls.get_stats()
+            )
+            result["sitemap_cache"] = sitemap_cache.summary(None, refresh)
+            if listings and len(listings) == len(sitemaps):  # a sitemap that failed may work next time
+                sitemap_cache.put(SitemapSnapshot(domain_clean, final_domain, listings))
             return result
 
         except Exception as e:
@@ -134,18 +124,118 @@ class CrawlerService:
                 "duration": total_duration,
             }
 
+    # ============================================================
+    # Result builders (shared with the asyncio engine)
+    # ============================================================
+    @staticmethod
+    def build_sitemap_info(sitemap_url: str, urls: List[str], redirect_chains: List, duration: float) -> Dict:
+        """Per-sitemap entry of the domain result; equivalent URL forms are listed once"""
+        unique_urls = CanonicalUrlSet().update(urls)
+
+        # Prepare sitemap data with redirect info
+        sitemap_info = {
+            "sitemap": sitemap_url,
+            "count": len(unique_urls),
+            "duration": round(duration, 2),
+            "urls": unique_urls,
+        }
+        if len(unique_urls) < len(urls):
+            sitemap_info["duplicates"] = len(urls) - len(unique_urls)
+
+        # Add redirect summary if there were redirects
+        if redirect_chains:
+            sitemap_info["redirect_count"] = len(redirect_chains)
+            sitemap_info["total_redirect_hops"] = sum(
+                chain.total_redirects for chain in redirect_chains
+            )
+
+        return sitemap_info
+
+    @classmethod
+    def build_cached_result(cls, snapshot: SitemapSnapshot, domain_clean: str, duration: float) -> Dict:
+        """Domain result rebuilt from the sitemap cache, same shape as a crawled one"""
+        all_urls = CanonicalUrlSet()
+        sitemaps_data = []
+        all_redirect_chains = []
+        for listing in snapshot.sitemaps:
+            redirect_chains = [RedirectChain.from_dict(chain) for chain in listing.redirect_chains]
+            sitemap_info = cls.build_sitemap_info(listing.sitemap, listing.urls, redirect_chains, 0)
+            all_urls.update(sitemap_info["urls"])
+            all_redirect_chains.extend(redirect_chains)
+            sitemaps_data.append(sitemap_info)
+
+        result = cls.build_domain_result(
+            snapshot.final_domain, domain_clean, all_urls, sitemaps_data, all_redirect_chains, duration,
+            dedup=all_urls.get_stats()
+        )
+        result["sitemap_cache"] = sitemap_cache.summary(snapshot)
+        return result
+
+    @staticmethod
+    def build_domain_result(
+        final_domain: str,
+        domain_clean: str,
+        all_urls: Collection[str],
+        sitemaps_data: List[Dict],
+        all_redirect_chains: List,
+        total_duration: float,
+        dedup: Dict = None
+    ) -> Dict:
+        """
+        Successful domain result, as streamed to the client.
+        dedup: CanonicalUrlSet stats of all_urls (duplicates across sitemaps)
+        """
+        # Prepare redirect summary for response
+        redirect_summary = None
+        if all_redirect_chains:
+            redirect_summary = {
+                "total_chains": len(all_redirect_chains),
+                "total_hops": sum(chain.total_redirects for chain in all_redirect_chains),
+                "max_redirects": max(chain.total_redirects for chain in all_redirect_chains),
+                "has_loops": any(chain.has_loop for chain in all_redirect_chains),
+            }
+
+        result = {
+            "domain": final_domain,
+            "original_domain": domain_clean,  # Include original domain in response
+            "status": "success",
+            "total_urls": len(all_urls),
+            "duration": total_duration,
+            "sitemaps": sitemaps_data,
+        }
+        if dedup:
+            result["dedup"] = dedup
+
+        # Add redirect info if present
+        if redirect_summary:
+            result["redirect_info"] = redirect_summary
+            result["redirect_chains"] = [chain.to_dict() for chain in all_redirect_chains[:5]]  # Limit to first 5 for response
+
+        return result
+
     # ============================================================
     # Xử lý nhiều domain song song
     # ============================================================
-    def process_domains(self, domains: List[str], max_workers: int = None, callback=None) -> List[Dict]:
+    def process_domains(
+        self,
+        domains: List[str],
+        max_workers: int = None,
+        callback=None,
+        cancel: Optional[Event] = None,
+        flow: Optional[str] = None,
+        refresh: bool = False
+    ) -> List[Dict]:
         """
-        Process multiple domains concurrently.
+        Process multiple domains concurrently, on the shared crawl workers.
 
         Args:
             domains: List of domains to crawl
-            max_workers: Number of concurrent workers
+            max_workers: Number of concurrent workers (ignored when joining a job's flow)
             callback: Optional callback function called after each domain completes.
                      Signature: callback(result: Dict, completed: int, total: int)
+            cancel: Once set, domains not started yet are dropped (running ones finish)
+            flow: Scheduler flow (job) to run in, for fair sharing between jobs
+            refresh: Crawl even domains whose result is in the sitemap cache
 
         Returns:
             List of crawl results
@@ -161,15 +251,22 @@ class CrawlerService:
             f"⚙️ Bắt đầu crawl đồng thời {total_domains} domain với {max_workers} worker"
         )
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def run(domain: str) -> Optional[Dict]:
+            if cancel is not None and cancel.is_set():
+                return None
+            return self.process_domain(domain, refresh)
+
+        with crawl_scheduler.flow(flow, max_running=max_workers) as executor:
             futures = {
-                executor.submit(self.process_domain, domain): domain for domain in domains
+                executor.submit(run, domain): domain for domain in domains
             }
 
             for future in as_completed(futures):
                 domain = futures[future]
                 try:
                     result = future.result()
+                    if result is None:
+                        continue  # Dropped by cancel
                     results.append(result)
                     completed_count += 1
 
@@ -1,12 +1,21 @@
 import requests
 import xml.etree.ElementTree as ET
 from urllib.parse import urljoin, urlparse
-from typing import List, Tuple, Set, Optional
+from typing import Dict, Iterable, Iterator, List, Tuple, Set, Optional
 from time import time, sleep
 from dataclasses import dataclass
+from concurrent.futures import FIRST_COMPLETED, as_completed, wait
 import gzip
+import io
+import threading
+import zlib
 from config import Config
+from utils.http_cache import CachedBody, http_cache
+from utils.host_limiter import host_limiter
+from utils.http_client import SessionManager, http_client
 from utils.logger import logger
+from utils.rate_limiter import rate_limiter
+from utils.scheduler import fanout_scheduler
 
 
 # ============================================================
@@ -31,6 +40,29 @@ class RedirectChain:
     total_duration: float  # milliseconds
     has_loop: bool = False
     loop_at: Optional[int] = None
+    memoized: bool = False  # Leading hops replayed from RedirectMemo, not requested
+
+    @classmethod
+    def from_history(cls, response: requests.Response) -> Optional['RedirectChain']:
+        """Build a chain from a response fetched with allow_redirects=True (None if it wasn't redirected)"""
+        if not response.history:
+            return None
+        hops = [
+            RedirectHop(
+                url=r.url,
+                status_code=r.status_code,
+                location=r.headers.get('Location'),
+                duration=r.elapsed.total_seconds() * 1000
+            )
+            for r in response.history + [response]
+        ]
+        return cls(
+            initial_url=response.history[0].url,
+            final_url=response.url,
+            hops=hops,
+            total_redirects=len(response.history),
+            total_duration=sum(hop.duration for hop in hops)
+        )
 
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
@@ -41,6 +73,7 @@ class RedirectChain:
             'total_duration': round(self.total_duration, 2),
             'has_loop': self.has_loop,
             'loop_at': self.loop_at,
+            'memoized': self.memoized,
             'hops': [
                 {
                     'url': hop.url,
@@ -52,6 +85,238 @@ class RedirectChain:
             ]
         }
 
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RedirectChain':
+        """Inverse of to_dict (chains kept in the sitemap result cache)"""
+        return cls(
+            initial_url=data['initial_url'],
+            final_url=data['final_url'],
+            hops=[RedirectHop(**hop) for hop in data['hops']],
+            total_redirects=data['total_redirects'],
+            total_duration=data['total_duration'],
+            has_loop=data['has_loop'],
+            loop_at=data['loop_at'],
+            memoized=data.get('memoized', False)
+        )
+
+
+class RedirectMemo:
+    """
+    Learned host-level redirects, keyed by scheme+host.
+
+    A redirect hop is learned when it only changes scheme/host and keeps the
+    path and query (http→https, apex→www, moved domain). Later URLs on that
+    origin are rewritten to the known destination before fetching, so the
+    redirect round trips are skipped. Entries expire after `ttl` seconds and
+    are dropped when a rewritten URL fails.
+    """
+
+    MAX_ENTRIES = 10000
+
+    def __init__(self, ttl: float, enabled: bool = True):
+        self.ttl = ttl
+        self.enabled = enabled
+        self._targets: Dict[str, Tuple[str, int, float]] = {}  # origin -> (target origin, status, expires)
+        self._lock = threading.Lock()
+        self.stats = {'learned': 0, 'rewrites': 0, 'hops_skipped': 0}
+
+    @staticmethod
+    def split(url: str) -> Tuple[str, str]:
+        """Split a URL into (scheme://host, rest starting with '/')"""
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme.lower()}://{parsed.netloc.lower()}"
+        rest = url[len(parsed.scheme) + 3 + len(parsed.netloc):]
+        if not rest.startswith('/'):
+            rest = '/' + rest
+        return origin, rest
+
+    def learn(self, hops: List[RedirectHop]):
+        """Record the origin-only redirects of a followed chain"""
+        if not self.enabled:
+            return
+        expires = time() + self.ttl
+        for hop, next_hop in zip(hops, hops[1:]):
+            source, source_rest = self.split(hop.url)
+            target, target_rest = self.split(next_hop.url)
+            if source == target or source_rest != target_rest:
+                continue  # Path-specific redirect, not host-level
+            with self._lock:
+                if source not in self._targets:
+                    self.stats['learned'] += 1
+                    if len(self._targets) >= self.MAX_ENTRIES:
+                        self._prune()
+                self._targets[source] = (target, hop.status_code, expires)
+
+    def rewrite(self, url: str) -> Tuple[str, List[RedirectHop]]:
+        """
+        Apply known host redirects to a URL.
+
+        Returns:
+            Tuple of (url to fetch, replayed hops - empty if nothing is known)
+        """
+        if not self.enabled:
+            return url, []
+        origin, rest = self.split(url)
+        hops = []
+        now = time()
+        with self._lock:
+            seen = {origin}
+            while True:
+                known = self._targets.get(origin)
+                if known is None:
+                    break
+                target, status_code, expires = known
+                if expires < now:
+                    del self._targets[origin]
+                    break
+                if target in seen:
+                    break  # Learned a loop - let the tracker detect it for real
+                hops.append(RedirectHop(url=origin + rest, status_code=status_code, location=target + rest, duration=0.0))
+                seen.add(target)
+                origin = target
+            if hops:
+                self.stats['rewrites'] += 1
+                self.stats['hops_skipped'] += len(hops)
+        return (origin + rest, hops) if hops else (url, [])
+
+    def forget(self, url: str):
+        """Drop what was learned for the URL's origin (e.g. the rewritten URL failed)"""
+        origin, _ = self.split(url)
+        with self._lock:
+            self._targets.pop(origin, None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._targets)
+        stats['enabled'] = self.enabled
+        return stats
+
+    def _prune(self):
+        """Drop expired entries, or the oldest half if none expired (caller holds the lock)"""
+        now = time()
+        expired = [origin for origin, (_, _, expires) in self._targets.items() if expires < now]
+        if not expired:
+            expired = sorted(self._targets, key=lambda origin: self._targets[origin][2])[:len(self._targets) // 2]
+        for origin in expired:
+            del self._targets[origin]
+
+
+# Shared by all crawls (sitemap parser and asyncio engine)
+redirect_memo = RedirectMemo(ttl=Config.REDIRECT_MEMO_TTL, enabled=Config.REDIRECT_MEMO_ENABLED)
+
+
+# ============================================================
+# Sitemap Entries
+# ============================================================
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+URL_TAG = f"{SITEMAP_NS}url"
+SITEMAP_TAG = f"{SITEMAP_NS}sitemap"
+LOC_TAG = f"{SITEMAP_NS}loc"
+LASTMOD_TAG = f"{SITEMAP_NS}lastmod"
+
+
+@dataclass
+class SitemapEntry:
+    """A single <url> or <sitemap> entry read from a sitemap document"""
+    kind: str  # 'url' or 'sitemap'
+    loc: str
+    lastmod: Optional[str] = None
+
+
+@dataclass
+class FetchedSitemap:
+    """A sitemap fetched and parsed during discovery"""
+    final_url: str
+    entries: List[SitemapEntry]
+    chain: Optional[RedirectChain]
+
+
+class FetchedBodyCache:
+    """
+    Per-crawl hand-off of sitemaps validated during discovery to the parse phase,
+    keyed by requested and final URL, so each sitemap is downloaded only once.
+    Bounded by the total number of cached entries; each key is taken at most once.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries if max_entries is not None else Config.BODY_CACHE_MAX_ENTRIES
+        self._items = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, url: str, fetched: FetchedSitemap) -> bool:
+        with self._lock:
+            if url in self._items:
+                return True
+            if self._size + len(fetched.entries) > self.max_entries:
+                return False
+            self._size += len(fetched.entries)
+            self._items[url] = fetched
+            if fetched.final_url not in self._items:
+                # Fetching the final URL directly involves no redirect
+                self._items[fetched.final_url] = FetchedSitemap(fetched.final_url, fetched.entries, None)
+            return True
+
+    def final_url(self, url: str) -> Optional[str]:
+        """Where a cached sitemap was fetched from after redirects, without taking it (None if not cached)"""
+        with self._lock:
+            fetched = self._items.get(url)
+            return fetched.final_url if fetched is not None else None
+
+    def take(self, url: str) -> Optional[FetchedSitemap]:
+        with self._lock:
+            fetched = self._items.pop(url, None)
+            if fetched is not None and not any(v.entries is fetched.entries for v in self._items.values()):
+                self._size -= len(fetched.entries)
+            return fetched
+
+
+class _ResponseReader(io.RawIOBase):
+    """
+    Raw file adapter over a streamed response body (Content-Encoding already undone).
+    urllib3 marks its response closed once the body is drained, which
+    io.BufferedReader would treat as an error instead of EOF.
+
+    Optionally keeps a zlib-compressed copy of the body (up to capture_limit
+    compressed bytes) so it can be stored in the HTTP cache afterwards.
+    """
+
+    def __init__(self, response: requests.Response, capture_limit: int = 0):
+        self._raw = response.raw
+        self._capture_limit = capture_limit
+        self._compressor = zlib.compressobj() if capture_limit > 0 else None
+        self._chunks = []
+        self._captured_size = 0
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._raw.read(len(buffer), decode_content=True)
+        if not data:
+            self._eof = True
+            return 0
+        if self._compressor is not None:
+            chunk = self._compressor.compress(data)
+            self._chunks.append(chunk)
+            self._captured_size += len(chunk)
+            if self._captured_size > self._capture_limit:
+                # Too large to cache - stop capturing
+                self._compressor = None
+                self._chunks = []
+        buffer[:len(data)] = data
+        return len(data)
+
+    def captured(self) -> Optional[bytes]:
+        """Compressed body if it was read to the end within the capture limit"""
+        if not self._eof or self._compressor is None:
+            return None
+        self._chunks.append(self._compressor.flush())
+        self._compressor = None
+        return b''.join(self._chunks)
+
 
 # ============================================================
 # Redirect Tracker
@@ -59,8 +324,10 @@ class RedirectChain:
 class RedirectTracker:
     """Tracks and analyzes HTTP redirect chains"""
 
-    def __init__(self, max_redirects: int = 10):
+    def __init__(self, max_redirects: int = 10, client: SessionManager = None, memo: RedirectMemo = None):
         self.max_redirects = max_redirects
+        self.client = client or http_client  # Pooled keep-alive connections
+        self.memo = memo or redirect_memo  # Known host redirects are replayed, not re-requested
 
     def fetch_with_redirect_tracking(
         self,
@@ -68,7 +335,8 @@ class RedirectTracker:
         headers: dict,
         timeout: int,
         verify: bool = True,
-        proxies: dict = None
+        proxies: dict = None,
+        stream: bool = False
     ) -> Tuple[requests.Response, RedirectChain]:
         """
         Fetch URL and track complete redirect chain.
@@ -79,9 +347,12 @@ class RedirectTracker:
             timeout: Request timeout in seconds
             verify: SSL verification (True/False)
             proxies: Optional proxy configuration dict
+            stream: If True, the final response body is not read eagerly
 
         Returns:
             Tuple of (final_response, redirect_chain)
+            Host redirects already known to the memo are not requested again;
+            they appear as the leading hops of a chain marked `memoized`.
 
         Raises:
             Exception if redirect loop detected or too many redirects
@@ -89,7 +360,7 @@ class RedirectTracker:
         chain_start = time()
         hops = []
         visited_urls = set()
-        current_url = url
+        current_url, memo_hops = self.memo.rewrite(url)
 
         for redirect_count in range(self.max_redirects + 1):
             # Detect redirect loop
@@ -109,19 +380,25 @@ class RedirectTracker:
                 )
 
             visited_urls.add(current_url)
+            rate_limiter.acquire(current_url)  # Per-host politeness delay
             hop_start = time()
 
             try:
                 # Request WITHOUT auto-follow redirects
-                response = requests.get(
+                response = self.client.get(
                     current_url,
                     headers=headers,
                     timeout=timeout,
                     allow_redirects=False,  # Manual redirect handling
                     verify=verify,
-                    proxies=proxies
+                    proxies=proxies,
+                    stream=stream
                 )
             except Exception as e:
+                if memo_hops:
+                    self.memo.forget(url)
+                if isinstance(e, requests.exceptions.Timeout):
+                    host_limiter.record(current_url, timeout=True)
                 raise Exception(f"Request failed at {current_url}: {e}")
 
             hop_duration = (time() - hop_start) * 1000
@@ -160,6 +437,7 @@ class RedirectTracker:
                 )
 
                 current_url = next_url
+                response.close()  # Release connection of the redirect hop
 
                 # Check max redirects limit
                 if redirect_count >= self.max_redirects:
@@ -172,12 +450,17 @@ class RedirectTracker:
 
             # Final response (2xx, 4xx, 5xx - not a redirect)
             total_duration = (time() - chain_start) * 1000
+            self.memo.learn(hops)
+            if memo_hops and response.status_code >= 400:
+                self.memo.forget(url)  # Stale rewrite - the next attempt follows the real chain
+
             chain = RedirectChain(
                 initial_url=url,
                 final_url=current_url,
-                hops=hops,
-                total_redirects=len(hops) - 1,  # -1 because final hop is not a redirect
-                total_duration=total_duration
+                hops=memo_hops + hops,
+                total_redirects=len(memo_hops) + len(hops) - 1,  # -1 because final hop is not a redirect
+                total_duration=total_duration,
+                memoized=bool(memo_hops)
             )
 
             if chain.total_redirects > 0:
@@ -202,18 +485,25 @@ class SitemapParser:
         self.redirect_tracker = RedirectTracker(max_redirects=10)
         self.user_agents = Config.USER_AGENTS
         self.current_ua_index = 0
-        # Use session with rotating user agents
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
+        self._ua_lock = threading.Lock()
+        # Shared connection pools; headers (rotating user agent) are passed per request
+        self.client = http_client
 
     def _rotate_user_agent(self):
         """Rotate to next user agent"""
-        self.current_ua_index = (self.current_ua_index + 1) % len(self.user_agents)
-        new_ua = self.user_agents[self.current_ua_index]
-        self.headers['User-Agent'] = new_ua
-        self.session.headers['User-Agent'] = new_ua
+        with self._ua_lock:
+            self.current_ua_index = (self.current_ua_index + 1) % len(self.user_agents)
+            new_ua = self.user_agents[self.current_ua_index]
         logger.info(f"🔄 Rotated to UA: {new_ua[:50]}...")
 
+    def _request_headers(self, extra_headers: dict = None) -> dict:
+        """Fresh header dict for one request, with the current user agent"""
+        headers = dict(self.headers)
+        headers['User-Agent'] = self.user_agents[self.current_ua_index]
+        if extra_headers:
+            headers.update(extra_headers)
+        return headers
+
     def _decompress_if_needed(self, response: requests.Response) -> str:
         """
         Decompress GZIP content if needed and return as UTF-8 text.
@@ -273,19 +563,75 @@ class SitemapParser:
 
         Returns:
             Tuple of (response_text, redirect_chain)
-            redirect_chain is None if track_redirects=False or no redirects occurred
+            redirect_chain is None if no redirects occurred
+        """
+        response, chain = self._fetch_response(url, retries, track_redirects)
+        # Decompress GZIP if needed
+        content = self._decompress_if_needed(response)
+        return content, chain
+
+    def fetch_stream(self, url: str, retries: int = 3, track_redirects: bool = True) -> Tuple[requests.Response, Optional[RedirectChain]]:
+        """
+        Like fetch_url, but the body is left unread so it can be consumed incrementally.
+        Caller must close the returned response.
+
+        Returns:
+            Tuple of (streaming_response, redirect_chain)
+        """
+        return self._fetch_response(url, retries, track_redirects, stream=True)
+
+    def _fetch_response(
+        self,
+        url: str,
+        retries: int = 3,
+        track_redirects: bool = True,
+        stream: bool = False
+    ) -> Tuple[requests.Response, Optional[RedirectChain]]:
+        """
+        Fetch behind fetch_url and fetch_stream, revalidating against the persistent HTTP cache:
+        a 304 is answered with the cached body. Non-streamed 200s are stored here,
+        streamed ones once their body has been read (see _iter_document).
         """
+        cached = http_cache.get(url)
+        conditional_headers = cached.conditional_headers() if cached else {}
+
+        response, chain = self._request_with_retries(url, retries, track_redirects, stream, conditional_headers)
+
+        if response.status_code == 304 and cached is not None:
+            response.close()
+            cached_response = http_cache.hit(cached)
+            if cached_response is not None:
+                return cached_response, chain
+            # Entry evicted since the lookup: fetch it again in full
+            response, chain = self._request_with_retries(url, retries, track_redirects, stream, {})
+
+        http_cache.miss(cached, response.status_code)
+        if not stream:
+            http_cache.store(url, response)
+        return response, chain
+
+    def _request_with_retries(
+        self,
+        url: str,
+        retries: int,
+        track_redirects: bool,
+        stream: bool,
+        extra_headers: dict
+    ) -> Tuple[requests.Response, Optional[RedirectChain]]:
+        """Shared retry / SSL fallback loop."""
         for attempt in range(1, retries + 1):
+            headers = self._request_headers(extra_headers)  # Picks up a rotated user agent
             try:
                 if track_redirects:
                     # Use redirect tracker to fetch with full chain tracking
                     response, chain = self.redirect_tracker.fetch_with_redirect_tracking(
                         url,
-                        self.headers,
+                        headers,
                         self.timeout,
-                        verify=False  # SSL verification OFF (many domains have invalid certs)
+                        verify=False,  # SSL verification OFF (many domains have invalid certs)
+                        stream=stream
                     )
-                    response.raise_for_status()
+                    self._raise_for_status(response, url)
 
                     # Log redirect summary if redirects occurred
                     if chain.total_redirects > 0:
@@ -296,30 +642,21 @@ class SitemapParser:
                     else:
                         logger.info(f"✅ Fetch thành công ({response.status_code}) {url}")
 
-                    # Small delay after successful request (optimized for speed)
-                    import random
-                    sleep(random.uniform(0.2, 0.5))
-
-                    # Decompress GZIP if needed
-                    content = self._decompress_if_needed(response)
-                    return content, chain
+                    return response, chain
                 else:
                     # Fast path: standard requests session
-                    response = self.session.get(
+                    rate_limiter.acquire(url)
+                    response = self.client.get(
                         url,
+                        headers=headers,
                         timeout=self.timeout,
-                        allow_redirects=True
+                        allow_redirects=True,
+                        stream=stream
                     )
-                    response.raise_for_status()
+                    self._raise_for_status(response, url)
                     logger.info(f"✅ Fetch thành công ({response.status_code}) {url}")
 
-                    # Small delay after successful request (optimized for speed)
-                    import random
-                    sleep(random.uniform(0.2, 0.5))
-
-                    # Decompress GZIP if needed
-                    content = self._decompress_if_needed(response)
-                    return content, None
+                    return response, RedirectChain.from_history(response)
 
             except requests.exceptions.SSLError as e:
                 logger.warning(f"⚠️ SSL Error khi fetch {url}: {e}")
@@ -330,11 +667,12 @@ class SitemapParser:
                             # Retry with SSL verification off + redirect tracking
                             response, chain = self.redirect_tracker.fetch_with_redirect_tracking(
                                 url,
-                                self.headers,
+                                headers,
                                 self.timeout,
-                                verify=False  # fallback SSL verify off
+                                verify=False,  # fallback SSL verify off
+                                stream=stream
                             )
-                            response.raise_for_status()
+                            self._raise_for_status(response, url)
 
                             if chain.total_redirects > 0:
                                 logger.warning(
@@ -342,21 +680,20 @@ class SitemapParser:
                                     f"{chain.initial_url} → {chain.final_url}"
                                 )
 
-                            # Decompress GZIP if needed
-                            content = self._decompress_if_needed(response)
-                            return content, chain
+                            return response, chain
                         else:
                             # Fast path with SSL off
-                            response = self.session.get(
+                            rate_limiter.acquire(url)
+                            response = self.client.get(
                                 url,
+                                headers=headers,
                                 timeout=self.timeout,
                                 allow_redirects=True,
-                                verify=False
+                                verify=False,
+                                stream=stream
                             )
-                            response.raise_for_status()
-                            # Decompress GZIP if needed
-                            content = self._decompress_if_needed(response)
-                            return content, None
+                            self._raise_for_status(response, url)
+                            return response, RedirectChain.from_history(response)
                     except Exception as e2:
                         raise Exception(f"SSL fallback thất bại: {e2}")
 
@@ -366,11 +703,14 @@ class SitemapParser:
                     logger.warning(f"⚠️ 403 Forbidden - rotating user agent...")
                     self._rotate_user_agent()
 
+                if isinstance(e, requests.exceptions.Timeout):
+                    host_limiter.record(url, timeout=True)
+
                 logger.warning(f"⚠️ fetch_url thất bại ({attempt}/{retries}) cho {url}: {e}")
                 if attempt < retries:
-                    # Random delay để tránh bot detection
+                    # Honour Retry-After, otherwise random delay để tránh bot detection
                     import random
-                    delay = 2.0 + random.uniform(0, 2.0)  # 2-4 seconds random
+                    delay = host_limiter.blocked_for(url) or 2.0 + random.uniform(0, 2.0)  # 2-4 seconds random
                     sleep(delay)
                 else:
                     raise Exception(f"Không thể tải {url} sau {retries} lần thử: {e}")
@@ -388,23 +728,130 @@ class SitemapParser:
 
         raise Exception(f"fetch_url không thành công sau {retries} lần thử: {url}")
 
+    @staticmethod
+    def _raise_for_status(response: requests.Response, url: str):
+        """
+        raise_for_status that also releases the connection of a streamed error response.
+        Every final response passes here, so it also feeds the adaptive per-host limiter
+        (for the host of the requested url: the one whose slots the caller holds).
+        """
+        host_limiter.record(
+            url,
+            response.status_code,
+            response.elapsed.total_seconds(),
+            response.headers.get('Retry-After')
+        )
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+
+    # -------------------------------
+    # Streaming sitemap reader
+    # -------------------------------
+    def _open_xml_stream(self, response: requests.Response) -> Tuple[io.BufferedIOBase, Optional[_ResponseReader]]:
+        """
+        Wrap a streamed response as a file-like object of raw XML bytes.
+
+        Content-Encoding (gzip/deflate) is undone by urllib3; a gzipped body
+        (e.g. sitemap.xml.gz) is detected by its magic bytes and unpacked on the fly.
+
+        Returns:
+            Tuple of (xml_stream, reader) - reader is None for a body served from the HTTP cache
+        """
+        if isinstance(response.raw, CachedBody):
+            # Served from the HTTP cache, decompressed as it is read
+            reader = None
+            stream = io.BufferedReader(response.raw, buffer_size=Config.SITEMAP_STREAM_CHUNK_SIZE)
+        else:
+            cacheable = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            capture_limit = Config.HTTP_CACHE_MAX_ENTRY_BYTES if http_cache.enabled and cacheable else 0
+            reader = _ResponseReader(response, capture_limit)
+            stream = io.BufferedReader(reader, buffer_size=Config.SITEMAP_STREAM_CHUNK_SIZE)
+
+        # GZIP files start with magic bytes 0x1f 0x8b
+        if stream.peek(2)[:2] == b'\x1f\x8b':
+            logger.info(f"✅ Streaming GZIP sitemap: {response.url}")
+            return gzip.GzipFile(fileobj=stream), reader
+        return stream, reader
+
+    @staticmethod
+    def _decompressed_body(response: requests.Response) -> bytes:
+        """Raw body bytes, with a gzipped payload (e.g. sitemap.xml.gz) unpacked"""
+        content = response.content
+        if content[:2] == b'\x1f\x8b':
+            try:
+                return gzip.decompress(content)
+            except (OSError, EOFError) as e:
+                logger.warning(f"⚠️ Failed to decompress GZIP: {e}")
+        return content
+
+    @staticmethod
+    def iter_sitemap_entries(source) -> Iterator[SitemapEntry]:
+        """
+        Incrementally parse a sitemap document, yielding one SitemapEntry per <url>/<sitemap>.
+
+        Elements are cleared as soon as they are consumed, so memory stays flat
+        regardless of document size.
+
+        Args:
+            source: File-like object (or path) with the XML bytes
+        """
+        root = None
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+
+            if elem.tag in (URL_TAG, SITEMAP_TAG):
+                entry = SitemapParser.element_entry(elem)
+                if entry is not None:
+                    yield entry
+                # Drop the processed entry and detach it from the root
+                elem.clear()
+                root.clear()
+
+    @staticmethod
+    def element_entry(elem: ET.Element) -> Optional[SitemapEntry]:
+        """SitemapEntry for a completed <url>/<sitemap> element (None if it has no <loc>)"""
+        loc = elem.findtext(LOC_TAG)
+        if not loc or not loc.strip():
+            return None
+        lastmod = elem.findtext(LASTMOD_TAG)
+        return SitemapEntry(
+            kind='url' if elem.tag == URL_TAG else 'sitemap',
+            loc=loc.strip(),
+            lastmod=lastmod.strip() if lastmod else None
+        )
+
     # -------------------------------
     # Tìm sitemap trong robots.txt
     # -------------------------------
-    def discover_sitemaps(self, domain: str) -> Tuple[List[str], str]:
+    def discover_sitemaps(
+        self,
+        domain: str,
+        parallel: bool = None,
+        body_cache: FetchedBodyCache = None
+    ) -> Tuple[List[str], str]:
         """
         Discover sitemap URLs for a domain.
         Returns (list_of_sitemaps, final_domain)
+
+        Args:
+            parallel: Probe all candidates (and the www variant) concurrently
+                      under a deadline (default: Config.PARALLEL_DISCOVERY)
+            body_cache: Per-crawl cache receiving the validated sitemaps,
+                        pass the same one to parse_sitemap to skip re-downloading them
         """
+        if parallel is None:
+            parallel = Config.PARALLEL_DISCOVERY
+        if parallel:
+            return self._discover_sitemaps_parallel(domain, body_cache)
+
         logger.info(f"🚀 Bắt đầu crawl domain: {domain}")
-        candidates = [
-            f"https://{domain}/robots.txt",
-            f"https://{domain}/sitemap.xml",
-            f"https://{domain}/sitemap_index.xml",
-            f"https://{domain}/sitemap-index.xml",
-            f"https://{domain}/wp-sitemap.xml",
-            f"https://{domain}/post-sitemap.xml",
-        ]
+        candidates = self._sitemap_candidates(domain)
 
         sitemaps_found = []
         final_domain = None
@@ -414,18 +861,15 @@ class SitemapParser:
         for url in candidates:
             total_attempts += 1
             try:
-                # Use fast path (no redirect tracking) for discovery phase
-                content, chain = self.fetch_url(url, track_redirects=False)
                 if "sitemap" in url:
-                    is_valid = self.is_valid_xml(content)
-                    if is_valid:
+                    if self._fetch_and_validate(url, body_cache=body_cache):
                         logger.info(f"✅ Tìm thấy sitemap tại: {url}")
                         sitemaps_found.append(url)
                         final_domain = domain
-                        continue
-                    else:
-                        logger.warning(f"⚠️ {url} không phải XML hợp lệ (first 200 chars: {content[:200]})")
-                        continue
+                    continue
+
+                # Use fast path (no redirect tracking) for discovery phase
+                content, chain = self.fetch_url(url, track_redirects=False)
 
                 # robots.txt special case
                 if "robots.txt" in url and "Sitemap:" in content:
@@ -437,8 +881,7 @@ class SitemapParser:
                             logger.info(f"📜 Phát hiện sitemap trong robots.txt: {sm_url}")
                             try:
                                 # Fast path for robots.txt sitemaps too
-                                xml_data, _ = self.fetch_url(sm_url, track_redirects=False)
-                                if self.is_valid_xml(xml_data):
+                                if self._fetch_and_validate(sm_url, body_cache=body_cache):
                                     sitemaps_found.append(sm_url)
                                     final_domain = domain
                             except Exception as e:
@@ -456,22 +899,14 @@ class SitemapParser:
 
         # Check if all attempts resulted in 403 (IP blocking)
         if forbidden_count > 0 and forbidden_count == total_attempts:
-            logger.error(
-                f"🚫 Domain {domain} blocks datacenter IPs (403 Forbidden on all {total_attempts} attempts). "
-                f"Đã thử {len(self.user_agents)} user agents khác nhau, tất cả đều bị chặn."
-            )
-            raise Exception(
-                f"Domain {domain} chặn IP datacenter (403 Forbidden). "
-                f"Domain này chặn IP từ datacenter và không thể crawl được. "
-                f"Không thể bypass bằng user agent."
-            )
+            raise self._forbidden_error(domain, total_attempts)
 
         # thử thêm www nếu chưa có sitemap
         if not sitemaps_found and not domain.startswith("www."):
             try:
                 www_domain = f"www.{domain}"
                 logger.info(f"🔁 Thử lại với www: {www_domain}")
-                sitemaps_found, final_domain = self.discover_sitemaps(www_domain)
+                sitemaps_found, final_domain = self.discover_sitemaps(www_domain, False, body_cache)
             except Exception as e:
                 logger.warning(f"⚠️ Không thể crawl www domain: {e}")
 
@@ -480,7 +915,180 @@ class SitemapParser:
             raise Exception("Không tìm thấy sitemap hợp lệ")
 
         logger.info(f"🔍 Tìm thấy {len(sitemaps_found)} sitemap cho {domain}")
-        return list(set(sitemaps_found)), final_domain
+        return list(set(sitemaps_found)), self._resolved_domain(final_domain, sitemaps_found, body_cache)
+
+    def _discover_sitemaps_parallel(self, domain: str, body_cache: FetchedBodyCache = None) -> Tuple[List[str], str]:
+        """
+        Concurrent variant of discover_sitemaps.
+
+        All candidates of the domain and its www variant are probed at once
+        (single attempt each, no back-off), sitemaps listed in robots.txt are
+        validated as soon as robots.txt arrives. Discovery stops when the
+        apex domain is settled, Config.DISCOVERY_GRACE seconds after the
+        first valid sitemap, or at Config.DISCOVERY_DEADLINE - whichever
+        comes first. The apex domain wins over www, as in the sequential walk.
+        """
+        logger.info(f"🚀 Bắt đầu crawl domain (parallel discovery): {domain}")
+        variants = [domain] if domain.startswith("www.") else [domain, f"www.{domain}"]
+        apex = variants[0]
+        apex_candidates = len(self._sitemap_candidates(apex))
+
+        found = {variant: [] for variant in variants}  # variant -> [(order, url)]
+        forbidden = {variant: 0 for variant in variants}
+        pending = {}  # future -> (variant, url, order)
+
+        start = time()
+        deadline = start + Config.DISCOVERY_DEADLINE
+        first_found_at = None
+
+        executor = fanout_scheduler.flow(max_running=Config.DISCOVERY_WORKERS)
+        try:
+            for variant in variants:
+                for i, url in enumerate(self._sitemap_candidates(variant)):
+                    future = executor.submit(self._probe_candidate, url, url.endswith("/robots.txt"), body_cache)
+                    pending[future] = (variant, url, (i, 0))
+
+            while pending:
+                now = time()
+                timeout = deadline - now
+                if first_found_at is not None:
+                    timeout = min(timeout, first_found_at + Config.DISCOVERY_GRACE - now)
+                if timeout <= 0:
+                    break
+
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    variant, url, order = pending.pop(future)
+                    try:
+                        listed = future.result()
+                    except Exception as e:
+                        error_msg = str(e)
+                        # Track 403 Forbidden errors (only the fixed candidates count)
+                        if "403" in error_msg or "Forbidden" in error_msg:
+                            logger.warning(f"⚠️ 403 Forbidden cho {url}")
+                            if order[1] == 0:
+                                forbidden[variant] += 1
+                        else:
+                            logger.warning(f"⚠️ Không thể fetch {url}: {e}")
+                        continue
+
+                    if url.endswith("/robots.txt") and order[1] == 0:
+                        # Validate every sitemap listed in robots.txt concurrently
+                        for j, sm_url in enumerate(listed, start=1):
+                            future = executor.submit(self._probe_candidate, sm_url, False, body_cache)
+                            pending[future] = (variant, sm_url, (order[0], j))
+                    elif listed:
+                        logger.info(f"✅ Tìm thấy sitemap tại: {url}")
+                        found[variant].append((order, url))
+                        if first_found_at is None:
+                            first_found_at = time()
+
+                apex_settled = not any(v == apex for v, _, _ in pending.values())
+                if apex_settled and (found[apex] or forbidden[apex] == apex_candidates):
+                    break
+        finally:
+            # Don't wait for probes still hanging on slow hosts
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        elapsed = time() - start
+        for variant in variants:
+            if found[variant]:
+                # Dedup, keep candidate order (robots.txt entries first)
+                sitemaps = list(dict.fromkeys(url for _, url in sorted(found[variant])))
+                logger.info(f"🔍 Tìm thấy {len(sitemaps)} sitemap cho {variant} ({elapsed:.1f}s)")
+                return sitemaps, self._resolved_domain(variant, sitemaps, body_cache)
+
+        # Check if all attempts resulted in 403 (IP blocking)
+        if forbidden[apex] == apex_candidates:
+            raise self._forbidden_error(apex, apex_candidates)
+
+        logger.warning(f"⚠️ Không tìm thấy sitemap cho {domain} ({elapsed:.1f}s)")
+        raise Exception("Không tìm thấy sitemap hợp lệ")
+
+    def _probe_candidate(self, url: str, is_robots: bool, body_cache: FetchedBodyCache = None) -> List[str]:
+        """
+        Single-attempt probe used by parallel discovery.
+
+        Returns:
+            robots.txt → list of sitemap URLs it declares
+            otherwise  → [url] if the body is valid XML, else []
+        """
+        if not is_robots:
+            return [url] if self._fetch_and_validate(url, 1, body_cache) else []
+
+        content, _ = self.fetch_url(url, retries=1, track_redirects=False)
+        listed = []
+        if "Sitemap:" in content:
+            domain = urlparse(url).netloc
+            for line in content.splitlines():
+                if line.lower().startswith("sitemap:"):
+                    sm_url = line.split(":", 1)[1].strip()
+                    if sm_url.startswith("/"):
+                        sm_url = urljoin(f"https://{domain}", sm_url)
+                    logger.info(f"📜 Phát hiện sitemap trong robots.txt: {sm_url}")
+                    listed.append(sm_url)
+        return listed
+
+    def _fetch_and_validate(self, url: str, retries: int = 3, body_cache: FetchedBodyCache = None) -> bool:
+        """
+        Fetch a sitemap candidate (fast path) and check it is well-formed XML.
+        The entries parsed along the way are kept in body_cache for the parse phase.
+        """
+        response, chain = self._fetch_response(url, retries, track_redirects=False)
+        body = self._decompressed_body(response)
+        try:
+            entries = list(self.iter_sitemap_entries(io.BytesIO(body)))
+        except ET.ParseError:
+            preview = body[:200].decode(response.encoding or 'utf-8', errors='replace')
+            logger.warning(f"⚠️ {url} không phải XML hợp lệ (first 200 chars: {preview})")
+            return False
+
+        if body_cache is not None:
+            body_cache.put(url, FetchedSitemap(final_url=response.url, entries=entries, chain=chain))
+        return True
+
+    @staticmethod
+    def _resolved_domain(domain: str, sitemaps: List[str], body_cache: FetchedBodyCache = None) -> str:
+        """Final domain of a discovery (see resolved_domain), with redirects known from body_cache"""
+        if body_cache is not None:
+            sitemaps = [body_cache.final_url(url) or url for url in sitemaps]
+        return SitemapParser.resolved_domain(domain, sitemaps)
+
+    @staticmethod
+    def resolved_domain(domain: str, sitemap_urls: Iterable[str]) -> str:
+        """
+        Domain the discovered sitemaps live on: `domain` (the variant that answered),
+        unless all of them (after redirects) are on one other host, i.e. the domain
+        redirected there (e.g. keonhacai.fit → pricol.org.mx).
+        """
+        hosts = {urlparse(url).netloc.lower() for url in sitemap_urls}
+        if len(hosts) == 1:
+            host = hosts.pop()
+            if host.replace('www.', '') != domain.lower().replace('www.', ''):
+                return host
+        return domain
+
+    @staticmethod
+    def _sitemap_candidates(domain: str) -> List[str]:
+        return [
+            f"https://{domain}/robots.txt",
+            f"https://{domain}/sitemap.xml",
+            f"https://{domain}/sitemap_index.xml",
+            f"https://{domain}/sitemap-index.xml",
+            f"https://{domain}/wp-sitemap.xml",
+            f"https://{domain}/post-sitemap.xml",
+        ]
+
+    def _forbidden_error(self, domain: str, total_attempts: int) -> Exception:
+        logger.error(
+            f"🚫 Domain {domain} blocks datacenter IPs (403 Forbidden on all {total_attempts} attempts). "
+            f"Đã thử {len(self.user_agents)} user agents khác nhau, tất cả đều bị chặn."
+        )
+        return Exception(
+            f"Domain {domain} chặn IP datacenter (403 Forbidden). "
+            f"Domain này chặn IP từ datacenter và không thể crawl được. "
+            f"Không thể bypass bằng user agent."
+        )
 
     # -------------------------------
     # Xác định sitemap hợp lệ
@@ -495,58 +1103,247 @@ class SitemapParser:
     # -------------------------------
     # Đệ quy parse sitemap
     # -------------------------------
-    def parse_sitemap(self, sitemap_url: str, visited: Set[str] = None, depth: int = 0) -> Tuple[List[str], List[RedirectChain]]:
+    def parse_sitemap(
+        self,
+        sitemap_url: str,
+        visited: Set[str] = None,
+        depth: int = 0,
+        streaming: bool = None,
+        body_cache: FetchedBodyCache = None
+    ) -> Tuple[List[str], List[RedirectChain]]:
         """
         Parse XML sitemap and return list of URLs with redirect chains.
         Supports nested sitemap indexes.
 
+        Args:
+            streaming: Parse incrementally from the response stream
+                       (default: Config.STREAM_SITEMAPS)
+            body_cache: Sitemaps already fetched by discover_sitemaps in this crawl
+
         Returns:
             Tuple of (urls_list, redirect_chains_list)
         """
+        redirect_chains = []
+        urls = set(self.iter_sitemap_urls(sitemap_url, visited, depth, redirect_chains, streaming, body_cache))
+        return list(urls), redirect_chains
+
+    def iter_sitemap_urls(
+        self,
+        sitemap_url: str,
+        visited: Set[str] = None,
+        depth: int = 0,
+        redirect_chains: List[RedirectChain] = None,
+        streaming: bool = None,
+        body_cache: FetchedBodyCache = None,
+        ordered: bool = True
+    ) -> Iterator[str]:
+        """
+        Yield page URLs of a sitemap, following nested sitemap indexes.
+
+        The index is walked level by level: all children of one level are
+        fetched concurrently (bounded by Config.SITEMAP_INDEX_WORKERS and the
+        per-host limit), so wall time grows with index depth, not width.
+        URLs and redirect chains are merged in document order, so the output
+        is deterministic. A lone document is parsed inline, so its first
+        URLs are available before the download finishes.
+
+        Args:
+            visited: Shared set of sitemap URLs already handled
+            redirect_chains: Optional list that receives the redirect chains encountered
+            streaming: Parse incrementally from the response stream
+                       (default: Config.STREAM_SITEMAPS)
+            body_cache: Sitemaps already fetched by discover_sitemaps in this crawl
+            ordered: Merge sibling sitemaps in document order. False yields each
+                     one as soon as it is parsed (pipelines that don't need order)
+
+        Yields:
+            Page URLs (may contain duplicates across nested sitemaps)
+        """
+        if streaming is None:
+            streaming = Config.STREAM_SITEMAPS
         if visited is None:
             visited = set()
+        if redirect_chains is None:
+            redirect_chains = []
         if sitemap_url in visited:
-            return [], []
-        if depth > self.max_depth:
-            logger.warning(f"⚠️ Quá độ sâu cho sitemap: {sitemap_url}")
-            return [], []
+            return
 
         visited.add(sitemap_url)
+        level = [sitemap_url]
+
+        while level:
+            if depth > self.max_depth:
+                for url in level:
+                    logger.warning(f"⚠️ Quá độ sâu cho sitemap: {url}")
+                return
+
+            nested_by_doc = []
+            if len(level) == 1:
+                nested = []
+                yield from self._iter_document(level[0], nested, redirect_chains, streaming, body_cache)
+                nested_by_doc.append(nested)
+            else:
+                logger.info(f"📚 Fetching {len(level)} nested sitemaps song song (depth {depth})")
+                for urls, chains, nested in self._parse_level(level, streaming, body_cache, ordered):
+                    for chain in chains:
+                        self.record_chain(redirect_chains, chain)
+                    yield from urls
+                    nested_by_doc.append(nested)
+
+            # Only the coordinating thread touches `visited`
+            next_level = []
+            for nested in nested_by_doc:
+                for nested_url in nested:
+                    if nested_url not in visited:
+                        visited.add(nested_url)
+                        next_level.append(nested_url)
+
+            level = next_level
+            depth += 1
+
+    def _parse_level(
+        self,
+        level: List[str],
+        streaming: bool,
+        body_cache: FetchedBodyCache = None,
+        ordered: bool = True
+    ) -> Iterator[Tuple[List[str], List[RedirectChain], List[str]]]:
+        """Fetch and parse sibling sitemaps concurrently, yielding results in input (or completion) order."""
+        executor = fanout_scheduler.flow(max_running=Config.SITEMAP_INDEX_WORKERS)
+        try:
+            futures = [executor.submit(self._parse_document, url, streaming, body_cache) for url in level]
+            for future in (futures if ordered else as_completed(futures)):
+                yield future.result()
+        finally:
+            # Don't wait for siblings if a child failed or the consumer stopped early
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _parse_document(
+        self,
+        sitemap_url: str,
+        streaming: bool,
+        body_cache: FetchedBodyCache = None
+    ) -> Tuple[List[str], List[RedirectChain], List[str]]:
+        """Parse one sitemap document (no recursion) under the adaptive per-host concurrency limit."""
+        urls = []
+        chains = []
+        nested = []
+        with host_limiter.slot(sitemap_url):
+            urls.extend(self._iter_document(sitemap_url, nested, chains, streaming, body_cache))
+        return urls, chains, nested
+
+    def _iter_document(
+        self,
+        sitemap_url: str,
+        nested: List[str],
+        redirect_chains: List[RedirectChain],
+        streaming: bool,
+        body_cache: FetchedBodyCache = None
+    ) -> Iterator[str]:
+        """
+        Yield page URLs of a single sitemap document.
+        Nested sitemap locations are appended to `nested`, redirect chains to `redirect_chains`.
+        """
+        entries = self.iter_document_entries(sitemap_url, redirect_chains, streaming, body_cache)
+        yield from self._collect_entries(sitemap_url, entries, nested)
+
+    def iter_document_entries(
+        self,
+        sitemap_url: str,
+        redirect_chains: List[RedirectChain],
+        streaming: bool = None,
+        body_cache: FetchedBodyCache = None
+    ) -> Iterator[SitemapEntry]:
+        """
+        Yield the <url>/<sitemap> entries of a single sitemap document (no recursion).
+        Closing the generator early stops the download.
+        """
+        if streaming is None:
+            streaming = Config.STREAM_SITEMAPS
+        fetched = body_cache.take(sitemap_url) if body_cache is not None else None
+        if fetched is not None:
+            logger.info(f"♻️ Dùng lại sitemap đã tải khi discover: {sitemap_url}")
+            self.record_chain(redirect_chains, fetched.chain)
+            yield from fetched.entries
+            return
+
         logger.info(f"📥 Đang parse sitemap: {sitemap_url}")
 
         try:
-            xml_data, chain = self.fetch_url(sitemap_url)
+            if streaming:
+                response, chain = self.fetch_stream(sitemap_url)
+            else:
+                xml_data, chain = self.fetch_url(sitemap_url)
         except Exception as e:
             raise Exception(f"Lỗi tải sitemap: {e}")
 
-        urls = []
-        redirect_chains = []
-
         # Collect redirect chain if there were redirects
-        if chain and chain.total_redirects > 0:
-            redirect_chains.append(chain)
+        self.record_chain(redirect_chains, chain)
 
         try:
-            root = ET.fromstring(xml_data)
-            ns = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-
-            # URL set
-            for loc in root.findall(".//ns:url/ns:loc", ns):
-                if loc.text:
-                    urls.append(loc.text.strip())
+            if streaming:
+                xml_stream, reader = self._open_xml_stream(response)
+                entries = self.iter_sitemap_entries(xml_stream)
+            else:
+                entries = self._tree_entries(xml_data)
 
-            # Nested sitemaps
-            for sm in root.findall(".//ns:sitemap/ns:loc", ns):
-                nested_url = sm.text.strip()
-                if nested_url not in visited:
-                    nested_urls, nested_chains = self.parse_sitemap(nested_url, visited, depth + 1)
-                    urls.extend(nested_urls)
-                    redirect_chains.extend(nested_chains)
+            yield from entries
 
-            logger.info(f"✅ Parsed {len(urls)} URLs từ {sitemap_url}")
-            return list(set(urls)), redirect_chains
+            captured = reader.captured() if streaming and reader is not None else None
+            if captured is not None:
+                http_cache.store(sitemap_url, response, captured, compressed=True)
 
         except ET.ParseError as e:
             raise Exception(f"Lỗi parse XML {sitemap_url}: {e}")
-        except Exception as e:
-            raise Exception(f"Lỗi không xác định khi parse sitemap {sitemap_url}: {e}")
\ No newline at end of file
+        except (OSError, EOFError, requests.exceptions.RequestException) as e:
+            raise Exception(f"Lỗi không xác định khi parse sitemap {sitemap_url}: {e}")
+        finally:
+            if streaming:
+                response.close()
+
+    @staticmethod
+    def record_chain(redirect_chains: List[RedirectChain], chain: Optional[RedirectChain]):
+        """
+        Append a chain that has redirects. Memoized chains repeat a known host
+        redirect, so only the first one per host is kept.
+        """
+        if not chain or chain.total_redirects == 0:
+            return
+        if chain.memoized:
+            origin, _ = RedirectMemo.split(chain.initial_url)
+            if any(RedirectMemo.split(c.initial_url)[0] == origin for c in redirect_chains):
+                return
+        redirect_chains.append(chain)
+
+    @staticmethod
+    def _collect_entries(sitemap_url: str, entries: Iterable[SitemapEntry], nested: List[str]) -> Iterator[str]:
+        """Yield page URLs of `entries`, appending nested sitemap locations to `nested`"""
+        url_count = 0
+        for entry in entries:
+            if entry.kind == 'url':
+                url_count += 1
+                yield entry.loc
+            else:
+                nested.append(entry.loc)
+        logger.info(f"✅ Parsed {url_count} URLs từ {sitemap_url}")
+
+    @staticmethod
+    def _tree_entries(xml_data: str) -> List[SitemapEntry]:
+        """Buffered (non-streaming) parse of a whole sitemap document"""
+        root = ET.fromstring(xml_data)
+        ns = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+
+        # URL set
+        entries = [
+            SitemapEntry(kind='url', loc=loc.text.strip())
+            for loc in root.findall(".//ns:url/ns:loc", ns)
+            if loc.text
+        ]
+
+        # Nested sitemaps
+        entries.extend(
+            SitemapEntry(kind='sitemap', loc=sm.text.strip())
+            for sm in root.findall(".//ns:sitemap/ns:loc", ns)
+            if sm.text
+        )
+        return entries
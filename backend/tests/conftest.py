@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Tests import the backend modules the way app.py does (`from config import Config`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the global caches / job DB created at import out of the working tree
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='sitemap-crawler-tests-'))
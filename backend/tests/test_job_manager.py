@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from utils.job_manager import FINAL_STATES, JobManager, clean_domain
+
+PAGES = {
+    'a.com': ['https://a.com/1', 'https://a.com/2'],
+    'b.com': ['https://b.com/1', 'https://b.com/2'],
+}
+
+
+class Runner:
+    """Emits each pending domain's pages then the domain; the first run fails inside b.com"""
+
+    def __init__(self):
+        self.fail = True
+        self.pending = []
+
+    def __call__(self, params, job):
+        domains = job.pending(params['domains'])
+        self.pending.append(domains)
+        for domain in domains:
+            for url in PAGES[clean_domain(domain)]:
+                if self.fail and url == 'https://b.com/2':
+                    raise RuntimeError('connection lost')
+                job.emit({'url': url}, key=url)
+            job.emit({'status': 'domain_done', 'domain': domain}, domain=domain)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return JobManager(
+        path=str(tmp_path / 'jobs.db'), max_running=2, idle_timeout=60,
+        heartbeat=1, retention_days=1, replay_buffer=100
+    )
+
+
+def wait_final(manager, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while manager.get(job_id)['status'] not in FINAL_STATES:
+        assert time.monotonic() < deadline, 'job did not finish'
+        time.sleep(0.02)
+    return manager.get(job_id)
+
+
+def test_resume_skips_done_domains_and_drops_repeated_keys(manager):
+    runner = Runner()
+    manager.register('crawl', runner)
+    job_id = manager.submit('crawl', {'domains': ['a.com', 'https://b.com/']}, detached=True)['id']
+
+    job = wait_final(manager, job_id)
+    assert job['status'] == 'failed'
+    assert job['done_domains'] == ['a.com']
+    assert job['events'] == 5  # a.com/1, a.com/2, a.com done, b.com/1, error
+
+    runner.fail = False
+    assert manager.resume(job_id) is not None
+    job = wait_final(manager, job_id)
+    assert job['status'] == 'completed'
+    assert runner.pending == [['a.com', 'https://b.com/'], ['https://b.com/']]
+    assert job['done_domains'] == ['a.com', 'b.com']
+
+    events = manager.events(job_id)
+    assert [seq for seq, _ in events] == list(range(1, 8))  # seqs continue after the first run
+    urls = [data['url'] for _, data in events if 'url' in data]
+    assert urls == ['https://a.com/1', 'https://a.com/2', 'https://b.com/1', 'https://b.com/2']
+
+
+def test_only_stopped_jobs_resume(manager):
+    runner = Runner()
+    runner.fail = False
+    manager.register('crawl', runner)
+    job_id = manager.submit('crawl', {'domains': ['a.com']}, detached=True)['id']
+    assert wait_final(manager, job_id)['status'] == 'completed'
+    assert manager.resume(job_id) is None
+    assert manager.resume('missing') is None
+
+
+def test_events_are_on_disk_once_the_job_is_final(manager, tmp_path):
+    runner = Runner()
+    runner.fail = False
+    manager.register('crawl', runner)
+    job_id = manager.submit('crawl', {'domains': ['a.com', 'b.com']}, detached=True)['id']
+    wait_final(manager, job_id)
+
+    reopened = JobManager(
+        path=str(tmp_path / 'jobs.db'), max_running=1, idle_timeout=60,
+        heartbeat=1, retention_days=1, replay_buffer=100
+    )
+    job = reopened.get(job_id)
+    assert job['status'] == 'completed'
+    assert job['events'] == 6
+    assert reopened.events(job_id) == manager.events(job_id)
+
+
+def test_unknown_job_type(manager):
+    with pytest.raises(ValueError):
+        manager.submit('nope', {})
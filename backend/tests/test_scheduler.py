@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import Counter
+
+from utils.scheduler import CrawlScheduler
+
+
+def run_after_gate(scheduler, flows, per_flow=12):
+    """Queue per_flow tasks on each executor while the only worker is busy, then record dispatch order"""
+    gate = threading.Event()
+    order = []
+    blocker = scheduler.flow()
+    blocker.submit(gate.wait, 5)
+    futures = [
+        executor.submit(order.append, name)
+        for _ in range(per_flow) for name, executor in flows.items()
+    ]
+    gate.set()
+    for future in futures:
+        future.result(5)
+    blocker.shutdown()
+    for executor in flows.values():
+        executor.shutdown()
+    return order
+
+
+def test_equal_flows_alternate():
+    scheduler = CrawlScheduler(workers=1)
+    order = run_after_gate(scheduler, {'a': scheduler.flow(), 'b': scheduler.flow()})
+    assert Counter(order[:10]) == {'a': 5, 'b': 5}
+
+
+def test_weights_split_the_workers():
+    scheduler = CrawlScheduler(workers=1)
+    order = run_after_gate(scheduler, {'a': scheduler.flow(weight=3), 'b': scheduler.flow(weight=1)})
+    assert Counter(order[:8]) == {'a': 6, 'b': 2}
+
+
+def test_flows_of_one_client_share_its_weight():
+    scheduler = CrawlScheduler(workers=1)
+    flows = {
+        'x1': scheduler.flow(client='x'),
+        'x2': scheduler.flow(client='x'),
+        'y': scheduler.flow(client='y'),
+    }
+    counts = Counter(run_after_gate(scheduler, flows)[:12])
+    assert counts['y'] == 6
+    assert counts['x1'] + counts['x2'] == 6
+
+
+class Peak:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = Counter()
+        self.peak = Counter()
+
+    def task(self, *names):
+        with self.lock:
+            for name in names:
+                self.running[name] += 1
+                self.peak[name] = max(self.peak[name], self.running[name])
+        time.sleep(0.02)
+        with self.lock:
+            for name in names:
+                self.running[name] -= 1
+
+
+def test_executor_and_flow_caps():
+    scheduler = CrawlScheduler(workers=8)
+    peak = Peak()
+    first = scheduler.flow('job', max_running=3)
+    second = scheduler.flow('job', max_running=2)
+    capped = scheduler.flow(max_running=2)
+    futures = []
+    for _ in range(10):
+        futures.append(first.submit(peak.task, 'job', 'first'))
+        futures.append(second.submit(peak.task, 'job', 'second'))
+        futures.append(capped.submit(peak.task, 'capped'))
+    for future in futures:
+        future.result(5)
+    assert peak.peak['job'] == 3
+    assert peak.peak['second'] == 2
+    assert peak.peak['capped'] == 2
+
+
+def test_shutdown_cancels_queued_tasks():
+    scheduler = CrawlScheduler(workers=1)
+    gate = threading.Event()
+    executor = scheduler.flow()
+    running = executor.submit(gate.wait, 5)
+    queued = [executor.submit(time.sleep, 0) for _ in range(5)]
+    threading.Timer(0.05, gate.set).start()
+    executor.shutdown(wait=True, cancel_futures=True)
+    assert running.result() is True
+    assert all(future.cancelled() for future in queued)
+    assert scheduler.get_stats()['flows'] == {}
+
+
+def test_held_task_does_not_block_the_tasks_behind_it():
+    scheduler = CrawlScheduler(workers=4)
+    busy = {'slow.host': 0}
+    lock = threading.Lock()
+    calls = Counter()
+    order = []
+
+    def admit(host, _):
+        calls[host] += 1
+        with lock:
+            if host in busy:
+                if busy[host]:
+                    return False
+                busy[host] += 1
+        return True
+
+    def release(host):
+        with lock:
+            if host in busy:
+                busy[host] -= 1
+        scheduler.wake()
+
+    def fetch(host, i):
+        time.sleep(0.05)
+        order.append(host)
+        release(host)
+
+    with scheduler.flow(admit=admit, release=lambda host, _: release(host)) as executor:
+        for i in range(4):
+            executor.submit(fetch, 'slow.host', i)
+        for i in range(4):
+            executor.submit(fetch, 'fast.host', i)
+    # slow.host runs one at a time; fast.host's pages don't wait behind it
+    assert order.index('fast.host') < order.index('slow.host', 1)
+    assert order.count('slow.host') == 4
+    # Held tasks are retried on wake(), not polled by every idle worker
+    assert calls['slow.host'] < 40
+
+
+def test_admission_delay_is_honoured():
+    scheduler = CrawlScheduler(workers=2)
+    ready_at = time.monotonic() + 0.2
+    calls = []
+
+    def admit():
+        calls.append(time.monotonic())
+        wait = ready_at - time.monotonic()
+        return True if wait <= 0 else wait
+
+    started = time.monotonic()
+    with scheduler.flow(admit=admit) as executor:
+        future = executor.submit(lambda: time.monotonic())
+    assert future.result() >= ready_at
+    assert time.monotonic() - started < 1
+    assert len(calls) <= 4
+    assert scheduler.get_stats()['admission_waits'] >= 1
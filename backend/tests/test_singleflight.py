@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from utils.singleflight import SingleFlight, flight_key
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+class Leader:
+    """fn for SingleFlight.run: emits 1, 2, waits for `go`, emits 3, returns a result"""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.go = threading.Event()
+        self.cancel_seen = None
+
+    def __call__(self, emit, cancel):
+        self.calls += 1
+        emit(1)
+        emit(2)
+        self.started.set()
+        assert self.go.wait(5)
+        emit(3)
+        self.cancel_seen = cancel.is_set()
+        return {'urls': 3}
+
+
+def run_in_thread(flights, key, fn, on_event=None, cancel=None):
+    box = {}
+    thread = threading.Thread(target=lambda: box.update(result=flights.run(key, fn, on_event, cancel)))
+    thread.start()
+    return thread, box
+
+
+def test_joiner_gets_replay_then_live_events_and_the_result():
+    flights = SingleFlight(enabled=True, replay_max=100)
+    leader = Leader()
+    leader_events, joiner_events = [], []
+    t1, r1 = run_in_thread(flights, 'k', leader, leader_events.append)
+    assert leader.started.wait(5)
+
+    t2, r2 = run_in_thread(flights, 'k', leader, joiner_events.append)
+    wait_for(lambda: flights.get_stats()['joined'] == 1)
+    assert joiner_events == [1, 2]  # replayed before the join returns
+
+    leader.go.set()
+    t1.join(5)
+    t2.join(5)
+    assert leader.calls == 1
+    assert leader_events == joiner_events == [1, 2, 3]
+    assert r1['result'] == r2['result'] == {'urls': 3}
+    assert r1['result'] is not r2['result']  # each participant gets its own dict
+    assert flights.get_stats()['in_flight'] == 0
+
+
+def test_crawl_is_cancelled_only_when_every_participant_cancels():
+    flights = SingleFlight(enabled=True, replay_max=100)
+    leader = Leader()
+    leader_cancel, joiner_cancel = threading.Event(), threading.Event()
+    t1, _ = run_in_thread(flights, 'k', leader, cancel=leader_cancel)
+    assert leader.started.wait(5)
+    t2, _ = run_in_thread(flights, 'k', leader, cancel=joiner_cancel)
+    wait_for(lambda: flights.get_stats()['joined'] == 1)
+
+    leader_cancel.set()
+    leader.go.set()
+    t1.join(5)
+    t2.join(5)
+    assert leader.cancel_seen is False  # the joiner still wants the result
+
+    leader = Leader()
+    both = threading.Event()
+    both.set()
+    t1, _ = run_in_thread(flights, 'k2', leader, cancel=both)
+    assert leader.started.wait(5)
+    leader.go.set()
+    t1.join(5)
+    assert leader.cancel_seen is True
+
+
+def test_no_join_past_the_replay_cap():
+    flights = SingleFlight(enabled=True, replay_max=1)
+    leader = Leader()
+    t1, _ = run_in_thread(flights, 'k', leader)
+    assert leader.started.wait(5)  # two events emitted: history dropped
+
+    own = []
+    result = flights.run('k', lambda emit, cancel: emit('own') or {'urls': 0}, own.append)
+    assert result == {'urls': 0}
+    assert own == ['own']
+    leader.go.set()
+    t1.join(5)
+    assert flights.get_stats()['history_overflows'] == 1
+
+
+def test_leader_error_reaches_joiners():
+    flights = SingleFlight(enabled=True, replay_max=100)
+    started, go = threading.Event(), threading.Event()
+
+    def failing(emit, cancel):
+        started.set()
+        go.wait(5)
+        raise RuntimeError('boom')
+
+    errors = []
+
+    def call():
+        try:
+            flights.run('k', failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    wait_for(lambda: flights.get_stats()['joined'] == 1)
+    go.set()
+    for thread in threads:
+        thread.join(5)
+    assert errors == ['boom', 'boom']
+
+
+@pytest.mark.parametrize('a, b', [
+    (('crawl', 'Example.com'), ('crawl', 'https://example.com/')),
+    (('crawl', 'http://example.com'), ('crawl', 'example.com')),
+])
+def test_flight_key_ignores_scheme_and_case(a, b):
+    assert flight_key(*a) == flight_key(*b)
+
+
+def test_flight_key_separates_pipelines_and_options():
+    assert flight_key('crawl', 'example.com') != flight_key('gp_content', 'example.com')
+    assert flight_key('gp_content', 'example.com', 10) != flight_key('gp_content', 'example.com', None)
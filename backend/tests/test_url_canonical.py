@@ -0,0 +1,53 @@
+import pytest
+
+from utils.url_canonical import CanonicalUrlSet, canonical_key
+
+
+@pytest.mark.parametrize('a, b', [
+    ('https://example.com/a?x=1&y=2', 'https://example.com/a?y=2&x=1'),  # query order
+    ('https://example.com/a?utm_source=x&id=3&gclid=y', 'https://example.com/a?id=3'),  # tracking params
+    ('https://example.com/a?utm_medium=mail', 'https://example.com/a'),
+    ('https://example.com:443/a', 'https://example.com/a'),  # default port
+    ('http://example.com:80/a', 'http://example.com/a'),
+    ('https://www.example.com/a', 'https://example.com/a'),  # www.
+    ('http://example.com/a', 'https://example.com/a'),  # scheme
+    ('https://example.com/a/', 'https://example.com/a'),  # trailing slash
+    ('https://example.com', 'https://example.com/'),
+    ('https://EXAMPLE.com/a#top', 'https://example.com/a'),  # host case, fragment
+])
+def test_equivalent_forms_share_a_key(a, b):
+    assert canonical_key(a) == canonical_key(b)
+
+
+@pytest.mark.parametrize('a, b', [
+    ('https://example.com/a', 'https://example.com/b'),
+    ('https://example.com/a', 'https://example.com/A'),  # paths are case-sensitive
+    ('https://example.com/a?id=1', 'https://example.com/a?id=2'),
+    ('https://example.com/a?id=1', 'https://example.com/a'),
+    ('https://example.com:8443/a', 'https://example.com/a'),  # non-default port
+    ('https://example.com:80/a', 'https://example.com/a'),  # 80 isn't the https default
+    ('https://blog.example.com/a', 'https://example.com/a'),  # only www. is dropped
+    ('https://example.org/a', 'https://example.com/a'),
+])
+def test_distinct_pages_keep_distinct_keys(a, b):
+    assert canonical_key(a) != canonical_key(b)
+
+
+def test_set_keeps_first_form_and_counts_duplicates():
+    urls = CanonicalUrlSet()
+    assert urls.update([
+        'https://example.com/a?utm_source=x',
+        'http://www.example.com/a/',
+        'https://example.com/b',
+        'https://example.com/b',
+    ]) == ['https://example.com/a?utm_source=x', 'https://example.com/b']
+    assert len(urls) == 2
+    assert urls.get_stats()['duplicates'] == 2
+
+
+def test_set_skips_learned_redirect_targets():
+    urls = CanonicalUrlSet()
+    assert urls.add('https://example.com/old')
+    urls.learn('https://example.com/old', 'https://example.com/new', None)
+    assert not urls.add('https://www.example.com/new/')
+    assert urls.get_stats()['learned'] == 1
@@ -0,0 +1,190 @@
+"""
+Persistent GP content result cache
+
+Title/keywords of crawled pages, keyed by canonical URL (utils.url_canonical,
+so equivalent forms of a page share one entry), with the page's
+ETag / Last-Modified. Within `ttl` an entry is served without any request;
+after that the page is revalidated with a conditional GET and a 304 serves
+the entry again without downloading or parsing. The number of entries is
+capped, least recently used entries are evicted first.
+"""
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from time import time
+from typing import Dict, Optional
+
+from config import Config
+from utils.html_parser import PageMetadata
+from utils.logger import logger
+from utils.url_canonical import canonical_key
+
+
+@dataclass
+class CachedContent:
+    """A cached page result with the validators it was served with"""
+    key: str
+    actual_url: str
+    metadata: PageMetadata
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    fresh: bool  # within the TTL: no request needed
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ContentCache:
+
+    def __init__(self, path: str, ttl: float, max_entries: int, enabled: bool = True):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+        self._entries = 0
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database lazily (caller holds the lock)"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            # One write per crawled page: WAL keeps commits cheap
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS content_cache (
+                    key TEXT PRIMARY KEY,
+                    actual_url TEXT,
+                    title TEXT,
+                    title_source TEXT,
+                    keywords TEXT,
+                    keywords_source TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL,
+                    last_access REAL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_content_cache_access ON content_cache (last_access)')
+            self._conn.commit()
+            self._entries = self._conn.execute('SELECT COUNT(*) FROM content_cache').fetchone()[0]
+        return self._conn
+
+    def get(self, url: str) -> Optional[CachedContent]:
+        """Look up a page result (marks it as recently used)"""
+        if not self.enabled:
+            return None
+        key = canonical_key(url)
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    'SELECT actual_url, title, title_source, keywords, keywords_source, etag, last_modified, stored_at '
+                    'FROM content_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE content_cache SET last_access = ? WHERE key = ?', (time(), key))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Content cache read failed for {url}: {e}")
+            return None
+
+        actual_url, title, title_source, keywords, keywords_source, etag, last_modified, stored_at = row
+        return CachedContent(
+            key, actual_url, PageMetadata(title, title_source, keywords, keywords_source),
+            etag, last_modified, stored_at, fresh=time() - stored_at < self.ttl
+        )
+
+    def hit(self, cached: CachedContent, revalidated: bool = False):
+        """Count a cached result being served; a 304 also restarts its TTL"""
+        with self._lock:
+            self.stats['revalidated' if revalidated else 'hits'] += 1
+            if not revalidated:
+                return
+            try:
+                conn = self._connect()
+                conn.execute('UPDATE content_cache SET stored_at = ? WHERE key = ?', (time(), cached.key))
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Content cache write failed for {cached.actual_url}: {e}")
+
+    def miss(self):
+        with self._lock:
+            self.stats['misses'] += 1
+
+    def store(self, url: str, metadata: PageMetadata, headers):
+        """
+        Cache the result of a 200 page.
+        `headers` are the response headers (requests or aiohttp), for the validators.
+        """
+        if not self.enabled:
+            return
+        key = canonical_key(url)
+        now = time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                exists = conn.execute('SELECT 1 FROM content_cache WHERE key = ?', (key,)).fetchone()
+                conn.execute(
+                    'INSERT OR REPLACE INTO content_cache '
+                    '(key, actual_url, title, title_source, keywords, keywords_source, etag, last_modified, '
+                    'stored_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, url, metadata.title, metadata.title_source, metadata.keywords, metadata.keywords_source,
+                     headers.get('ETag'), headers.get('Last-Modified'), now, now)
+                )
+                if not exists:
+                    self._entries += 1
+                self.stats['stores'] += 1
+                self._evict(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Content cache write failed for {url}: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used entries until under max_entries (caller holds the lock)"""
+        excess = self._entries - self.max_entries
+        if excess <= 0:
+            return
+        # Evict in batches so a full cache doesn't pay a DELETE per store
+        batch = max(excess, self.max_entries // 100)
+        deleted = conn.execute(
+            'DELETE FROM content_cache WHERE key IN '
+            '(SELECT key FROM content_cache ORDER BY last_access LIMIT ?)', (batch,)
+        ).rowcount
+        self._entries -= deleted
+        self.stats['evictions'] += deleted
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            if self.enabled:
+                try:
+                    self._connect()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Content cache unavailable: {e}")
+            stats = dict(self.stats)
+            stats['entries'] = self._entries
+        lookups = stats['hits'] + stats['revalidated'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['revalidated']) / lookups, 3) if lookups else 0.0
+        stats['enabled'] = self.enabled
+        return stats
+
+
+# Global cache shared by the content crawlers
+content_cache = ContentCache(
+    path=Config.CONTENT_CACHE_PATH,
+    ttl=Config.CONTENT_CACHE_TTL,
+    max_entries=Config.CONTENT_CACHE_MAX_ENTRIES,
+    enabled=Config.CONTENT_CACHE_ENABLED,
+)
@@ -0,0 +1,238 @@
+"""
+Adaptive per-host concurrency (AIMD)
+
+Each host starts with `initial` concurrent requests. While the host keeps all
+its slots busy and answers fast (latency within `latency_factor` × its running
+average), the limit grows by about one slot per round trip (additive increase).
+429/503/504 responses and timeouts halve it (multiplicative decrease), at most
+once per round trip. A Retry-After header pauses the host until it expires.
+"""
+
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from time import monotonic, time
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from utils.logger import logger
+from utils.rate_limiter import host_key
+
+OVERLOAD_STATUSES = (429, 503, 504)
+
+
+class _HostState:
+    __slots__ = ('limit', 'in_flight', 'blocked_until', 'latency', 'last_decrease', 'updated')
+
+    def __init__(self, limit: float, now: float):
+        self.limit = limit
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.latency = None  # EWMA of response latency (seconds)
+        self.last_decrease = 0.0
+        self.updated = now
+
+
+class AdaptiveHostLimiter:
+
+    MAX_IDLE = 600  # seconds before an idle host's state is dropped
+    LATENCY_ALPHA = 0.2
+    DECREASE_FACTOR = 0.5
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_factor: float = 2.0,
+        max_retry_after: float = 120,
+        adaptive: bool = True
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.initial = min(max(initial, self.minimum), self.maximum)
+        self.latency_factor = latency_factor
+        self.max_retry_after = max_retry_after
+        self.adaptive = adaptive
+        self._hosts: Dict[str, _HostState] = {}
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[], None]] = []
+        self.stats = {'increases': 0, 'decreases': 0, 'retry_after': 0}
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Call callback() (without the limiter's lock) when a host's slots or pause change"""
+        with self._cond:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in list(self._listeners):
+            callback()
+
+    def _state(self, url: str, now: float) -> _HostState:
+        """Get or create the state of the URL's host (caller holds the lock)"""
+        key = host_key(url)
+        state = self._hosts.get(key)
+        if state is None:
+            if len(self._hosts) > 10000:
+                self._prune(now)
+            state = self._hosts[key] = _HostState(float(self.initial), now)
+        state.updated = now
+        return state
+
+    # -------------------------------
+    # Admission
+    # -------------------------------
+    def acquire(self, url: str):
+        """Block until the URL's host has a free slot and isn't paused by Retry-After"""
+        with self._cond:
+            while True:
+                now = monotonic()
+                state = self._state(url, now)
+                if now < state.blocked_until:
+                    self._cond.wait(state.blocked_until - now)
+                elif state.in_flight >= int(state.limit):
+                    self._cond.wait()
+                else:
+                    state.in_flight += 1
+                    return
+
+    def try_acquire(self, url: str) -> bool:
+        """Take a slot without waiting (for asyncio callers)"""
+        with self._cond:
+            now = monotonic()
+            state = self._state(url, now)
+            if now < state.blocked_until or state.in_flight >= int(state.limit):
+                return False
+            state.in_flight += 1
+            return True
+
+    def release(self, url: str):
+        with self._cond:
+            state = self._state(url, monotonic())
+            state.in_flight = max(0, state.in_flight - 1)
+            self._cond.notify_all()
+        self._notify()
+
+    @contextmanager
+    def slot(self, url: str):
+        self.acquire(url)
+        try:
+            yield
+        finally:
+            self.release(url)
+
+    # -------------------------------
+    # Feedback
+    # -------------------------------
+    def record(
+        self,
+        url: str,
+        status_code: int = None,
+        latency: float = None,
+        retry_after: str = None,
+        timeout: bool = False
+    ):
+        """
+        Report the outcome of a request to the URL's host.
+
+        Args:
+            status_code: HTTP status of the response (None on network errors)
+            latency: Seconds until the response headers arrived
+            retry_after: Raw Retry-After header value, if any
+            timeout: The request timed out
+        """
+        with self._cond:
+            now = monotonic()
+            state = self._state(url, now)
+
+            pause = self._parse_retry_after(retry_after) if retry_after else None
+            if pause:
+                state.blocked_until = max(state.blocked_until, now + min(pause, self.max_retry_after))
+                self.stats['retry_after'] += 1
+                logger.warning(f"⏸️ {host_key(url)} yêu cầu chờ {pause:.0f}s (Retry-After)")
+
+            if timeout or status_code in OVERLOAD_STATUSES:
+                self._decrease(url, state, now)
+            elif status_code is not None and latency is not None:
+                fast = state.latency is None or latency <= self.latency_factor * state.latency
+                state.latency = latency if state.latency is None else (
+                    self.LATENCY_ALPHA * latency + (1 - self.LATENCY_ALPHA) * state.latency
+                )
+                # Only grow hosts that actually use all their slots
+                if self.adaptive and fast and status_code < 500 and state.in_flight >= int(state.limit):
+                    new_limit = min(self.maximum, state.limit + 1 / state.limit)
+                    if int(new_limit) > int(state.limit):
+                        self.stats['increases'] += 1
+                    state.limit = new_limit
+
+            self._cond.notify_all()
+        self._notify()
+
+    def _decrease(self, url: str, state: _HostState, now: float):
+        """Multiplicative decrease, at most once per round trip (caller holds the lock)"""
+        if not self.adaptive:
+            return
+        if now - state.last_decrease < max(1.0, state.latency or 0.0):
+            return
+        state.last_decrease = now
+        old_limit = int(state.limit)
+        state.limit = max(float(self.minimum), state.limit * self.DECREASE_FACTOR)
+        self.stats['decreases'] += 1
+        logger.warning(f"🐢 {host_key(url)} quá tải, giảm concurrency {old_limit} → {int(state.limit)}")
+
+    @staticmethod
+    def _parse_retry_after(value: str) -> Optional[float]:
+        """Retry-After is either delay-seconds or an HTTP date"""
+        value = value.strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+        except (TypeError, ValueError):
+            return None
+
+    # -------------------------------
+    # Introspection
+    # -------------------------------
+    def limit(self, url: str) -> int:
+        """Current concurrency limit of the URL's host"""
+        with self._cond:
+            return int(self._state(url, monotonic()).limit)
+
+    def blocked_for(self, url: str) -> float:
+        """Seconds until the URL's host may be contacted again (Retry-After)"""
+        with self._cond:
+            now = monotonic()
+            return max(0.0, self._state(url, now).blocked_until - now)
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self.stats)
+            limits = [int(state.limit) for state in self._hosts.values()]
+        stats['hosts'] = len(limits)
+        stats['max_limit'] = max(limits) if limits else 0
+        stats['adaptive'] = self.adaptive
+        return stats
+
+    def _prune(self, now: float):
+        """Drop idle hosts without requests in flight (caller holds the lock)"""
+        idle = [
+            key for key, state in self._hosts.items()
+            if state.in_flight == 0 and now - state.updated > self.MAX_IDLE
+        ]
+        for key in idle:
+            del self._hosts[key]
+
+
+# Global limiter shared by sitemap and content crawlers
+host_limiter = AdaptiveHostLimiter(
+    initial=Config.MAX_CONNECTIONS_PER_HOST,
+    minimum=1,
+    maximum=Config.MAX_WORKERS,
+    latency_factor=Config.HOST_LATENCY_FACTOR,
+    max_retry_after=Config.MAX_RETRY_AFTER,
+    adaptive=Config.ADAPTIVE_CONCURRENCY,
+)
@@ -10,59 +10,226 @@ Lý do og:title là đầu tiên:
   - WordPress + Yoast/RankMath luôn set og:title TĨNH trong HTML
   - <title> thường RỖNG với WordPress (JS fill sau khi load)
   - og:title luôn có tiếng Việt đầy đủ dấu
+
+Single pass: the page is parsed once with lxml's incremental HTML parser, which
+stops after </head> when the head answers both chains, otherwise after the
+first <h1>. Elements outside the <h1> are dropped as soon as they are read.
+MetadataStream exposes the same parse to callers that read the body in chunks
+and can stop downloading once it is done; HeadBoundary gives the same stop
+point on raw bytes, for callers that parse elsewhere (process pool).
 """
 
 import re
-import warnings
+from dataclasses import dataclass
+from typing import Optional
 from urllib.parse import urlparse
 
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
-
-warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+from lxml import etree
+
+FEED_CHUNK_SIZE = 16 * 1024  # characters fed to the parser between stop checks
+
+
+@dataclass
+class PageMetadata:
+    """Title + keywords of a page, with the tag each one came from"""
+    title: str
+    title_source: str     # 'og:title' | 'twitter:title' | 'title' | 'h1' | ''
+    keywords: str
+    keywords_source: str  # 'meta_keywords' | 'og:title' | 'h1' | 'title' | 'slug' | ''
+    canonical: str = ''   # <link rel="canonical"> href, as written in the page
+
+
+class _HeadScanner:
+    """First occurrence of each tag the priority chains use (None = not seen)"""
+
+    def __init__(self):
+        self.og_title: Optional[str] = None
+        self.twitter_title: Optional[str] = None
+        self.meta_keywords: Optional[str] = None
+        self.title: Optional[str] = None
+        self.h1: Optional[str] = None
+        self.canonical: Optional[str] = None
+        self.done = False
+        self._h1_depth = 0  # > 0 while inside the first <h1>
+        self._parser = etree.HTMLPullParser(events=('start', 'end'))
+        self._closed = False
+
+    def feed(self, text: str) -> bool:
+        """Parse the next piece of the page; True once the rest can't change the result"""
+        if not self.done and text:
+            self._parser.feed(text)
+            self.done = self._consume()
+        return self.done
+
+    def close(self) -> '_HeadScanner':
+        """End of input (whole page or byte budget reached)"""
+        if not self.done and not self._closed:
+            self._closed = True
+            try:
+                self._parser.close()
+            except etree.LxmlError:
+                pass  # Nothing parseable was fed
+            self.done = self._consume()
+        return self
+
+    def _consume(self) -> bool:
+        for event, elem in self._parser.read_events():
+            tag = elem.tag
+            if event == 'start':
+                if tag == 'h1' and self.h1 is None:
+                    self._h1_depth += 1
+                elif self._h1_depth:
+                    self._h1_depth += 1
+                continue
+
+            if self._h1_depth:
+                self._h1_depth -= 1
+                if self._h1_depth == 0:
+                    # Same text as BeautifulSoup's get_text(strip=True)
+                    self.h1 = ''.join(text.strip() for text in elem.itertext())
+                    return True
+                continue
+
+            if tag == 'meta':
+                self._read_meta(elem)
+            elif tag == 'link' and self.canonical is None and elem.get('rel', '').lower() == 'canonical':
+                self.canonical = elem.get('href', '').strip()
+            elif tag == 'title' and self.title is None:
+                self.title = ''.join(text.strip() for text in elem.itertext())
+            elif tag == 'head' and self._head_is_enough():
+                return True
+            elem.clear()
+        return False
+
+    def _read_meta(self, elem):
+        content = elem.get('content', '').strip()
+        if self.og_title is None and elem.get('property') == 'og:title':
+            self.og_title = content
+        name = elem.get('name')
+        if name is None:
+            return
+        if self.twitter_title is None and name == 'twitter:title':
+            self.twitter_title = content
+        elif self.meta_keywords is None and name.lower() == 'keywords':
+            self.meta_keywords = content
+
+    def _head_is_enough(self) -> bool:
+        """Both chains are answered before reaching their <h1> step"""
+        if self.og_title:
+            return True
+        has_title = bool(self.twitter_title or self.title)
+        return has_title and bool(self.meta_keywords)
+
+
+class HeadBoundary:
+    """
+    Byte-level check that a page prefix holds what extract_metadata needs:
+    the first </h1>, or </head> when og:title was already seen (og:title
+    answers both chains). Works on raw chunks, before decoding.
+    """
+
+    OVERLAP = 16  # bytes kept from the previous chunk so markers split across chunks are found
+
+    def __init__(self):
+        self._tail = b''
+        self._og_title = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """True once the bytes read so far are enough"""
+        window = (self._tail + chunk).lower()
+        self._tail = window[-self.OVERLAP:]
+        if b'</h1' in window:
+            return True
+        self._og_title = self._og_title or b'og:title' in window
+        return self._og_title and b'</head' in window
+
+
+class MetadataStream:
+    """
+    Incremental HTMLParser.extract_metadata for a body read in chunks:
+    feed() decoded text until it returns True, then call result().
+    """
+
+    def __init__(self, url: str = ''):
+        self.url = url
+        self._scanner = _HeadScanner()
+        self._fed = False
+
+    def feed(self, text: str) -> bool:
+        self._fed = self._fed or bool(text)
+        return self._scanner.feed(text)
+
+    def result(self) -> PageMetadata:
+        if not self._fed:
+            return HTMLParser.extract_metadata('', self.url)
+        return HTMLParser._resolve(self._scanner.close(), self.url)
 
 
 class HTMLParser:
 
     @staticmethod
-    def extract_title_from_html(html_content: str) -> str:
+    def extract_metadata(html_content: str, url: str = '') -> PageMetadata:
         """
-        Extract page title.
-        Priority: og:title → twitter:title → <title> → <h1>
+        Extract title + keywords in one parse.
+        Title:    og:title → twitter:title → <title> → <h1>
+        Keywords: meta keywords → og:title[trước " - "] → h1 → title[trước " - "] → slug
         """
         if not html_content:
-            return ''
+            slug = HTMLParser._slug_fallback(url)
+            return PageMetadata('', '', slug, 'slug' if slug else '')
 
-        soup = BeautifulSoup(html_content, 'lxml')
+        scanner = _HeadScanner()
+        for i in range(0, len(html_content), FEED_CHUNK_SIZE):
+            if scanner.feed(html_content[i:i + FEED_CHUNK_SIZE]):
+                break
+        return HTMLParser._resolve(scanner.close(), url)
 
+    @staticmethod
+    def _resolve(tags: _HeadScanner, url: str) -> PageMetadata:
+        """Apply the priority chains to the tags found"""
+        # Title
         # 1. og:title — WordPress Yoast/RankMath luôn set tĩnh, đầy đủ dấu
-        og = soup.find('meta', property='og:title')
-        if og:
-            val = og.get('content', '').strip()
-            if val:
-                return val
-
         # 2. twitter:title
-        tw = soup.find('meta', attrs={'name': 'twitter:title'})
-        if tw:
-            val = tw.get('content', '').strip()
-            if val:
-                return val
-
         # 3. <title> — thường rỗng với WordPress SPA (JS fill sau)
-        title = soup.find('title')
-        if title:
-            val = title.get_text(strip=True)
-            if val:
-                return val
-
         # 4. <h1>
-        h1 = soup.find('h1')
-        if h1:
-            val = h1.get_text(strip=True)
+        title, title_source = '', ''
+        for source, val in (
+            ('og:title', tags.og_title),
+            ('twitter:title', tags.twitter_title),
+            ('title', tags.title),
+            ('h1', tags.h1),
+        ):
             if val:
-                return val
+                title, title_source = val, source
+                break
 
-        return ''
+        # Keywords
+        # 1. meta keywords — có dấu đầy đủ, nguồn tốt nhất
+        # 2. og:title → lấy phần trước " - "
+        # 3. h1
+        # 4. <title> → lấy phần trước " - "
+        # 5. Slug — KHÔNG có dấu, fallback cuối cùng
+        if tags.meta_keywords:
+            keywords, keywords_source = tags.meta_keywords, 'meta_keywords'
+        elif tags.og_title:
+            keywords, keywords_source = tags.og_title.split(' - ')[0].strip(), 'og:title'
+        elif tags.h1:
+            keywords, keywords_source = tags.h1, 'h1'
+        elif tags.title:
+            keywords, keywords_source = tags.title.split(' - ')[0].strip(), 'title'
+        else:
+            keywords = HTMLParser._slug_fallback(url)
+            keywords_source = 'slug' if keywords else ''
+
+        return PageMetadata(title, title_source, keywords, keywords_source, tags.canonical or '')
+
+    @staticmethod
+    def extract_title_from_html(html_content: str) -> str:
+        """
+        Extract page title.
+        Priority: og:title → twitter:title → <title> → <h1>
+        """
+        return HTMLParser.extract_metadata(html_content).title
 
     @staticmethod
     def extract_keywords_from_html(html_content: str, url: str = '') -> str:
@@ -70,41 +237,7 @@ class HTMLParser:
         Extract keywords từ HTML — ưu tiên meta tags có dấu tiếng Việt.
         Priority: meta keywords → og:title[trước " - "] → h1 → title[trước " - "] → slug
         """
-        if not html_content:
-            return HTMLParser._slug_fallback(url)
-
-        soup = BeautifulSoup(html_content, 'lxml')
-
-        # 1. meta keywords — có dấu đầy đủ, nguồn tốt nhất
-        meta_kw = soup.find('meta', attrs={'name': re.compile(r'^keywords$', re.I)})
-        if meta_kw:
-            val = meta_kw.get('content', '').strip()
-            if val:
-                return val
-
-        # 2. og:title → lấy phần trước " - "
-        og = soup.find('meta', property='og:title')
-        if og:
-            val = og.get('content', '').strip()
-            if val:
-                return val.split(' - ')[0].strip()
-
-        # 3. h1
-        h1 = soup.find('h1')
-        if h1:
-            val = h1.get_text(strip=True)
-            if val:
-                return val
-
-        # 4. <title> → lấy phần trước " - "
-        title = soup.find('title')
-        if title:
-            val = title.get_text(strip=True)
-            if val:
-                return val.split(' - ')[0].strip()
-
-        # 5. Slug — KHÔNG có dấu, fallback cuối cùng
-        return HTMLParser._slug_fallback(url)
+        return HTMLParser.extract_metadata(html_content, url).keywords
 
     @staticmethod
     def _slug_fallback(url: str) -> str:
@@ -116,4 +249,4 @@ class HTMLParser:
             return ''
         slug = path.split('/')[-1]
         slug = re.sub(r'\.\w+$', '', slug)
-        return slug.replace('-', ' ').title()
\ No newline at end of file
+        return slug.replace('-', ' ').title()
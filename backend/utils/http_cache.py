@@ -0,0 +1,258 @@
+"""
+Persistent HTTP conditional-request cache (ETag / Last-Modified)
+
+Stores validators + body (zlib-compressed) of sitemaps and robots.txt in SQLite,
+so recrawls send If-None-Match / If-Modified-Since and a 304 is served locally.
+A lookup only reads the validators; the body is loaded on a 304 and
+decompressed as it is read. Total size is capped, least recently used
+entries are evicted first.
+"""
+
+import io
+import os
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass
+from time import time
+from typing import Dict, Optional
+
+import requests
+
+from config import Config
+from utils.logger import logger
+
+
+@dataclass
+class CachedResponse:
+    """Validators of a cached body (the body itself is read by HTTPCache.open_body on a 304)"""
+    url: str
+    final_url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class CachedBody(io.RawIOBase):
+    """Body of a cache entry, decompressed chunk by chunk as it is read"""
+
+    def __init__(self, blob: bytes, chunk_size: int = 64 * 1024):
+        self._blob = memoryview(blob)
+        self._pos = 0
+        self._chunk_size = chunk_size
+        self._inflater = zlib.decompressobj()
+        self._pending = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = len(buffer)
+        try:
+            while not self._pending and self._blob is not None:
+                if self._inflater.unconsumed_tail:
+                    self._pending = self._inflater.decompress(self._inflater.unconsumed_tail, size)
+                elif self._pos < len(self._blob):
+                    chunk = self._blob[self._pos:self._pos + self._chunk_size]
+                    self._pos += len(chunk)
+                    self._pending = self._inflater.decompress(chunk, size)
+                else:
+                    self._pending = self._inflater.flush()
+                    self._blob = None
+        except zlib.error as e:
+            raise OSError(f"Corrupt HTTP cache entry: {e}")
+        count = min(size, len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+    def close(self):
+        self._blob = None
+        self._pending = b''
+        super().close()
+
+
+class HTTPCache:
+
+    def __init__(self, path: str, max_bytes: int, max_entry_bytes: int, enabled: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = 0
+        # misses: validators sent but a full 200 came back; no_entry: nothing stored to revalidate
+        self.stats = {'hits': 0, 'misses': 0, 'no_entry': 0, 'stores': 0, 'evictions': 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database lazily (caller holds the lock)"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS http_cache (
+                    url TEXT PRIMARY KEY,
+                    final_url TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body BLOB,
+                    size INTEGER,
+                    last_access REAL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_http_cache_access ON http_cache (last_access)')
+            self._conn.commit()
+            self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM http_cache').fetchone()[0]
+        return self._conn
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Look up the validators of a cached entry to revalidate (marks it as recently used)"""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    'SELECT final_url, etag, last_modified FROM http_cache WHERE url = ?', (url,)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE http_cache SET last_access = ? WHERE url = ?', (time(), url))
+                conn.commit()
+            return CachedResponse(url, *row)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ HTTP cache read failed for {url}: {e}")
+            return None
+
+    def open_body(self, cached: CachedResponse) -> Optional[CachedBody]:
+        """
+        Body of an entry revalidated by a 304, as a stream.
+        None if the entry is gone since get() (evicted): the caller fetches it again.
+        """
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    'SELECT body FROM http_cache WHERE url = ?', (cached.url,)
+                ).fetchone()
+                if row is not None:
+                    self.stats['hits'] += 1
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ HTTP cache read failed for {cached.url}: {e}")
+            row = None
+        if row is None:
+            return None
+        logger.info(f"💾 304 Not Modified, served from cache: {cached.url}")
+        return CachedBody(row[0])
+
+    def hit(self, cached: CachedResponse) -> Optional[requests.Response]:
+        """Turn a 304 into a full 200 response whose body streams from the cache (None: see open_body)"""
+        body = self.open_body(cached)
+        if body is None:
+            return None
+        response = requests.Response()
+        response.status_code = 200
+        response.url = cached.final_url
+        response.raw = body
+        if cached.etag:
+            response.headers['ETag'] = cached.etag
+        if cached.last_modified:
+            response.headers['Last-Modified'] = cached.last_modified
+        return response
+
+    def miss(self, cached: Optional[CachedResponse], status_code: int):
+        """Count a fetch the cache didn't answer: a miss if get() found validators and the server sent a 200"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if cached is None:
+                self.stats['no_entry'] += 1
+            elif status_code == 200:
+                self.stats['misses'] += 1
+
+    def store(self, url: str, response, body: bytes = None, compressed: bool = False):
+        """
+        Cache a 200 response if it carries validators.
+        `response` is a requests or aiohttp response (only .headers and .url are used
+        when body is given).
+
+        Args:
+            body: Body bytes (default: response.content)
+            compressed: body is already zlib-compressed
+        """
+        if not self.enabled:
+            return
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        if body is None:
+            body = response.content
+        if not compressed:
+            body = zlib.compress(body)
+        size = len(body)
+        if size > self.max_entry_bytes:
+            return
+
+        try:
+            with self._lock:
+                conn = self._connect()
+                old = conn.execute('SELECT size FROM http_cache WHERE url = ?', (url,)).fetchone()
+                conn.execute(
+                    'INSERT OR REPLACE INTO http_cache '
+                    '(url, final_url, etag, last_modified, body, size, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (url, str(response.url), etag, last_modified, body, size, time())
+                )
+                self._total_bytes += size - (old[0] if old else 0)
+                self.stats['stores'] += 1
+                self._evict(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ HTTP cache write failed for {url}: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used entries until under max_bytes (caller holds the lock)"""
+        while self._total_bytes > self.max_bytes:
+            rows = conn.execute(
+                'SELECT url, size FROM http_cache ORDER BY last_access LIMIT 50'
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for url, size in rows:
+                conn.execute('DELETE FROM http_cache WHERE url = ?', (url,))
+                self._total_bytes -= size
+                self.stats['evictions'] += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            if self.enabled:
+                try:
+                    self._connect()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ HTTP cache unavailable: {e}")
+            stats = dict(self.stats)
+            stats['size_bytes'] = self._total_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['enabled'] = self.enabled
+        return stats
+
+
+# Global cache instance
+http_cache = HTTPCache(
+    path=Config.HTTP_CACHE_PATH,
+    max_bytes=Config.HTTP_CACHE_MAX_BYTES,
+    max_entry_bytes=Config.HTTP_CACHE_MAX_ENTRY_BYTES,
+    enabled=Config.HTTP_CACHE_ENABLED,
+)
@@ -0,0 +1,46 @@
+"""
+Pooled HTTP client shared by all crawler threads
+
+One requests.Session with keep-alive connection pools per host, so only the
+first request to a host pays for the TCP/TLS handshake. Headers are passed per
+request and session cookies are disabled, so no mutable state is shared
+between threads.
+"""
+
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+
+class SessionManager:
+
+    def __init__(self, pool_connections: int, pool_maxsize: int):
+        """
+        Args:
+            pool_connections: Number of per-host pools kept alive
+            pool_maxsize: Max idle keep-alive connections per host
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        # No cookie jar shared across threads/domains (same as plain requests.get)
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session = session
+
+    def get(self, url: str, headers: dict = None, **kwargs) -> requests.Response:
+        """requests.get over the shared pools; headers are per request"""
+        return self.session.get(url, headers=headers, **kwargs)
+
+
+# Global client instance
+http_client = SessionManager(
+    pool_connections=Config.HTTP_POOL_HOSTS,
+    pool_maxsize=Config.MAX_WORKERS,
+)
@@ -0,0 +1,551 @@
+"""
+Crawl jobs: state and results kept in SQLite, independent of the HTTP request
+
+A streamed crawl is submitted as a job and runs on the job pool (at most
+JOB_MAX_RUNNING at a time, the rest wait queued). Its SSE payloads are
+appended to the job's event log with increasing sequence numbers; clients
+attach to a job to replay the log after a given seq and follow new events,
+so a dropped stream reconnects (Last-Event-ID) without restarting the crawl,
+and finished results can still be polled.
+
+The last JOB_REPLAY_BUFFER events of a running job are also kept in memory,
+so followers and quick reconnects are served without reading the database;
+replays further back read the log from disk. Events are written in batches
+(every FLUSH_INTERVAL, or FLUSH_EVENTS pending) by a writer thread, not one
+transaction per event on the crawl threads.
+
+A job that nobody follows (no attached stream, no poll) for JOB_IDLE_TIMEOUT
+seconds is cancelled, unless it was submitted detached. Jobs cut short by a
+restart are marked interrupted; resuming one skips domains already done.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from time import sleep, time
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from config import Config
+from utils.logger import logger
+
+FINAL_STATES = ('completed', 'failed', 'cancelled', 'interrupted')
+IDLE = 'idle'  # error of a job cancelled because no client followed it
+
+
+def clean_domain(domain: str) -> str:
+    return domain.strip().replace('https://', '').replace('http://', '').strip('/')
+
+
+class JobContext:
+    """Handed to a job runner: its cancel flag and the event log to write to"""
+
+    def __init__(
+        self,
+        manager: 'JobManager',
+        job_id: str,
+        cancel: threading.Event,
+        done_domains: Set[str],
+        emitted_keys: Set[str]
+    ):
+        self.id = job_id
+        self.cancel = cancel
+        self._manager = manager
+        self._done_domains = done_domains
+        self._emitted_keys = emitted_keys
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel.is_set()
+
+    def pending(self, domains: List[str]) -> List[str]:
+        """Domains not completed by an earlier run of this job (resume)"""
+        return [d for d in domains if clean_domain(d) not in self._done_domains]
+
+    def emit(self, payload: Dict, domain: Optional[str] = None, key: Optional[str] = None):
+        """
+        Append an event. `domain` marks that domain as done (skipped on resume).
+        An event with a `key` emitted by an earlier run of this job (e.g. a URL
+        result re-crawled after a resume) is dropped, as is everything once the
+        job is cancelled.
+        """
+        if self.cancel.is_set():
+            return
+        self._manager._append(self.id, payload, self._done_domains, domain, self._emitted_keys, key)
+
+
+@dataclass
+class _LiveJob:
+    """In-memory side of a queued / running job"""
+    status: str
+    detached: bool
+    cancel: threading.Event
+    changed: threading.Condition  # new event or state change
+    last_seen: float
+    recent: deque  # (seq, data) of the latest events
+    seq: int = 0  # of the last event (written to disk by the writer thread)
+    listeners: int = 0
+    cancel_reason: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+
+class JobManager:
+
+    FLUSH_INTERVAL = 0.25  # seconds between event batch writes
+    FLUSH_EVENTS = 500  # pending events that trigger a write right away
+
+    def __init__(
+        self,
+        path: str,
+        max_running: int,
+        idle_timeout: float,
+        heartbeat: float,
+        retention_days: float,
+        replay_buffer: int
+    ):
+        self.path = path
+        self.max_running = max(1, max_running)
+        self.idle_timeout = idle_timeout
+        self.heartbeat = heartbeat
+        self.retention = retention_days * 86400
+        self.replay_buffer = max(1, replay_buffer)
+        self._runners: Dict[str, Callable[[Dict, JobContext], None]] = {}
+        self._live: Dict[str, _LiveJob] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._executor = None
+        self._watchdog = None
+        self._writer = None
+        self._flush_now = threading.Event()
+        self._pending: List[Tuple[str, int, str, Optional[str]]] = []  # events not written yet
+        self._touched: Dict[str, Tuple[int, Optional[Set[str]]]] = {}  # job -> (last seq, done_domains if changed)
+        self.stats = {
+            'submitted': 0, 'resumed': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'idle_cancelled': 0,
+            'replayed_memory': 0, 'replayed_disk': 0, 'flushes': 0, 'flush_errors': 0,
+        }
+
+    def register(self, kind: str, runner: Callable[[Dict, JobContext], None]):
+        """runner(params, job) crawls and writes its events with job.emit()"""
+        self._runners[kind] = runner
+
+    # -------------------------------
+    # Storage
+    # -------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database lazily (caller holds the lock)"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            # Frequent small batches of events: WAL keeps commits cheap
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT,
+                    params TEXT,
+                    status TEXT,
+                    detached INTEGER,
+                    error TEXT,
+                    events INTEGER DEFAULT 0,
+                    done_domains TEXT DEFAULT '[]',
+                    created_at REAL,
+                    updated_at REAL,
+                    finished_at REAL
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS job_events (
+                    job_id TEXT,
+                    seq INTEGER,
+                    data TEXT,
+                    key TEXT,
+                    PRIMARY KEY (job_id, seq)
+                )
+            ''')
+            # Jobs of a previous process can't be running any more
+            interrupted = self._conn.execute(
+                "UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE status IN ('queued', 'running')",
+                (time(),)
+            ).rowcount
+            if interrupted:
+                logger.warning(f"⚠️ {interrupted} job bị gián đoạn do khởi động lại (có thể resume)")
+            self._purge()
+            self._conn.commit()
+        return self._conn
+
+    def _purge(self):
+        """Drop finished jobs past the retention period (caller holds the lock)"""
+        expired = [row[0] for row in self._conn.execute(
+            'SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (time() - self.retention,)
+        )]
+        for job_id in expired:
+            self._conn.execute('DELETE FROM job_events WHERE job_id = ?', (job_id,))
+            self._conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        if expired:
+            logger.info(f"🧹 Đã xóa {len(expired)} job cũ")
+
+    def _append(
+        self,
+        job_id: str,
+        payload: Dict,
+        done_domains: Set[str] = None,
+        domain: Optional[str] = None,
+        emitted_keys: Set[str] = None,
+        key: Optional[str] = None
+    ):
+        """
+        Add an event to the job's log and wake its followers; `domain` is added
+        to done_domains, a `key` emitted by an earlier run skips the event.
+        The event is written to disk by the next flush.
+        """
+        data = json.dumps(payload, ensure_ascii=False)
+        with self._lock:
+            live = self._live.get(job_id)
+            if live is None or (key is not None and emitted_keys and key in emitted_keys):
+                return
+            live.seq += 1
+            seq = live.seq
+            self._pending.append((job_id, seq, data, key))
+            done = self._touched.get(job_id, (0, None))[1]
+            if domain is not None:
+                done_domains.add(clean_domain(domain))
+                done = done_domains
+            self._touched[job_id] = (seq, done)
+            if len(self._pending) >= self.FLUSH_EVENTS:
+                self._flush_now.set()
+            live.recent.append((seq, data))
+            live.changed.notify_all()
+
+    def _flush(self):
+        """
+        Write pending events and job counters in one transaction (caller holds
+        the lock). On failure they stay pending and the next flush retries.
+        """
+        if not self._pending:
+            return
+        try:
+            conn = self._connect()
+            conn.executemany('INSERT INTO job_events (job_id, seq, data, key) VALUES (?, ?, ?, ?)', self._pending)
+            now = time()
+            for job_id, (seq, done) in self._touched.items():
+                if done is None:
+                    conn.execute('UPDATE jobs SET events = ?, updated_at = ? WHERE id = ?', (seq, now, job_id))
+                else:
+                    conn.execute(
+                        'UPDATE jobs SET events = ?, done_domains = ?, updated_at = ? WHERE id = ?',
+                        (seq, json.dumps(sorted(done)), now, job_id)
+                    )
+            conn.commit()
+        except sqlite3.Error as e:
+            if self._conn is not None:
+                self._conn.rollback()
+            self.stats['flush_errors'] += 1
+            logger.warning(f"⚠️ Không ghi được {len(self._pending)} event của job (sẽ thử lại): {e}")
+            return
+        self.stats['flushes'] += 1
+        self._pending = []
+        self._touched = {}
+
+    def _write_events(self):
+        """Writer thread: flush pending events every FLUSH_INTERVAL, or sooner when many are pending"""
+        while True:
+            self._flush_now.wait(self.FLUSH_INTERVAL)
+            self._flush_now.clear()
+            with self._lock:
+                self._flush()
+
+    def _set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        with self._lock:
+            now = time()
+            finished_at = now if status in FINAL_STATES else None
+            if finished_at:
+                self._flush()  # The log of a finished job is complete on disk
+            try:
+                conn = self._connect()
+                conn.execute(
+                    'UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ?',
+                    (status, error, now, finished_at, job_id)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Job {job_id}: không cập nhật được trạng thái: {e}")
+            live = self._live.get(job_id)
+            if live:
+                live.status = status
+                live.changed.notify_all()
+                if status in FINAL_STATES:
+                    del self._live[job_id]
+
+    # -------------------------------
+    # Lifecycle
+    # -------------------------------
+    def submit(self, kind: str, params: Dict, detached: bool = False) -> Dict:
+        """Queue a new job, returns its state"""
+        if kind not in self._runners:
+            raise ValueError(f"Unknown job type: {kind}")
+        job_id = uuid.uuid4().hex
+        now = time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT INTO jobs (id, kind, params, status, detached, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, json.dumps(params), 'queued', int(detached), now, now)
+            )
+            conn.commit()
+            self.stats['submitted'] += 1
+        self._start(job_id, kind, params, detached, set(), set(), 0)
+        logger.info(f"📥 Job {job_id} ({kind}) đã vào hàng đợi")
+        return self.get(job_id)
+
+    def resume(self, job_id: str) -> Optional[Dict]:
+        """Run an interrupted / cancelled / failed job again, skipping domains already done"""
+        job = self._row(job_id)
+        if job is None or job['status'] not in ('interrupted', 'cancelled', 'failed') or job_id in self._live:
+            return None
+        self._set_status(job_id, 'queued')
+        with self._lock:
+            self.stats['resumed'] += 1
+        with self._lock:
+            emitted_keys = {row[0] for row in self._connect().execute(
+                'SELECT key FROM job_events WHERE job_id = ? AND key IS NOT NULL', (job_id,)
+            )}
+        self._start(
+            job_id, job['kind'], job['params'], job['detached'], set(job['done_domains']), emitted_keys, job['events']
+        )
+        logger.info(f"🔁 Job {job_id} tiếp tục ({len(job['done_domains'])} domain đã xong)")
+        return self.get(job_id)
+
+    def reconnect(self, job_id: str) -> Optional[Dict]:
+        """
+        A client re-attached with Last-Event-ID: resume the job if it only
+        stopped because nobody was following it (idle cancel, restart)
+        """
+        job = self._row(job_id)
+        if job and (job['status'] == 'interrupted' or (job['status'] == 'cancelled' and job['error'] == IDLE)):
+            return self.resume(job_id) or self._row(job_id)
+        return job
+
+    def cancel(self, job_id: str, reason: Optional[str] = None) -> bool:
+        with self._lock:
+            live = self._live.get(job_id)
+            if live is None:
+                return False
+            live.cancel_reason = reason
+            live.cancel.set()
+            not_started = live.future is not None and live.future.cancel()
+        if not_started:
+            self._finish(job_id, 'cancelled')
+        logger.info(f"🛑 Job {job_id} đã bị hủy")
+        return True
+
+    def _start(
+        self,
+        job_id: str,
+        kind: str,
+        params: Dict,
+        detached: bool,
+        done_domains: Set[str],
+        emitted_keys: Set[str],
+        seq: int
+    ):
+        """emitted_keys: keys of earlier runs (only those are deduplicated); seq: events already logged"""
+        cancel = threading.Event()
+        with self._lock:
+            live = _LiveJob(
+                'queued', detached, cancel, threading.Condition(self._lock), time(), deque(maxlen=self.replay_buffer),
+                seq=seq
+            )
+            self._live[job_id] = live
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_running, thread_name_prefix='job')
+                self._watchdog = threading.Thread(target=self._watch_idle, daemon=True)
+                self._watchdog.start()
+                self._writer = threading.Thread(target=self._write_events, name='job-writer', daemon=True)
+                self._writer.start()
+            context = JobContext(self, job_id, cancel, done_domains, emitted_keys)
+            live.future = self._executor.submit(self._run, job_id, self._runners[kind], params, context)
+
+    def _run(self, job_id: str, runner: Callable, params: Dict, context: JobContext):
+        self._set_status(job_id, 'running')
+        try:
+            runner(params, context)
+        except Exception as e:
+            logger.error(f"❌ Job {job_id} lỗi: {e}")
+            context.emit({'status': 'error', 'message': str(e)})
+            self._finish(job_id, 'failed', str(e))
+            return
+        self._finish(job_id, 'cancelled' if context.cancelled else 'completed')
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None):
+        if status == 'cancelled':
+            self._append(job_id, {'status': 'cancelled', 'message': 'Job đã bị hủy'})
+        with self._lock:
+            self.stats[status] += 1
+            live = self._live.get(job_id)
+            if status == 'cancelled' and live:
+                error = live.cancel_reason
+        self._set_status(job_id, status, error)
+
+    def _watch_idle(self):
+        """Cancel jobs nobody has followed or polled for idle_timeout"""
+        while True:
+            sleep(max(1.0, self.idle_timeout / 4))
+            now = time()
+            with self._lock:
+                idle = [
+                    job_id for job_id, live in self._live.items()
+                    if not live.detached and not live.cancel.is_set()
+                    and live.listeners == 0 and now - live.last_seen > self.idle_timeout
+                ]
+                self.stats['idle_cancelled'] += len(idle)
+            for job_id in idle:
+                logger.info(f"💤 Job {job_id}: không còn client theo dõi, hủy")
+                self.cancel(job_id, reason=IDLE)
+
+    # -------------------------------
+    # Reading
+    # -------------------------------
+    def _row(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    'SELECT id, kind, params, status, detached, error, events, done_domains, '
+                    'created_at, updated_at, finished_at FROM jobs WHERE id = ?', (job_id,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Job {job_id}: không đọc được: {e}")
+                return None
+        if row is None:
+            return None
+        job_id, kind, params, status, detached, error, events, done_domains, created, updated, finished = row
+        return {
+            'id': job_id,
+            'kind': kind,
+            'params': json.loads(params),
+            'status': status,
+            'detached': bool(detached),
+            'error': error,
+            'events': events,
+            'done_domains': json.loads(done_domains),
+            'created_at': created,
+            'updated_at': updated,
+            'finished_at': finished,
+        }
+
+    def get(self, job_id: str, touch: bool = False) -> Optional[Dict]:
+        """Job state; touch = a client polled it (keeps it from idling out)"""
+        job = self._row(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            live = self._live.get(job_id)
+            if live and touch:
+                live.last_seen = time()
+            job['listeners'] = live.listeners if live else 0
+            if job_id in self._touched:
+                # Not flushed yet: the counters in memory are ahead of the row
+                seq, done = self._touched[job_id]
+                job['events'] = seq
+                if done is not None:
+                    job['done_domains'] = sorted(done)
+        job['progress'] = {
+            'domains_done': len(job['done_domains']),
+            'domains_total': len(job['params'].get('domains', [])),
+        }
+        return job
+
+    def list(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            ids = [row[0] for row in self._connect().execute(
+                'SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)
+            )]
+        return [job for job in (self.get(job_id) for job_id in ids) if job]
+
+    def events(self, job_id: str, after: int = 0, limit: int = 500) -> List[Tuple[int, Dict]]:
+        """Events with seq > after, oldest first"""
+        with self._lock:
+            return [(seq, json.loads(data)) for seq, data in self._read_events(job_id, after, limit)]
+
+    def _read_events(self, job_id: str, after: int, limit: int) -> List[Tuple[int, str]]:
+        """
+        (seq, JSON) of events after `after`: from the replay buffer when it
+        reaches back that far, else from disk (caller holds the lock)
+        """
+        live = self._live.get(job_id)
+        if live and live.recent and live.recent[0][0] <= after + 1:
+            if live.recent[-1][0] <= after:
+                return []
+            # seqs in the buffer are consecutive: index straight to after + 1
+            start = after + 1 - live.recent[0][0]
+            events = [live.recent[i] for i in range(start, min(len(live.recent), start + limit))]
+            self.stats['replayed_memory'] += len(events)
+            return events
+        if job_id in self._touched:
+            self._flush()  # The disk log must include what the buffer no longer holds
+        rows = self._connect().execute(
+            'SELECT seq, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?',
+            (job_id, after, limit)
+        ).fetchall()
+        self.stats['replayed_disk'] += len(rows)
+        return rows
+
+    def follow(self, job_id: str, after: int = 0) -> Iterator[Optional[Tuple[int, str]]]:
+        """
+        Attach to a job: replay events after `after`, then yield new ones as
+        (seq, JSON) until the job finishes. Yields None every `heartbeat`
+        seconds without events (the stream writes a keep-alive, which also
+        detects a gone client).
+        """
+        with self._lock:
+            live = self._live.get(job_id)
+            if live:
+                live.listeners += 1
+        try:
+            while True:
+                with self._lock:
+                    events = self._read_events(job_id, after, 500)
+                    if not events:
+                        live = self._live.get(job_id)
+                        if live is None:
+                            return  # Finished and fully replayed
+                        if not live.changed.wait(self.heartbeat):
+                            events = None
+                if events is None:
+                    yield None
+                    continue
+                for event in events:
+                    after = event[0]
+                    yield event
+        finally:
+            with self._lock:
+                live = self._live.get(job_id)
+                if live:
+                    live.listeners = max(0, live.listeners - 1)
+                    live.last_seen = time()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['queued'] = sum(1 for live in self._live.values() if live.status == 'queued')
+            stats['running'] = sum(1 for live in self._live.values() if live.status == 'running')
+            stats['listeners'] = sum(live.listeners for live in self._live.values())
+            stats['pending_writes'] = len(self._pending)
+        stats['max_running'] = self.max_running
+        return stats
+
+
+# Global job manager (runners are registered by the app)
+job_manager = JobManager(
+    path=Config.JOB_DB_PATH,
+    max_running=Config.JOB_MAX_RUNNING,
+    idle_timeout=Config.JOB_IDLE_TIMEOUT,
+    heartbeat=Config.JOB_HEARTBEAT,
+    retention_days=Config.JOB_RETENTION_DAYS,
+    replay_buffer=Config.JOB_REPLAY_BUFFER,
+)
@@ -0,0 +1,101 @@
+"""
+HTML parse stage in a process pool
+
+Fetch threads hand raw page bytes to a ProcessPoolExecutor that runs the
+HTMLParser extraction, so parsing scales with cores instead of sharing the
+GIL with the fetchers. At most `queue_size` pages wait for a parser; beyond
+that, fetch threads block (backpressure). Workers are started with 'spawn',
+so no thread or lock state of the crawler process is inherited.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict
+
+from config import Config
+from utils.html_parser import HTMLParser, PageMetadata
+from utils.logger import logger
+
+
+def _extract(body: bytes, encoding: str, url: str) -> PageMetadata:
+    """Runs in a worker process"""
+    return HTMLParser.extract_metadata(body.decode(encoding, errors='replace'), url)
+
+
+class ParsePool:
+
+    def __init__(self, processes: int, queue_size: int):
+        """
+        Args:
+            processes: Worker processes (0 = parse inline on the calling thread)
+            queue_size: Max pages submitted but not yet parsed
+        """
+        self.processes = max(0, processes)
+        self.queue_size = max(1, queue_size)
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {'parsed': 0, 'inline': 0, 'restarts': 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"⚙️ Parse pool started with {self.processes} processes")
+            return self._executor
+
+    def submit(self, body: bytes, encoding: str, url: str) -> Future:
+        """Queue a page for extraction; blocks while queue_size pages are pending"""
+        self._slots.acquire()
+        try:
+            future = self._get_executor().submit(_extract, body, encoding, url)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def extract(self, body: bytes, encoding: str, url: str) -> PageMetadata:
+        """Title + keywords of a page body, parsed in the pool (or inline if disabled/broken)"""
+        if self.processes == 0:
+            with self._lock:
+                self.stats['inline'] += 1
+            return _extract(body, encoding, url)
+
+        try:
+            metadata = self.submit(body, encoding, url).result()
+            with self._lock:
+                self.stats['parsed'] += 1
+            return metadata
+        except BrokenProcessPool as e:
+            logger.error(f"💥 Parse pool bị lỗi, khởi động lại: {e}")
+            self._restart()
+            with self._lock:
+                self.stats['inline'] += 1
+            return _extract(body, encoding, url)
+
+    def _restart(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.stats['restarts'] += 1
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['processes'] = self.processes
+        stats['queue_size'] = self.queue_size
+        return stats
+
+
+# Global parse stage shared by all content crawls
+parse_pool = ParsePool(
+    processes=Config.PARSE_PROCESSES,
+    queue_size=Config.PARSE_QUEUE_SIZE,
+)
@@ -0,0 +1,125 @@
+"""
+Per-host politeness limiter (token bucket)
+
+Only requests to the same host wait for each other: each host gets a bucket of
+`burst` tokens refilled at `rate` tokens/second. Once the burst is used up,
+requests to that host are spaced between MIN_DELAY and MAX_DELAY apart
+(1/rate plus random jitter), while other hosts proceed untouched.
+"""
+
+import random
+import threading
+from time import monotonic, sleep
+from typing import Dict
+from urllib.parse import urlparse
+
+from config import Config
+
+
+def host_key(url: str) -> str:
+    """Bucket key for a URL or bare host - www. and apex share one bucket"""
+    netloc = urlparse(url).netloc if '://' in url else url
+    netloc = netloc.lower()
+    return netloc[4:] if netloc.startswith('www.') else netloc
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class HostRateLimiter:
+
+    MAX_IDLE = 600  # seconds before an idle host's bucket is dropped
+
+    def __init__(self, rate: float, burst: int, jitter: float = 0.0):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.jitter = max(0.0, jitter)
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> float:
+        """
+        Block until a request to the URL's host is allowed.
+
+        Returns:
+            Seconds waited
+        """
+        wait = self.reserve(url)
+        if wait > 0:
+            sleep(wait)
+        return wait
+
+    def try_acquire(self, url: str) -> bool:
+        """Take a token for the URL's host only if one is available now (for schedulers)"""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = monotonic()
+            bucket = self._bucket(host_key(url), now)
+            if bucket.tokens < 1:
+                return False
+            bucket.tokens -= 1
+            return True
+
+    def delay(self, url: str) -> float:
+        """Seconds until a token for the URL's host is available (0 if one is now)"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            bucket = self._bucket(host_key(url), monotonic())
+            return max(0.0, (1 - bucket.tokens) / self.rate)
+
+    def reserve(self, url: str) -> float:
+        """
+        Take a token for the URL's host without sleeping (for asyncio callers).
+
+        Returns:
+            Seconds the caller must wait before sending the request
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            bucket = self._bucket(host_key(url), monotonic())
+
+            # Reserve a token; a negative balance queues later callers behind this one
+            bucket.tokens -= 1
+            if bucket.tokens >= 0:
+                return 0.0
+            wait = -bucket.tokens / self.rate
+            if self.jitter:
+                extra = random.uniform(0, self.jitter)
+                wait += extra
+                bucket.tokens -= extra * self.rate
+            return wait
+
+    def _bucket(self, key: str, now: float) -> _Bucket:
+        """Get or create a host's bucket, refilled up to now (caller holds the lock)"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                self._prune(now)
+            bucket = self._buckets[key] = _Bucket(float(self.burst), now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        return bucket
+
+    def _prune(self, now: float):
+        """Drop buckets of hosts not seen recently (caller holds the lock)"""
+        idle = [k for k, b in self._buckets.items() if now - b.updated > self.MAX_IDLE]
+        for key in idle:
+            del self._buckets[key]
+
+
+# Global limiter shared by sitemap and content crawlers
+rate_limiter = HostRateLimiter(
+    rate=Config.HOST_RATE_LIMIT,
+    burst=Config.HOST_BURST,
+    jitter=max(0.0, Config.MAX_DELAY - Config.MIN_DELAY),
+)
@@ -0,0 +1,390 @@
+"""
+Process-wide crawl scheduler: one bounded worker pool shared by all crawls
+
+Crawl work (a domain of a sitemap crawl, a page of a GP content crawl) is
+submitted to a flow — one per job — instead of a per-request thread pool.
+CRAWL_WORKERS threads serve every flow; whenever work is waiting, the next
+task comes from the flow that has received the least service relative to
+its weight (stride scheduling, a weighted fair queuing approximation). The
+flows of one client split that client's weight, so a user with ten jobs
+gets the same share as a user with one.
+
+Tasks must not wait for other tasks of the scheduler (they would hold the
+workers they wait for): coordinators keep their own threads and submit the
+leaf work here. Nor should they block on a busy host: page tasks are
+admitted (host slot, fetch budget, politeness token taken) when picked, and
+wait in the queue rather than on a worker until they can be. Admission runs
+outside the scheduler's lock; a task it turns down is held until wake() (e.g.
+a host slot was released) or the delay admit() asked for, and the next tasks
+of its executor may go first meanwhile.
+"""
+
+import itertools
+import threading
+import uuid
+from collections import Counter, deque
+from concurrent.futures import Executor, Future
+from math import inf
+from time import monotonic
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from config import Config
+
+
+class _Flow:
+    """Fair-share accounting of one flow (shared by its executors, which hold the queues)"""
+
+    def __init__(self, flow_id: str, client: str, weight: float, max_running: Optional[int]):
+        self.id = flow_id
+        self.client = client
+        self.weight = max(0.01, weight)
+        self.max_running = max_running
+        self.executors: List['FlowExecutor'] = []
+        self.running = 0
+        self.pass_ = 0.0  # weighted service received; lowest goes next
+        self.handles = 0
+        self.completed = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(executor._queue) for executor in self.executors)
+
+    @property
+    def active(self) -> bool:
+        return self.running > 0 or any(executor._queue for executor in self.executors)
+
+    @property
+    def ready(self) -> bool:
+        return (self.max_running is None or self.running < self.max_running) and any(
+            executor.ready for executor in self.executors
+        )
+
+
+class FlowExecutor(Executor):
+    """
+    Executor view of a flow. Leaving the `with` block waits for the tasks
+    submitted through this view, like ThreadPoolExecutor.
+
+    Each view has its own cap (max_running) within the flow's. With `admit`,
+    a task is only dispatched once admit(*args, **kwargs) returns True: it
+    takes what the task needs (host slot, fetch budget...) without waiting,
+    and the task releases it. Otherwise it returns False (retry on the
+    scheduler's next wake()) or the seconds to wait before a retry.
+    `release(*args, **kwargs)` gives it back if the task is cancelled after
+    admission.
+    """
+
+    def __init__(
+        self,
+        scheduler: 'CrawlScheduler',
+        flow: _Flow,
+        max_running: Optional[int] = None,
+        admit: Optional[Callable[..., Union[bool, float]]] = None,
+        release: Optional[Callable] = None
+    ):
+        self._scheduler = scheduler
+        self._flow = flow
+        self._max_running = max_running
+        self._admit = admit
+        self._release = release
+        self._queue: Deque[Tuple[int, Future, Callable, tuple, dict]] = deque()
+        self._held: Dict[int, float] = {}  # seq of a task turned down by admit -> when to retry it
+        self._running = 0
+        self._pending = 0
+        self._closed = False
+
+    @property
+    def flow_id(self) -> str:
+        return self._flow.id
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._queue) and (self._max_running is None or self._running < self._max_running)
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        return self._scheduler._submit(self, fn, args, kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        self._scheduler._close(self, wait, cancel_futures)
+
+
+class CrawlScheduler:
+
+    ADMIT_SCAN = 8  # queued tasks of an executor looked at, past the ones admission holds back
+
+    def __init__(self, workers: int, name: str = 'crawl'):
+        self.workers = max(1, workers)
+        self.name = name
+        self._cond = threading.Condition()
+        self._flows: Dict[str, _Flow] = {}
+        self._vtime = 0.0  # pass of the last dispatched task
+        self._seq = itertools.count()  # submission order, across the executors of a flow
+        self._holding = 0  # tasks held back by admission
+        self._wakes = 0  # wake() calls, so a task turned down during one is retried at once
+        self._retry_at: Optional[float] = None  # earliest delayed retry seen by the last _pick
+        self._timer: Optional[float] = None  # deadline the one timed idle worker waits for
+        self._threads = []
+        self._idle = 0
+        self.stats = {'submitted': 0, 'completed': 0, 'cancelled': 0, 'max_queued': 0, 'admission_waits': 0}
+
+    def flow(
+        self,
+        flow_id: Optional[str] = None,
+        client: str = '',
+        weight: float = 1.0,
+        max_running: Optional[int] = None,
+        admit: Optional[Callable[..., Union[bool, float]]] = None,
+        release: Optional[Callable] = None
+    ) -> FlowExecutor:
+        """
+        Executor for a flow. Executors opened with the same flow_id share one
+        fair share; client / weight and the flow-wide cap are taken from the
+        first one (e.g. the job), later ones add work to it.
+
+        Args:
+            flow_id: Flow to join (default: a new anonymous flow)
+            client: Flows of one client split its weight (default: the flow is its own client)
+            weight: Relative share of the workers
+            max_running: Cap on running tasks of this executor (and of the flow, for the first one)
+            admit / release: Admission of this executor's tasks (see FlowExecutor)
+        """
+        flow_id = flow_id or uuid.uuid4().hex
+        with self._cond:
+            flow = self._flows.get(flow_id)
+            if flow is None:
+                flow = _Flow(flow_id, client or flow_id, weight, max_running)
+                self._flows[flow_id] = flow
+            flow.handles += 1
+            executor = FlowExecutor(self, flow, max_running, admit, release)
+            flow.executors.append(executor)
+        return executor
+
+    def wake(self):
+        """Retry the tasks held back by admission: what they wait for (e.g. a host slot) may be free now"""
+        with self._cond:
+            self._wakes += 1
+            if self._holding:
+                for flow in self._flows.values():
+                    for executor in flow.executors:
+                        executor._held.clear()
+                self._holding = 0
+                self._cond.notify_all()
+
+    # -------------------------------
+    # Executor side
+    # -------------------------------
+    def _submit(self, executor: FlowExecutor, fn: Callable, args: tuple, kwargs: dict) -> Future:
+        future = Future()
+        flow = executor._flow
+        with self._cond:
+            if executor._closed:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+            if not flow.active:
+                # Idle time earns no credit: join at the current virtual time
+                flow.pass_ = max(flow.pass_, self._vtime)
+            executor._queue.append((next(self._seq), future, fn, args, kwargs))
+            executor._pending += 1
+            future.add_done_callback(lambda _: self._task_done(executor))
+            self.stats['submitted'] += 1
+            queued = sum(f.queued for f in self._flows.values())
+            self.stats['max_queued'] = max(self.stats['max_queued'], queued)
+            if len(self._threads) < self.workers and self._startable() > self._idle:
+                self._spawn()  # A burst of tasks outnumbers the workers waiting for it
+            self._cond.notify()
+        return future
+
+    def _startable(self) -> int:
+        """Queued tasks their caps would let start now (caller holds the lock)"""
+        total = 0
+        for flow in self._flows.values():
+            count = 0
+            for executor in flow.executors:
+                room = len(executor._queue) - len(executor._held)
+                if executor._max_running is not None:
+                    room = min(room, max(0, executor._max_running - executor._running))
+                count += room
+            if flow.max_running is not None:
+                count = min(count, max(0, flow.max_running - flow.running))
+            total += count
+        return total
+
+    def _task_done(self, executor: FlowExecutor):
+        with self._cond:
+            executor._pending -= 1
+            if executor._pending == 0:
+                self._cond.notify_all()
+
+    def _close(self, executor: FlowExecutor, wait: bool, cancel_futures: bool):
+        flow = executor._flow
+        with self._cond:
+            if executor._closed:
+                return
+            executor._closed = True
+            if cancel_futures:
+                for _, future, *_ in list(executor._queue):
+                    future.cancel()
+            if wait:
+                while executor._pending > 0:
+                    self._cond.wait()
+            flow.handles -= 1
+            self._retire(executor)
+            self._forget(flow)
+
+    def _retire(self, executor: FlowExecutor):
+        """Detach a closed executor from its flow once drained (caller holds the lock)"""
+        flow = executor._flow
+        if executor._closed and not executor._queue and executor._running == 0 and executor in flow.executors:
+            flow.executors.remove(executor)
+
+    def _forget(self, flow: _Flow):
+        """Drop a flow nobody holds once it's idle (caller holds the lock)"""
+        if flow.handles == 0 and not flow.active and self._flows.get(flow.id) is flow:
+            del self._flows[flow.id]
+
+    # -------------------------------
+    # Workers
+    # -------------------------------
+    def _spawn(self):
+        """Start one more worker (caller holds the lock)"""
+        thread = threading.Thread(target=self._work, name=f"{self.name}-worker-{len(self._threads)}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _pick(self) -> Optional[Tuple[FlowExecutor, Tuple[int, Future, Callable, tuple, dict], float, int]]:
+        """
+        Take the next task off its queue by weighted fair share (caller holds
+        the lock): (executor, task, pass step, wake count). Within a flow, the
+        oldest task its executor's cap allows goes first, passing over (up to
+        ADMIT_SCAN per executor) tasks that admission holds back. The task
+        counts as running until it finishes or _hold puts it back.
+        """
+        now = monotonic()
+        self._retry_at = None
+        ready = [flow for flow in self._flows.values() if flow.ready]
+        if not ready:
+            return None
+        active_per_client = Counter(flow.client for flow in self._flows.values() if flow.active)
+        for flow in sorted(ready, key=lambda f: f.pass_):
+            best = None
+            for executor in flow.executors:
+                if not executor.ready:
+                    continue
+                for index, task in enumerate(itertools.islice(executor._queue, self.ADMIT_SCAN)):
+                    retry_at = executor._held.get(task[0])
+                    if retry_at is None or retry_at <= now or task[1].cancelled():
+                        if best is None or task[0] < best[2][0]:
+                            best = (executor, index, task)
+                        break
+                    if retry_at != inf and (self._retry_at is None or retry_at < self._retry_at):
+                        self._retry_at = retry_at
+            if best is None:
+                continue
+            executor, index, task = best
+            del executor._queue[index]
+            if executor._held.pop(task[0], None) is not None:
+                self._holding -= 1
+            step = active_per_client[flow.client] / flow.weight
+            self._vtime = flow.pass_
+            flow.pass_ += step
+            flow.running += 1
+            executor._running += 1
+            return executor, task, step, self._wakes
+        return None
+
+    def _hold(self, executor: FlowExecutor, task: tuple, step: float, wakes: int, verdict: Union[bool, float]):
+        """Put back a task admission turned down, in submission order, held until wake() or its delay"""
+        flow = executor._flow
+        with self._cond:
+            flow.running -= 1
+            executor._running -= 1
+            flow.pass_ -= step  # no service, no charge
+            queue = executor._queue
+            queue.insert(next((i for i, queued in enumerate(queue) if queued[0] > task[0]), len(queue)), task)
+            self.stats['admission_waits'] += 1
+            if wakes == self._wakes:  # otherwise what it waits for was released meanwhile: retry now
+                retry_at = monotonic() + verdict if verdict else inf
+                executor._held[task[0]] = retry_at
+                self._holding += 1
+                if retry_at != inf and (self._timer is None or retry_at < self._timer):
+                    self._cond.notify_all()  # the timed worker waits for a later deadline, or none does
+            self._cond.notify()  # its place under the caps is free again
+
+    def _work(self):
+        while True:
+            with self._cond:
+                picked = self._pick()
+                while picked is None:
+                    self._idle += 1
+                    if self._retry_at is not None and self._timer is None:
+                        # One idle worker waits for the earliest delayed retry, the others for a notify
+                        self._timer = self._retry_at
+                        self._cond.wait(max(0.0, self._retry_at - monotonic()))
+                        self._timer = None
+                    else:
+                        self._cond.wait()
+                    self._idle -= 1
+                    picked = self._pick()
+                if self._holding and self._timer is None and self._idle:
+                    self._cond.notify()  # hand the watch over delayed retries to an idle worker
+            executor, task, step, wakes = picked
+            _, future, fn, args, kwargs = task
+            flow = executor._flow
+
+            # Admission outside the lock: it takes host/budget locks of its own
+            admitted = False
+            if executor._admit is not None and not future.cancelled():
+                verdict = executor._admit(*args, **kwargs)
+                if verdict is not True:
+                    self._hold(executor, task, step, wakes, verdict)
+                    continue
+                admitted = True
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                cancelled = False
+            else:
+                if admitted and executor._release is not None:
+                    executor._release(*args, **kwargs)
+                cancelled = True
+
+            with self._cond:
+                flow.running -= 1
+                executor._running -= 1
+                flow.completed += 1
+                self.stats['cancelled' if cancelled else 'completed'] += 1
+                self._retire(executor)
+                self._forget(flow)
+                self._cond.notify_all()  # a capped flow may go on; executors may be waiting
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self.stats)
+            stats['workers'] = self.workers
+            stats['threads'] = len(self._threads)
+            stats['busy'] = sum(flow.running for flow in self._flows.values())
+            stats['queued'] = sum(flow.queued for flow in self._flows.values())
+            stats['flows'] = {
+                flow.id[:12]: {
+                    'client': flow.client,
+                    'weight': flow.weight,
+                    'running': flow.running,
+                    'queued': flow.queued,
+                    'completed': flow.completed,
+                }
+                for flow in self._flows.values() if flow.active
+            }
+        return stats
+
+
+# Global scheduler shared by all crawls
+crawl_scheduler = CrawlScheduler(workers=Config.CRAWL_WORKERS)
+# Fan-out inside a domain crawl (discovery probes, sibling sitemaps): leaf I/O that domain
+# tasks of crawl_scheduler wait for, so it needs workers of its own
+fanout_scheduler = CrawlScheduler(workers=Config.FANOUT_WORKERS, name='fanout')
+# GP content domains: coordinators that wait for their pages on crawl_scheduler
+domain_scheduler = CrawlScheduler(workers=Config.DOMAIN_WORKERS, name='domain')
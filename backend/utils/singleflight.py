@@ -0,0 +1,194 @@
+"""
+In-flight coalescing of identical domain crawls (singleflight)
+
+When a domain is requested while the same crawl of it is already running
+(another user, another endpoint), the second caller joins the running
+computation instead of fetching the domain again: it is handed the events
+emitted so far, then the live ones, and finally the same result.
+
+The leader's crawl only stops early once every participant has cancelled.
+Event history of a flight is capped (SINGLEFLIGHT_REPLAY_MAX); past that a
+new caller runs its own crawl rather than join.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from config import Config
+from utils.logger import logger
+
+
+class FlightCancel:
+    """Cancel flag of a flight: set once all participants' cancel events are (duck-types Event.is_set)"""
+
+    def __init__(self):
+        self._events: List[Optional[threading.Event]] = []
+
+    def add(self, event: Optional[threading.Event]):
+        self._events.append(event)
+
+    def is_set(self) -> bool:
+        return all(event is not None and event.is_set() for event in self._events)
+
+
+class _Flight:
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.lock = threading.Lock()  # history, subscribers, cancel: delivery order within the flight
+        self.future = Future()
+        self.cancel = FlightCancel()
+        self.subscribers: List[Callable] = []
+        self.history: Optional[List[Tuple]] = []  # None once over the cap: no more joiners
+        self.participants = 1
+
+
+class SingleFlight:
+
+    def __init__(self, enabled: bool, replay_max: int):
+        self.enabled = enabled
+        self.replay_max = replay_max
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()  # the registry only; events go under each flight's lock
+        self.stats = {'led': 0, 'joined': 0, 'history_overflows': 0}
+
+    def run(
+        self,
+        key: Hashable,
+        fn: Callable[[Callable, FlightCancel], Any],
+        on_event: Optional[Callable] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Any:
+        """
+        Run fn(emit, cancel) unless the same key is in flight, in which case
+        wait for that one. on_event(*args) receives every emit(*args) of the
+        flight, including the ones before joining.
+        """
+        if not self.enabled:
+            return fn(on_event or (lambda *args: None), cancel)
+        flight, leader = self._join(key, on_event, cancel)
+        if flight is None:
+            return fn(on_event or (lambda *args: None), cancel)
+        if not leader:
+            return self._copy(flight.future.result())
+        try:
+            result = fn(self._emitter(flight), flight.cancel)
+        except BaseException as e:
+            self._finish(flight, error=e)
+            raise
+        self._finish(flight, result=result)
+        return self._copy(result)
+
+    async def arun(
+        self,
+        key: Hashable,
+        fn: Callable[[Callable, FlightCancel], Awaitable[Any]],
+        on_event: Optional[Callable] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Any:
+        """run() for coroutines: joiners await the flight without blocking their event loop"""
+        if not self.enabled:
+            return await fn(on_event or (lambda *args: None), cancel)
+        flight, leader = self._join(key, on_event, cancel)
+        if flight is None:
+            return await fn(on_event or (lambda *args: None), cancel)
+        if not leader:
+            return self._copy(await asyncio.wrap_future(flight.future))
+        try:
+            result = await fn(self._emitter(flight), flight.cancel)
+        except BaseException as e:
+            self._finish(flight, error=e)
+            raise
+        self._finish(flight, result=result)
+        return self._copy(result)
+
+    def _join(
+        self,
+        key: Hashable,
+        on_event: Optional[Callable],
+        cancel: Optional[threading.Event]
+    ) -> Tuple[Optional[_Flight], bool]:
+        """(flight, is_leader); (None, False) if the running flight can't be joined"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight(key)
+                self._flights[key] = flight
+                self.stats['led'] += 1
+        with flight.lock:
+            if not leader:
+                if flight.history is None:
+                    return None, False
+                # Replay under the flight's lock so no live event slips in between
+                # (only this flight's emitter waits meanwhile)
+                for args in flight.history:
+                    self._deliver(on_event, args)
+                flight.participants += 1
+                logger.info(f"🔗 Gộp request trùng vào crawl đang chạy: {key}")
+            if on_event:
+                flight.subscribers.append(on_event)
+            flight.cancel.add(cancel)
+        if not leader:
+            with self._lock:
+                self.stats['joined'] += 1
+        return flight, leader
+
+    def _emitter(self, flight: _Flight) -> Callable:
+        """emit() handed to the leader's fn: record and fan out to all participants"""
+        return lambda *args: self._emit(flight, *args)
+
+    def _emit(self, flight: _Flight, *args):
+        with flight.lock:
+            if flight.history is not None:
+                flight.history.append(args)
+                if len(flight.history) > self.replay_max:
+                    flight.history = None
+                    with self._lock:
+                        self.stats['history_overflows'] += 1
+            for subscriber in flight.subscribers:
+                self._deliver(subscriber, args)
+
+    @staticmethod
+    def _deliver(subscriber: Optional[Callable], args: Tuple):
+        if subscriber is None:
+            return
+        try:
+            subscriber(*args)
+        except Exception as e:
+            # One participant's callback must not break the shared crawl
+            logger.error(f"❌ Singleflight subscriber error: {e}")
+
+    def _finish(self, flight: _Flight, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    @staticmethod
+    def _copy(result: Any) -> Any:
+        """Each participant gets its own top-level dict"""
+        return dict(result) if isinstance(result, dict) else result
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._flights)
+            stats['participants'] = sum(flight.participants for flight in self._flights.values())
+        stats['enabled'] = self.enabled
+        return stats
+
+
+def flight_key(pipeline: str, domain: str, *options: Hashable) -> Tuple:
+    """Crawls are identical when pipeline, domain (any scheme / case) and options match"""
+    domain = domain.strip().replace('https://', '').replace('http://', '').strip('/').lower()
+    return (pipeline, domain) + options
+
+
+# Global registry shared by the sitemap and GP content crawlers
+domain_flights = SingleFlight(enabled=Config.SINGLEFLIGHT_ENABLED, replay_max=Config.SINGLEFLIGHT_REPLAY_MAX)
@@ -0,0 +1,241 @@
+"""
+Sitemap result cache, shared by the sitemap and GP content crawls
+
+One entry per domain: the discovered sitemaps, with the page URLs and the
+redirect chains found under each, as produced by a sitemap crawl. Users
+typically run "Crawl sitemap" and then "GP content" on the same domains;
+within `ttl` the second crawl starts from this entry instead of discovering
+and parsing the sitemaps again.
+
+Recently used domains are kept in memory (bounded by their total URL
+count), all of them in SQLite (bounded by the number of domains, least
+recently used evicted first). A crawl with `refresh` skips the lookup and
+its result replaces the entry.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from time import time
+from typing import Dict, List, Optional
+
+from config import Config
+from utils.logger import logger
+
+
+@dataclass
+class SitemapListing:
+    """A discovered sitemap: its page URLs (nested sitemaps included) and redirect chains (to_dict form)"""
+    sitemap: str
+    urls: List[str]
+    redirect_chains: List[Dict] = field(default_factory=list)
+
+
+@dataclass
+class SitemapSnapshot:
+    """Sitemap crawl result of a domain (read-only once cached: it's shared by all readers)"""
+    domain: str
+    final_domain: str
+    sitemaps: List[SitemapListing]
+    stored_at: float = field(default_factory=time)
+
+    @property
+    def url_count(self) -> int:
+        return sum(len(listing.urls) for listing in self.sitemaps)
+
+    @property
+    def age(self) -> float:
+        return time() - self.stored_at
+
+    def to_blob(self) -> bytes:
+        return zlib.compress(json.dumps({
+            'final_domain': self.final_domain,
+            'sitemaps': [
+                {'sitemap': l.sitemap, 'urls': l.urls, 'redirect_chains': l.redirect_chains}
+                for l in self.sitemaps
+            ],
+        }).encode('utf-8'))
+
+    @classmethod
+    def from_blob(cls, domain: str, blob: bytes, stored_at: float) -> 'SitemapSnapshot':
+        data = json.loads(zlib.decompress(blob))
+        return cls(
+            domain, data['final_domain'],
+            [SitemapListing(**listing) for listing in data['sitemaps']],
+            stored_at
+        )
+
+
+class SitemapCache:
+
+    def __init__(self, path: str, ttl: float, max_domains: int, memory_urls: int, enabled: bool = True):
+        self.path = path
+        self.ttl = ttl
+        self.max_domains = max_domains
+        self.memory_urls = memory_urls
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+        self._entries = 0
+        self._memory: 'OrderedDict[str, SitemapSnapshot]' = OrderedDict()
+        self._memory_url_count = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def key(domain: str) -> str:
+        return domain.strip().replace('https://', '').replace('http://', '').strip('/').lower()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database lazily (caller holds the lock)"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS sitemap_cache (
+                    domain TEXT PRIMARY KEY,
+                    data BLOB,
+                    url_count INTEGER,
+                    stored_at REAL,
+                    last_access REAL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_sitemap_cache_access ON sitemap_cache (last_access)')
+            self._conn.execute('DELETE FROM sitemap_cache WHERE stored_at < ?', (time() - self.ttl,))
+            self._conn.commit()
+            self._entries = self._conn.execute('SELECT COUNT(*) FROM sitemap_cache').fetchone()[0]
+        return self._conn
+
+    def get(self, domain: str, refresh: bool = False) -> Optional[SitemapSnapshot]:
+        """Fresh snapshot of a domain, None on a miss or with refresh (the caller crawls and put()s)"""
+        if not self.enabled:
+            return None
+        if refresh:
+            with self._lock:
+                self.stats['bypassed'] += 1
+            return None
+        key = self.key(domain)
+        try:
+            with self._lock:
+                snapshot = self._memory.get(key)
+                if snapshot is not None and snapshot.age < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return snapshot
+                if snapshot is not None:
+                    self._forget(key)
+
+                conn = self._connect()
+                row = conn.execute('SELECT data, stored_at FROM sitemap_cache WHERE domain = ?', (key,)).fetchone()
+                if row is not None and time() - row[1] >= self.ttl:
+                    conn.execute('DELETE FROM sitemap_cache WHERE domain = ?', (key,))
+                    self._entries -= 1
+                    row = None
+                if row is None:
+                    conn.commit()
+                    self.stats['misses'] += 1
+                    return None
+                conn.execute('UPDATE sitemap_cache SET last_access = ? WHERE domain = ?', (time(), key))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Sitemap cache read failed for {domain}: {e}")
+            return None
+
+        snapshot = SitemapSnapshot.from_blob(key, row[0], row[1])
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            self._remember(key, snapshot)
+        return snapshot
+
+    def put(self, snapshot: SitemapSnapshot):
+        """Cache a complete sitemap crawl result (replaces the domain's entry)"""
+        if not self.enabled:
+            return
+        key = self.key(snapshot.domain)
+        snapshot.domain = key
+        blob = snapshot.to_blob()
+        try:
+            with self._lock:
+                self._remember(key, snapshot)
+                conn = self._connect()
+                exists = conn.execute('SELECT 1 FROM sitemap_cache WHERE domain = ?', (key,)).fetchone()
+                conn.execute(
+                    'INSERT OR REPLACE INTO sitemap_cache (domain, data, url_count, stored_at, last_access) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (key, blob, snapshot.url_count, snapshot.stored_at, time())
+                )
+                if not exists:
+                    self._entries += 1
+                self.stats['stores'] += 1
+                self._evict(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Sitemap cache write failed for {snapshot.domain}: {e}")
+
+    def summary(self, snapshot: Optional[SitemapSnapshot], refresh: bool = False) -> Dict:
+        """`sitemap_cache` field of a domain result: how its sitemaps were obtained"""
+        if snapshot is not None:
+            return {'status': 'hit', 'age': round(snapshot.age)}
+        if not self.enabled:
+            return {'status': 'disabled'}
+        return {'status': 'refresh' if refresh else 'miss'}
+
+    def _remember(self, key: str, snapshot: SitemapSnapshot):
+        """Keep a snapshot in memory, dropping least recently used ones over memory_urls (caller holds the lock)"""
+        self._forget(key)
+        if snapshot.url_count > self.memory_urls:
+            return  # Too big for the memory tier: served from disk
+        self._memory[key] = snapshot
+        self._memory_url_count += snapshot.url_count
+        while self._memory_url_count > self.memory_urls:
+            oldest = next(iter(self._memory))
+            self._forget(oldest)
+
+    def _forget(self, key: str):
+        """Drop a snapshot from memory (caller holds the lock)"""
+        snapshot = self._memory.pop(key, None)
+        if snapshot is not None:
+            self._memory_url_count -= snapshot.url_count
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used domains until under max_domains (caller holds the lock)"""
+        excess = self._entries - self.max_domains
+        if excess <= 0:
+            return
+        deleted = conn.execute(
+            'DELETE FROM sitemap_cache WHERE domain IN '
+            '(SELECT domain FROM sitemap_cache ORDER BY last_access LIMIT ?)', (excess,)
+        ).rowcount
+        self._entries -= deleted
+        self.stats['evictions'] += deleted
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            if self.enabled:
+                try:
+                    self._connect()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Sitemap cache unavailable: {e}")
+            stats = dict(self.stats)
+            stats['entries'] = self._entries
+            stats['memory_domains'] = len(self._memory)
+            stats['memory_urls'] = self._memory_url_count
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        stats['enabled'] = self.enabled
+        return stats
+
+
+# Global cache shared by the sitemap and GP content crawlers
+sitemap_cache = SitemapCache(
+    path=Config.SITEMAP_CACHE_PATH,
+    ttl=Config.SITEMAP_CACHE_TTL,
+    max_domains=Config.SITEMAP_CACHE_MAX_DOMAINS,
+    memory_urls=Config.SITEMAP_CACHE_MEMORY_URLS,
+    enabled=Config.SITEMAP_CACHE_ENABLED,
+)
@@ -0,0 +1,106 @@
+"""
+URL canonicalization for duplicate suppression
+
+Sitemaps list the same page under several forms. canonical_key() maps them to
+one key:
+  - http / https                      → same key (scheme dropped)
+  - www.example.com / example.com     → same key
+  - /slug / /slug/                    → same key (trailing slash dropped)
+  - ?utm_source=...&gclid=...         → tracking params dropped, others sorted
+  - default port, #fragment, host case → ignored
+
+CanonicalUrlSet keeps the first form seen of each page (that is the URL that
+gets fetched) and also learns redirect targets / <link rel="canonical"> of
+fetched pages, so a page already fetched under another URL isn't fetched again.
+"""
+
+import threading
+from typing import Dict, Iterable, List
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+TRACKING_PARAMS = {
+    'gclid', 'dclid', 'gbraid', 'wbraid', 'fbclid', 'msclkid', 'yclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'mkt_tok',
+}
+TRACKING_PREFIXES = ('utm_',)
+
+
+def _is_tracking(param: str) -> bool:
+    param = param.lower()
+    return param in TRACKING_PARAMS or param.startswith(TRACKING_PREFIXES)
+
+
+def canonical_key(url: str) -> str:
+    """Key shared by all equivalent forms of a URL (not itself a fetchable URL)"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    scheme = parts.scheme.lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path.rstrip('/') or '/'
+    query = ''
+    if parts.query:
+        params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k)]
+        query = urlencode(sorted(params))
+    return f"//{host}{path}?{query}" if query else f"//{host}{path}"
+
+
+class CanonicalUrlSet:
+    """
+    Per-crawl set of pages, by canonical key. Thread-safe: URLs are added by
+    the feeder while fetch results are learned on other threads.
+    """
+
+    def __init__(self):
+        self._keys = set()
+        self._learned = set()  # keys of pages already covered by another fetch
+        self._lock = threading.Lock()
+        self.duplicates = 0  # equivalent forms collapsed (exact repeats included)
+        self.learned = 0     # skipped because a fetched page redirected / was canonical to it
+
+    def add(self, url: str) -> bool:
+        """True if the URL is a new page (schedule it), False for a duplicate"""
+        key = canonical_key(url)
+        with self._lock:
+            if key in self._keys:
+                self.duplicates += 1
+                return False
+            if key in self._learned:
+                self.learned += 1
+                return False
+            self._keys.add(key)
+            return True
+
+    def update(self, urls: Iterable[str]) -> List[str]:
+        """Add URLs, returning the new ones in input order"""
+        return [url for url in urls if self.add(url)]
+
+    def learn(self, fetched_url: str, *targets: str):
+        """A fetch of fetched_url also covered these URLs (final URL after redirects, rel=canonical)"""
+        fetched_key = canonical_key(fetched_url)
+        with self._lock:
+            for target in targets:
+                if not target:
+                    continue
+                key = canonical_key(target)
+                if key != fetched_key and key not in self._keys:
+                    self._learned.add(key)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, url: str) -> bool:
+        return canonical_key(url) in self._keys
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'duplicates': self.duplicates,
+                'learned': self.learned,
+                'fetches_avoided': self.duplicates + self.learned,
+            }
@@ -0,0 +1,149 @@
+"""
+URL sampling for the GP content crawl (sample=N)
+
+Candidates are grouped into strata = (sitemap document, first path segment)
+and the sample is drawn round-robin across strata, so one huge post sitemap
+doesn't crowd out pages/categories. With recency weighting, candidates are
+drawn with probability proportional to 0.5 ** (age / half-life) of their
+<lastmod> (weighted sampling without replacement, Efraimidis–Spirakis keys).
+
+Only `n * oversample` candidates are collected, and callers use
+choose_sitemaps()/doc_quota() to open and read just enough of the sitemap
+tree, so the cost is bounded by N rather than by sitemap size.
+"""
+
+import random
+import threading
+from datetime import datetime, timezone
+from math import ceil
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+from urllib.parse import urlparse
+
+from config import Config
+
+T = TypeVar('T')
+
+UNKNOWN_AGE_WEIGHT = 0.5  # weight of a candidate without <lastmod> (= one half-life old)
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """W3C datetime from a sitemap (<lastmod>2024-05-01</lastmod> or full timestamp), None if invalid"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class UrlSampler:
+
+    def __init__(
+        self,
+        n: int,
+        recency_weight: bool = False,
+        oversample: int = None,
+        half_life_days: float = None,
+        rng: random.Random = None
+    ):
+        """
+        Args:
+            n: URLs to pick
+            recency_weight: Favour recently modified URLs (<lastmod>)
+            oversample: Candidates collected per picked URL (default: Config.SAMPLE_OVERSAMPLE)
+            half_life_days: Age at which a URL's weight halves (default: Config.SAMPLE_HALF_LIFE_DAYS)
+        """
+        self.n = max(1, n)
+        self.recency_weight = recency_weight
+        self.max_candidates = self.n * max(1, oversample or Config.SAMPLE_OVERSAMPLE)
+        self.half_life_days = half_life_days or Config.SAMPLE_HALF_LIFE_DAYS
+        self.rng = rng or random.Random()
+        self._now = datetime.now(timezone.utc)
+        self._strata: Dict[Tuple[str, str], List[Tuple[str, float]]] = {}
+        self._lock = threading.Lock()
+        self.candidates = 0
+
+    @property
+    def full(self) -> bool:
+        """Enough candidates: stop reading sitemaps"""
+        return self.candidates >= self.max_candidates
+
+    def weight(self, lastmod: Optional[str]) -> float:
+        if not self.recency_weight:
+            return 1.0
+        modified = parse_lastmod(lastmod)
+        if modified is None:
+            return UNKNOWN_AGE_WEIGHT
+        age_days = max(0.0, (self._now - modified).total_seconds() / 86400)
+        return max(1e-6, 0.5 ** (age_days / self.half_life_days))
+
+    def add(self, sitemap_url: str, url: str, lastmod: Optional[str] = None) -> bool:
+        """Add a candidate page URL; False once the sampler is full"""
+        segments = urlparse(url).path.strip('/').split('/', 1)
+        stratum = (sitemap_url, segments[0] if len(segments) > 1 else '')
+        with self._lock:
+            if self.full:
+                return False
+            self._strata.setdefault(stratum, []).append((url, self.weight(lastmod)))
+            self.candidates += 1
+            return True
+
+    # -------------------------------
+    # Bounding the sitemap walk
+    # -------------------------------
+    def choose_sitemaps(self, items: Sequence[T], lastmod: Callable[[T], Optional[str]] = None) -> List[T]:
+        """
+        Child sitemaps worth opening: all of them if few, else a (recency-weighted)
+        random subset of max_candidates, which can't all be needed.
+        """
+        if len(items) <= self.max_candidates:
+            return list(items)
+        get_lastmod = lastmod or (lambda _: None)
+        return self._weighted_pick(list(items), [self.weight(get_lastmod(i)) for i in items], self.max_candidates)
+
+    def doc_quota(self, documents: int) -> int:
+        """Candidates to read from each of `documents` sibling sitemaps"""
+        return max(1, ceil(self.max_candidates / max(1, documents)))
+
+    # -------------------------------
+    # Drawing the sample
+    # -------------------------------
+    def pick(self) -> List[str]:
+        """Up to n URLs, round-robin across strata (each stratum drawn by weight)"""
+        with self._lock:
+            strata = [
+                self._weighted_pick([url for url, _ in members], [w for _, w in members], self.n)
+                for members in self._strata.values()
+            ]
+        self.rng.shuffle(strata)
+
+        picked = []
+        depth = 0
+        while len(picked) < self.n and any(depth < len(s) for s in strata):
+            for members in strata:
+                if depth < len(members):
+                    picked.append(members[depth])
+                    if len(picked) == self.n:
+                        break
+            depth += 1
+        return picked
+
+    @property
+    def strata(self) -> int:
+        return len(self._strata)
+
+    def _weighted_pick(self, items: List[T], weights: List[float], k: int) -> List[T]:
+        """k items without replacement, P ∝ weight (key = u ** (1 / w)), highest keys first"""
+        if all(w == 1.0 for w in weights):
+            order = list(items)
+            self.rng.shuffle(order)
+            return order[:k]
+        keyed = sorted(
+            zip(items, weights),
+            key=lambda iw: self.rng.random() ** (1.0 / iw[1]),
+            reverse=True
+        )
+        return [item for item, _ in keyed[:k]]
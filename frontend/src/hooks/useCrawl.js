@@ -81,6 +81,12 @@ export const useCrawl = () => {
     }
 
     eventSource.onerror = (error) => {
+      // Dropped connection: the browser reconnects with Last-Event-ID and the
+      // backend continues the same crawl job from the last received event
+      if (eventSource.readyState === EventSource.CONNECTING) {
+        console.warn('useCrawl: EventSource reconnecting...')
+        return
+      }
       console.error('useCrawl: EventSource error:', error)
       eventSource.close()
       setIsLoading(false)
@@ -120,6 +120,13 @@ export const useGPContentCrawl = () => {
     }
 
     eventSource.onerror = (error) => {
+      // Dropped connection: the browser reconnects with Last-Event-ID and the
+      // backend continues the same crawl job from the last received event
+      if (eventSource.readyState === EventSource.CONNECTING) {
+        console.warn('[GP Content] EventSource reconnecting...')
+        toast.loading('Mất kết nối, đang kết nối lại...', { id: 'domain-progress' })
+        return
+      }
       console.error('[GP Content] EventSource error:', error)
       eventSource.close()
       setIsLoading(false)